@@ -0,0 +1,10 @@
+import sys
+from .chip8 import main
+
+"""
+
+Allows the CHIP-8 emulator to be run with python -m chip8
+
+"""
+
+sys.exit(main(sys.argv))
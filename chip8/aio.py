@@ -0,0 +1,188 @@
+import asyncio
+import time
+from .cpu import CPU, CYCLES_PER_FRAME
+from .threaded import FRAME_RATE
+
+"""
+
+An asyncio runtime for the CHIP-8 virtual machine
+
+Each Session runs a CPU as a coroutine that executes one frame's worth of
+cycles and then yields to the event loop until the next 60 Hz tick, so that
+hundreds of light sessions can share a single event loop. Key events are
+delivered through an asyncio.Queue and applied at most one per key each
+frame, so that a press and release queued together are both seen. Drawn
+frames are published to the queues of any number of subscribers.
+
+"""
+
+class Session(object):
+    """
+
+    A CPU driven by an asyncio event loop
+
+    """
+
+    def __init__(self, cpu=None, cycles_per_frame=CYCLES_PER_FRAME, frame_rate=FRAME_RATE, metrics=None):
+        """
+
+        Create a new Session object
+
+        @param cpu the CPU to run, a fresh CPU by default
+        @param cycles_per_frame the number of cycles run each frame
+        @param frame_rate the number of frames run each second, or None to
+                          run as fast as possible while still yielding to
+                          other coroutines between frames
+        @param metrics an optional Metrics to record each frame in, which
+                       may be shared by many sessions
+
+        """
+        self.cpu = cpu if cpu is not None else CPU()
+        self.cycles_per_frame = cycles_per_frame
+        self.frame_rate = frame_rate
+        self.metrics = metrics
+        self.input = asyncio.Queue()
+        self.pending = []
+        self.subscribers = []
+        self.frame = 0
+        self.stopped = False
+
+    @classmethod
+    def from_rom(cls, path, **kwargs):
+        """
+
+        Create a new Session running a ROM
+
+        @param path the path to the ROM to run
+        @returns the new Session
+
+        """
+        session = cls(**kwargs)
+        session.cpu.load_rom(path)
+        return session
+
+    def subscribe(self, maxsize=1):
+        """
+
+        Start receiving drawn frames. When a subscriber falls behind, the
+        oldest frames in its queue are dropped.
+
+        @param maxsize the number of frames the queue holds
+        @returns an asyncio.Queue of (frame number, pixels) pairs
+
+        """
+        queue = asyncio.Queue(maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        """
+
+        Stop sending frames to a queue returned by subscribe()
+
+        @param queue the queue to remove
+
+        """
+        self.subscribers.remove(queue)
+
+    def press(self, key):
+        """
+
+        Queue a key press, applied at the start of the next frame that has
+        not already changed the key
+
+        @param key the index of the key
+
+        """
+        self.input.put_nowait((key, True))
+
+    def release(self, key):
+        """
+
+        Queue a key release, applied at the start of the next frame that has
+        not already changed the key
+
+        @param key the index of the key
+
+        """
+        self.input.put_nowait((key, False))
+
+    def apply_input(self):
+        """
+
+        Apply the queued key events, changing each key at most once and
+        keeping the rest for the following frames
+
+        """
+        while not self.input.empty():
+            self.pending.append(self.input.get_nowait())
+
+        changed = set()
+        waiting = []
+        for key, pressed in self.pending:
+            if key in changed:
+                waiting.append((key, pressed))
+            else:
+                self.cpu.keys[key] = pressed
+                changed.add(key)
+
+        self.pending = waiting
+
+    def stop(self):
+        """
+
+        Ask the session to finish after the current frame
+
+        """
+        self.stopped = True
+
+    def publish(self):
+        """
+
+        Send the current framebuffer to every subscriber
+
+        """
+        frame = (self.frame, bytes(self.cpu.gfx))
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(frame)
+
+    async def run(self, frames=None):
+        """
+
+        Run the CPU until stop() is called or a number of frames have run
+
+        @param frames the number of frames to run, or None to run forever
+
+        """
+        loop = asyncio.get_running_loop()
+        cpu = self.cpu
+        tick = loop.time()
+        end = None if frames is None else self.frame + frames
+
+        while not self.stopped and (end is None or self.frame < end):
+            self.apply_input()
+
+            start = time.perf_counter()
+            cpu.run(self.cycles_per_frame)
+            self.frame += 1
+
+            if self.metrics is not None:
+                self.metrics.timing("cpu", time.perf_counter() - start)
+
+            if cpu.shouldDraw:
+                self.publish()
+                cpu.shouldDraw = False
+
+            if self.frame_rate is None:
+                if self.metrics is not None:
+                    self.metrics.frame(self.cycles_per_frame)
+                await asyncio.sleep(0)
+            else:
+                # Wait for the next tick, without trying to catch up if we
+                # have fallen more than a frame behind
+                tick = max(tick + 1.0 / self.frame_rate, loop.time() - 1.0 / self.frame_rate)
+                if self.metrics is not None:
+                    self.metrics.frame(self.cycles_per_frame, tick <= loop.time())
+                await asyncio.sleep(max(0, tick - loop.time()))
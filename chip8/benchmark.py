@@ -0,0 +1,465 @@
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from .cpu import CPU, CYCLES_PER_FRAME, KEYS
+from .schedule import InputPlayer, InputSchedule
+from .synthetic import WORKLOADS, check
+from .terminal import TerminalRenderer
+
+"""
+
+Benchmarks for the CHIP-8 emulator
+
+Every ROM in the roms directory is run headless for a fixed number of frames
+with the same scripted input, measuring instructions per second, the time
+taken by each DXYN instruction, the time to render a frame, the startup
+time of a fresh interpreter and the peak memory allocated. Synthetic loops
+then measure the time per instruction of each class of opcode, and the
+generated workloads of chip8.synthetic are timed and checked.
+
+Results are written as JSON, and compared against a baseline written by an
+earlier run so that the performance effect of a change can be measured
+before it ships.
+
+"""
+
+# Default parameters
+DEFAULT_FRAMES = 1200
+DEFAULT_THRESHOLD = 10.0
+MICRO_CYCLES = 90000
+REPEATS = 3
+RENDER_FRAMES = 60
+
+ROM_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "roms")
+
+# Metrics where a larger value is an improvement. Smaller is better for the
+# rest, which are all times or sizes.
+HIGHER_IS_BETTER = ("ips",)
+
+# Synthetic loops: setup instructions, then a loop of the instruction being
+# measured repeated LOOP_REPEAT times and closed by a jump back, then any
+# subroutines the loop calls
+LOOP_REPEAT = 8
+MICROBENCHMARKS = {
+    "3XNN": ("", "3AFF", ""),
+    "6XNN": ("", "6A12", ""),
+    "7XNN": ("", "7A01", ""),
+    "8XY0": ("", "8AB0", ""),
+    "8XY2": ("", "8AB2", ""),
+    "8XY4": ("", "8AB4", ""),
+    "8XY5": ("", "8AB5", ""),
+    "8XY6": ("", "8AB6", ""),
+    "9XY0": ("", "9AB0", ""),
+    "ANNN": ("", "A300", ""),
+    "CXNN": ("", "CAFF", ""),
+    "DXYN": ("A000", "D125", ""),
+    "EX9E": ("", "EA9E", ""),
+    "FX07": ("", "FA07", ""),
+    "FX1E": ("", "FA1E", ""),
+    "FX29": ("", "FA29", ""),
+    "FX33": ("A300", "FA33", ""),
+    "FX55": ("A300", "FF55", ""),
+    "FX65": ("A300", "FF65", ""),
+    "2NNN/00EE": ("", "2212", "00EE")}
+
+def microbenchmark_rom(setup, body, subroutines=""):
+    """
+
+    Build the ROM of a synthetic loop
+
+    @param setup the hexadecimal setup instructions
+    @param body the hexadecimal instruction to measure
+    @param subroutines the hexadecimal subroutines placed after the loop
+    @returns the ROM
+
+    """
+    loop = 0x200 + (len(setup) // 2)
+    return bytes.fromhex(setup + (body * LOOP_REPEAT) + "1{0:03X}".format(loop) + subroutines)
+
+def input_schedule(frames):
+    """
+
+    Build the input used for every ROM: each key in turn is held for five
+    frames, every thirty frames
+
+    @param frames the number of frames run
+    @returns the InputSchedule
+
+    """
+    schedule = InputSchedule()
+    for n, frame in enumerate(range(30, frames, 30)):
+        schedule.tap(n % KEYS, frame, 5)
+
+    return schedule
+
+def run_rom(path, frames):
+    """
+
+    Run a ROM for a number of frames with the standard scripted input
+
+    @param path the path of the ROM
+    @param frames the number of frames to run
+    @returns a (cpu, seconds, drawn frames) tuple, where at most
+             RENDER_FRAMES drawn frames are kept
+
+    """
+    random.seed(0)
+    cpu = CPU()
+    cpu.load_rom(path)
+    player = InputPlayer(cpu, input_schedule(frames))
+
+    drawn = []
+    start = time.perf_counter()
+    for _ in range(frames):
+        player.run(CYCLES_PER_FRAME)
+        if cpu.shouldDraw:
+            cpu.shouldDraw = False
+            if len(drawn) < RENDER_FRAMES:
+                drawn.append(bytes(cpu.gfx))
+    elapsed = time.perf_counter() - start
+
+    return cpu, elapsed, drawn
+
+def time_draws(path, frames):
+    """
+
+    Measure the mean time taken by each DXYN instruction in a ROM run
+
+    @param path the path of the ROM
+    @param frames the number of frames to run
+    @returns the mean time in microseconds, or None if nothing was drawn
+
+    """
+    random.seed(0)
+    cpu = CPU()
+    cpu.load_rom(path)
+    player = InputPlayer(cpu, input_schedule(frames))
+
+    total = [0.0, 0]
+
+    def timed(cpu, opcode):
+        start = time.perf_counter()
+        draw(cpu, opcode)
+        total[0] += time.perf_counter() - start
+        total[1] += 1
+
+    draw = cpu.patch("opcodes", 0xD000, timed)
+    player.run(frames * CYCLES_PER_FRAME)
+
+    if total[1] == 0:
+        return None
+
+    return (total[0] / total[1]) * 1e6
+
+def time_render(drawn):
+    """
+
+    Measure the time taken to render a frame with the terminal renderer,
+    drawing each frame in turn to a discarded stream
+
+    @param drawn the frames to render
+    @returns the mean time in milliseconds, or None if there are no frames
+
+    """
+    if not drawn:
+        return None
+
+    renderer = TerminalRenderer(io.StringIO())
+    start = time.perf_counter()
+    for gfx in drawn:
+        renderer.render(gfx)
+
+    return ((time.perf_counter() - start) / len(drawn)) * 1e3
+
+def peak_memory(path, frames):
+    """
+
+    Measure the peak memory allocated while loading and running a ROM
+
+    @param path the path of the ROM
+    @param frames the number of frames to run
+    @returns the peak in kilobytes
+
+    """
+    tracemalloc.start()
+    try:
+        run_rom(path, frames)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return peak / 1024.0
+
+def startup_time(path, repeats=REPEATS):
+    """
+
+    Measure the time taken by a fresh interpreter to import the CPU and load
+    a ROM
+
+    @param path the path of the ROM
+    @param repeats the number of runs, of which the fastest is kept
+    @returns the time in milliseconds
+
+    """
+    code = "from chip8.cpu import CPU; CPU().load_rom({0!r})".format(path)
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, "-c", code], cwd=root,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (time.perf_counter() - start) * 1e3
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+def benchmark_rom(path, frames):
+    """
+
+    Run every benchmark for a ROM
+
+    @param path the path of the ROM
+    @param frames the number of frames to run
+    @returns a dictionary of results
+
+    """
+    best = None
+    for _ in range(REPEATS):
+        cpu, elapsed, drawn = run_rom(path, frames)
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {
+        "cycles": cpu.cycles,
+        "ips": cpu.cycles / best,
+        "dxyn_us": time_draws(path, frames),
+        "render_ms": time_render(drawn),
+        "startup_ms": startup_time(path),
+        "peak_kb": peak_memory(path, min(frames, 300))}
+
+def benchmark_opcode(setup, body, subroutines="", cycles=MICRO_CYCLES):
+    """
+
+    Measure the time per instruction of a synthetic loop, including the
+    jump that closes it
+
+    @param setup the hexadecimal setup instructions
+    @param body the hexadecimal instruction to measure
+    @param subroutines the hexadecimal subroutines placed after the loop
+    @param cycles the number of cycles to run
+    @returns the mean time per instruction in nanoseconds
+
+    """
+    rom = microbenchmark_rom(setup, body, subroutines)
+
+    best = None
+    for _ in range(REPEATS):
+        random.seed(0)
+        cpu = CPU()
+        cpu.load_bytes(rom, 0x200)
+        start = time.perf_counter()
+        cpu.run(cycles)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return (best / cycles) * 1e9
+
+def benchmark_workload(workload):
+    """
+
+    Measure the speed of a synthetic workload and check its final state
+
+    @param workload the Workload to run
+    @returns a dictionary of results
+
+    """
+    best = None
+    for _ in range(REPEATS):
+        cpu = CPU()
+        cpu.load_bytes(workload.rom, 0x200)
+        start = time.perf_counter()
+        cpu.run(workload.cycles)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {"cycles": workload.cycles, "ips": workload.cycles / best, "errors": check(cpu, workload.expected)}
+
+def run_benchmarks(roms, frames=DEFAULT_FRAMES, micro=True):
+    """
+
+    Run the benchmark suite
+
+    @param roms the paths of the ROMs to run
+    @param frames the number of frames to run each ROM for
+    @param micro True to run the synthetic opcode benchmarks and workloads
+    @returns a dictionary of results
+
+    """
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "frames": frames,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "roms": {},
+        "opcodes": {},
+        "workloads": {}}
+
+    for path in roms:
+        results["roms"][os.path.basename(path)] = benchmark_rom(path, frames)
+
+    if micro:
+        for name, (setup, body, subroutines) in sorted(MICROBENCHMARKS.items()):
+            results["opcodes"][name] = {"ns": benchmark_opcode(setup, body, subroutines)}
+
+        for name, generate in sorted(WORKLOADS.items()):
+            results["workloads"][name] = benchmark_workload(generate())
+
+    return results
+
+def flatten(results):
+    """
+
+    Collect the metrics of a set of results
+
+    @param results the results of run_benchmarks()
+    @returns a dictionary of dotted metric names to values
+
+    """
+    metrics = {}
+    for group in ("roms", "opcodes", "workloads"):
+        for name, values in results.get(group, {}).items():
+            for metric, value in values.items():
+                if metric != "cycles" and isinstance(value, (int, float)):
+                    metrics["{0}.{1}.{2}".format(group, name, metric)] = value
+
+    return metrics
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+
+    Compare results against a baseline
+
+    @param baseline the results of an earlier run
+    @param results the results of this run
+    @param threshold the percentage change counted as a regression
+    @returns a list of (metric, baseline value, value, percentage change,
+             regressed) tuples, where a positive change is an improvement
+
+    """
+    before = flatten(baseline)
+    after = flatten(results)
+
+    changes = []
+    for metric in sorted(set(before) & set(after)):
+        old = before[metric]
+        new = after[metric]
+        if old == 0:
+            continue
+
+        change = ((new - old) / old) * 100.0
+        if metric.rsplit(".", 1)[1] not in HIGHER_IS_BETTER:
+            change = -change
+
+        changes.append((metric, old, new, change, change < -threshold))
+
+    return changes
+
+def report(results):
+    """
+
+    Format a set of results as a table
+
+    @param results the results of run_benchmarks()
+    @returns the table
+
+    """
+    lines = ["{0:<12} {1:>12} {2:>10} {3:>10} {4:>11} {5:>10}".format(
+        "ROM", "instr/s", "DXYN us", "render ms", "startup ms", "peak KB")]
+
+    def number(value, places):
+        return "-" if value is None else "{0:.{1}f}".format(value, places)
+
+    for name, values in sorted(results["roms"].items()):
+        lines.append("{0:<12} {1:>12} {2:>10} {3:>10} {4:>11} {5:>10}".format(
+            name, number(values["ips"], 0), number(values["dxyn_us"], 2), number(values["render_ms"], 3),
+            number(values["startup_ms"], 1), number(values["peak_kb"], 1)))
+
+    if results["opcodes"]:
+        lines.append("")
+        lines.append("{0:<12} {1:>12}".format("opcode", "ns/instr"))
+        for name, values in sorted(results["opcodes"].items()):
+            lines.append("{0:<12} {1:>12.1f}".format(name, values["ns"]))
+
+    if results.get("workloads"):
+        lines.append("")
+        lines.append("{0:<12} {1:>12} {2}".format("workload", "instr/s", "state"))
+        for name, values in sorted(results["workloads"].items()):
+            lines.append("{0:<12} {1:>12.0f} {2}".format(
+                name, values["ips"], "ok" if not values["errors"] else "WRONG " + ", ".join(values["errors"])))
+
+    return "\n".join(lines)
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return ("Usage: python -m chip8.benchmark [--frames=N] [--output=path] [--baseline=path] "
+            "[--threshold=percent] [--no-micro] [rom ...]")
+
+def main(argv):
+    """
+
+    Driver for the benchmark suite. Exits with a non-zero status if any
+    metric regressed against the baseline by more than the threshold.
+
+    @param argv the argument values
+
+    """
+    options = dict(arg[2:].partition("=")[::2] for arg in argv[1:] if arg.startswith("--"))
+    roms = [arg for arg in argv[1:] if not arg.startswith("--")]
+
+    unknown = set(options) - set(["frames", "output", "baseline", "threshold", "no-micro"])
+    if unknown:
+        exit(usage(argv[0]))
+
+    if not roms:
+        roms = sorted(os.path.join(ROM_DIRECTORY, name) for name in os.listdir(ROM_DIRECTORY))
+
+    frames = int(options.get("frames") or DEFAULT_FRAMES)
+    results = run_benchmarks(roms, frames, micro="no-micro" not in options)
+    print(report(results))
+
+    if options.get("output"):
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if options.get("baseline"):
+        with open(options["baseline"]) as f:
+            baseline = json.load(f)
+
+        threshold = float(options.get("threshold") or DEFAULT_THRESHOLD)
+        changes = compare(baseline, results, threshold)
+
+        print("")
+        for metric, old, new, change, regressed in changes:
+            print("{0:<32} {1:>14.3f} {2:>14.3f} {3:>+8.1f}%{4}".format(
+                metric, old, new, change, "  REGRESSION" if regressed else ""))
+
+        if any(regressed for _, _, _, _, regressed in changes):
+            return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,487 @@
+import os
+import struct
+import sys
+import zlib
+from .cpu import HEIGHT, WIDTH
+
+"""
+
+Streaming capture of CHIP-8 frames to compressed files
+
+Frames are packed to one bit per pixel and XORed against the previous
+frame, then written to an append-only file in zlib-compressed chunks. The
+first frame of every chunk is XORed against a blank frame, so any frame
+can be decoded from the start of its chunk. An index of chunk offsets is
+appended when the capture is closed, and rebuilt by scanning the chunks if
+the writer never closed the file.
+
+File layout:
+
+    header    MAGIC, width, height
+    chunk     first frame, frame count, compressed length, zlib data
+    ...
+    index     (first frame, offset) for every chunk
+    footer    index offset, chunk count, frame count, INDEX_MAGIC
+
+"""
+
+# Usage
+REQUIRED_ARGS = 3
+
+# File format
+MAGIC = b"C8CAP1"
+INDEX_MAGIC = b"C8IDX1"
+HEADER = struct.Struct("<6sHH")
+CHUNK = struct.Struct("<QII")
+INDEX_ENTRY = struct.Struct("<QQ")
+FOOTER = struct.Struct("<QQQ6s")
+
+# Capture parameters
+FRAME_SIZE = (WIDTH * HEIGHT) // 8
+DEFAULT_CHUNK_FRAMES = 256
+
+# Translation tables between one byte per pixel and the characters of a
+# binary number
+TO_BINARY = bytes.maketrans(b"\x00\x01", b"01")
+FROM_BINARY = bytes.maketrans(b"01", b"\x00\x01")
+
+def pack_frame(gfx):
+    """
+
+    Pack a framebuffer of one byte per pixel into one bit per pixel
+
+    @param gfx the framebuffer
+    @returns the packed frame as an integer, with pixel 0 the highest bit
+
+    """
+    return int(bytes(gfx).translate(TO_BINARY), 2)
+
+def unpack_frame(packed):
+    """
+
+    Unpack a frame packed by pack_frame()
+
+    @param packed the packed frame as an integer
+    @returns the framebuffer as bytes of one byte per pixel
+
+    """
+    return format(packed, "0{0}b".format(WIDTH * HEIGHT)).encode("ascii").translate(FROM_BINARY)
+
+class FrameWriter(object):
+    """
+
+    Appends frames to a capture file
+
+    """
+
+    def __init__(self, path, every=1, chunk_frames=DEFAULT_CHUNK_FRAMES):
+        """
+
+        Create a new capture file
+
+        @param path the location of the file to write
+        @param every record every Nth frame passed to capture()
+        @param chunk_frames the number of frames in each compressed chunk
+
+        """
+        self.file = open(path, "wb")
+        self.every = every
+        self.chunk_frames = chunk_frames
+        self.index = []
+        self.pending = []
+        self.previous = 0
+        self.presented = 0
+        self.frames = 0
+
+        self.file.write(HEADER.pack(MAGIC, WIDTH, HEIGHT))
+
+    def capture(self, gfx):
+        """
+
+        Offer a presented frame, recording it if it is every Nth frame
+
+        @param gfx the framebuffer presented
+
+        """
+        if self.presented % self.every == 0:
+            self.write(gfx)
+        self.presented += 1
+
+    def write(self, gfx):
+        """
+
+        Record a frame
+
+        @param gfx the framebuffer to record
+
+        """
+        frame = pack_frame(gfx)
+
+        # The first frame of every chunk is stored whole
+        previous = self.previous if self.pending else 0
+        self.pending.append((frame ^ previous).to_bytes(FRAME_SIZE, "big"))
+        self.previous = frame
+        self.frames += 1
+
+        if len(self.pending) == self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """
+
+        Compress and write out any frames not yet written
+
+        """
+        if not self.pending:
+            return
+
+        data = zlib.compress(b"".join(self.pending))
+        self.index.append((self.frames - len(self.pending), self.file.tell()))
+        self.file.write(CHUNK.pack(self.frames - len(self.pending), len(self.pending), len(data)))
+        self.file.write(data)
+        self.file.flush()
+        self.pending = []
+
+    def close(self):
+        """
+
+        Write out the remaining frames and the index, then close the file
+
+        """
+        self.flush()
+
+        offset = self.file.tell()
+        for first, position in self.index:
+            self.file.write(INDEX_ENTRY.pack(first, position))
+        self.file.write(FOOTER.pack(offset, len(self.index), self.frames, INDEX_MAGIC))
+        self.file.close()
+
+class FrameReader(object):
+    """
+
+    Reads frames from a capture file in any order
+
+    """
+
+    def __init__(self, path):
+        """
+
+        Open a capture file
+
+        @param path the location of the file to read
+
+        """
+        self.file = open(path, "rb")
+        magic, width, height = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or (width, height) != (WIDTH, HEIGHT):
+            self.file.close()
+            raise ValueError("{0} is not a CHIP-8 capture".format(path))
+
+        if not self._read_index():
+            self._scan_index()
+
+        self.cached = None
+
+    def _read_index(self):
+        """
+
+        Read the index written when the capture was closed
+
+        @returns True if the file has an index
+
+        """
+        size = self.file.seek(0, os.SEEK_END)
+        if size < HEADER.size + FOOTER.size:
+            return False
+
+        self.file.seek(size - FOOTER.size)
+        offset, chunks, frames, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != INDEX_MAGIC:
+            return False
+
+        self.file.seek(offset)
+        self.index = [INDEX_ENTRY.unpack(self.file.read(INDEX_ENTRY.size)) for _ in range(chunks)]
+        self.frames = frames
+        return True
+
+    def _scan_index(self):
+        """
+
+        Rebuild the index by walking the chunks of an unclosed capture,
+        ignoring any chunk that was only partly written
+
+        """
+        size = self.file.seek(0, os.SEEK_END)
+        position = HEADER.size
+        self.index = []
+        self.frames = 0
+
+        while position + CHUNK.size <= size:
+            self.file.seek(position)
+            first, count, length = CHUNK.unpack(self.file.read(CHUNK.size))
+            if position + CHUNK.size + length > size:
+                break
+
+            self.index.append((first, position))
+            self.frames = first + count
+            position += CHUNK.size + length
+
+    def __len__(self):
+        """
+
+        The number of frames in the capture
+
+        """
+        return self.frames
+
+    def _chunk(self, number):
+        """
+
+        Decode every frame of a chunk, keeping the most recent chunk cached
+
+        @param number the index of the chunk
+        @returns a list of the chunk's frames as packed integers
+
+        """
+        if self.cached is not None and self.cached[0] == number:
+            return self.cached[1]
+
+        self.file.seek(self.index[number][1])
+        _, count, length = CHUNK.unpack(self.file.read(CHUNK.size))
+        data = zlib.decompress(self.file.read(length))
+
+        frames = []
+        frame = 0
+        for n in range(count):
+            frame ^= int.from_bytes(data[n * FRAME_SIZE:(n + 1) * FRAME_SIZE], "big")
+            frames.append(frame)
+
+        self.cached = (number, frames)
+        return frames
+
+    def frame(self, n):
+        """
+
+        Decode a single frame
+
+        @param n the number of the frame
+        @returns the framebuffer as bytes of one byte per pixel
+
+        """
+        if not 0 <= n < self.frames:
+            raise IndexError("frame {0} is not in the capture".format(n))
+
+        # Find the last chunk starting at or before the frame
+        low, high = 0, len(self.index) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.index[middle][0] <= n:
+                low = middle
+            else:
+                high = middle - 1
+
+        return unpack_frame(self._chunk(low)[n - self.index[low][0]])
+
+    def frames_between(self, start=0, stop=None):
+        """
+
+        Decode a range of frames
+
+        @param start the number of the first frame
+        @param stop the number of the frame after the last, or None for all
+        @returns a generator of framebuffers
+
+        """
+        stop = self.frames if stop is None else min(stop, self.frames)
+        for n in range(start, stop):
+            yield self.frame(n)
+
+    def close(self):
+        """
+
+        Close the capture file
+
+        """
+        self.file.close()
+
+def scale_frame(gfx, scale):
+    """
+
+    Enlarge a framebuffer by repeating every pixel
+
+    @param gfx the framebuffer
+    @param scale the number of times each pixel is repeated in each direction
+    @returns a list of rows, each of bytes of one byte per pixel
+
+    """
+    rows = []
+    for y in range(HEIGHT):
+        row = bytes(pixel for pixel in gfx[y * WIDTH:(y + 1) * WIDTH] for _ in range(scale))
+        rows.extend([row] * scale)
+
+    return rows
+
+def png_chunk(kind, data):
+    """
+
+    Build a PNG chunk
+
+    @param kind the four byte chunk type
+    @param data the chunk data
+    @returns the chunk as bytes
+
+    """
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def write_png(path, gfx, scale=1):
+    """
+
+    Write a framebuffer to a black and white PNG file
+
+    @param path the location of the file to write
+    @param gfx the framebuffer
+    @param scale the number of times each pixel is repeated in each direction
+
+    """
+    rows = scale_frame(gfx, scale)
+    raw = b"".join(b"\x00" + row.replace(b"\x01", b"\xff") for row in rows)
+    header = struct.pack(">IIBBBBB", WIDTH * scale, HEIGHT * scale, 8, 0, 0, 0, 0)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(png_chunk(b"IHDR", header))
+        f.write(png_chunk(b"IDAT", zlib.compress(raw)))
+        f.write(png_chunk(b"IEND", b""))
+
+def lzw_encode(pixels, min_code_size=2):
+    """
+
+    Compress pixels with the variable-length LZW coding used by GIF
+
+    @param pixels the color index of every pixel
+    @param min_code_size the minimum code size
+    @returns the compressed data as bytes
+
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+    bits = 0
+    count = 0
+
+    def emit(code, size):
+        nonlocal bits, count
+        bits |= code << count
+        count += size
+        while count >= 8:
+            out.append(bits & 0xFF)
+            bits >>= 8
+            count -= 8
+
+    table = {}
+    size = min_code_size + 1
+    next_code = end + 1
+    emit(clear, size)
+
+    prefix = pixels[0]
+    for pixel in pixels[1:]:
+        key = (prefix, pixel)
+        if key in table:
+            prefix = table[key]
+            continue
+
+        emit(prefix, size)
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+            if next_code > (1 << size) and size < 12:
+                size += 1
+        else:
+            emit(clear, size)
+            table = {}
+            size = min_code_size + 1
+            next_code = end + 1
+        prefix = pixel
+
+    emit(prefix, size)
+    emit(end, size)
+    if count > 0:
+        out.append(bits & 0xFF)
+
+    return bytes(out)
+
+def write_gif(path, frames, scale=1, delay=2):
+    """
+
+    Write a sequence of framebuffers to a looping, animated GIF file
+
+    @param path the location of the file to write
+    @param frames an iterable of framebuffers
+    @param scale the number of times each pixel is repeated in each direction
+    @param delay the time each frame is shown for, in hundredths of a second
+
+    """
+    width = WIDTH * scale
+    height = HEIGHT * scale
+
+    with open(path, "wb") as f:
+        f.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0x80, 0, 0))
+        f.write(b"\x00\x00\x00\xff\xff\xff")
+
+        # Loop forever
+        f.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+        for gfx in frames:
+            f.write(b"\x21\xf9\x04\x00" + struct.pack("<H", delay) + b"\x00\x00")
+            f.write(b"\x2c" + struct.pack("<HHHHB", 0, 0, width, height, 0))
+
+            data = lzw_encode(b"".join(scale_frame(gfx, scale)))
+            f.write(b"\x02")
+            for start in range(0, len(data), 255):
+                block = data[start:start + 255]
+                f.write(bytes([len(block)]) + block)
+            f.write(b"\x00")
+
+        f.write(b"\x3b")
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.capture capture (output.gif | directory) [start] [stop] [scale]"
+
+def main(argv):
+    """
+
+    Export a range of frames from a capture to an animated GIF, or to a
+    directory of numbered PNG files
+
+    @param argv the argument values
+
+    """
+    if len(argv) < REQUIRED_ARGS:
+        exit(usage(argv[0]))
+
+    reader = FrameReader(argv[1])
+    output = argv[2]
+    start = int(argv[3]) if len(argv) > 3 else 0
+    stop = int(argv[4]) if len(argv) > 4 else None
+    scale = int(argv[5]) if len(argv) > 5 else 4
+
+    if output.lower().endswith(".gif"):
+        write_gif(output, reader.frames_between(start, stop), scale)
+    else:
+        if not os.path.isdir(output):
+            os.makedirs(output)
+        for n, gfx in enumerate(reader.frames_between(start, stop), start):
+            write_png(os.path.join(output, "frame-{0:06d}.png".format(n)), gfx, scale)
+
+    reader.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,352 @@
+import json
+from collections import namedtuple
+from .cpu import PROGRAM_COUNTER_START
+from .isa import decode, operands
+
+"""
+
+Recursive-descent control flow analysis of CHIP-8 programs
+
+Starting from the entry point, a ControlFlowGraph follows jumps, calls,
+returns and skips to find every instruction that can be reached, so sprite
+data between routines is never mistaken for code and code at odd addresses
+is still found. The instructions are split into basic blocks at every
+branch target.
+
+Bytes that ANNN points I at and that a DXYN, FX33, FX55 or FX65 in the same
+block then reads or writes are marked as data. Jump targets, subroutines
+and data are given labels. The graph can be exported as JSON for other
+tools, and its subroutines as a symbols file for the profiler.
+
+"""
+
+Block = namedtuple("Block", ["start", "end", "instructions", "successors", "kind"])
+
+# How a block ends: None is used while an instruction falls through
+FALLTHROUGH = "fallthrough"
+JUMP = "jump"
+CALL = "call"
+RETURN = "return"
+SKIP = "skip"
+INDIRECT = "indirect"
+INVALID = "invalid"
+
+# Instructions that skip the next instruction when their condition holds
+SKIPS = ("3XNN", "4XNN", "5XY0", "9XY0", "EX9E", "EXA1")
+
+# Instructions that access memory at I, with the number of bytes accessed
+ACCESSES = {
+    "DXYN" : lambda fields: fields["n"],
+    "FX33" : lambda fields: 3,
+    "FX55" : lambda fields: fields["x"] + 1,
+    "FX65" : lambda fields: fields["x"] + 1}
+
+# The most values of I followed at once before it is treated as unknown
+MAX_I_VALUES = 16
+
+class ControlFlowGraph(object):
+    """
+
+    The basic blocks of a CHIP-8 program reachable from its entry point
+
+    """
+
+    def __init__(self, program, origin=PROGRAM_COUNTER_START, entry=None):
+        """
+
+        Analyse a program
+
+        @param program the bytes of the program
+        @param origin the address the program is loaded at
+        @param entry the address execution starts at, the origin by default
+
+        """
+        self.program = bytes(program)
+        self.origin = origin
+        self.entry = origin if entry is None else entry
+
+        # Instructions by address, as (opcode, Instruction or None) pairs,
+        # and how each one passes control on
+        self.instructions = {}
+        self.flow = {}
+
+        # Subroutines, branch targets outside the program, and the
+        # (instruction, start, length) memory references found
+        self.functions = set()
+        self.external = set()
+        self.references = []
+
+        self.explore()
+        self.blocks = self.split()
+        self.data = self.find_data()
+        self.labels = self.name()
+
+    def contains(self, address, length=1):
+        """
+
+        Check whether bytes lie within the program
+
+        @param address the first address
+        @param length the number of bytes
+        @returns True if every byte is part of the program
+
+        """
+        return self.origin <= address and address + length <= self.origin + len(self.program)
+
+    def opcode(self, address):
+        """
+
+        Read the opcode at an address of the program
+
+        @param address the address
+        @returns the opcode
+
+        """
+        offset = address - self.origin
+        return (self.program[offset] << 8) | self.program[offset + 1]
+
+    def step(self, address, opcode, entry):
+        """
+
+        Find where control goes after an instruction
+
+        @param address the address of the instruction
+        @param opcode the opcode
+        @param entry the Instruction, or None if the opcode is invalid
+        @returns a (successors, kind) pair, where kind is None if the
+                 instruction simply falls through to the next one
+
+        """
+        if entry is None:
+            return (), INVALID
+
+        name = entry.name
+        if name == "1NNN":
+            return (opcode & 0x0FFF,), JUMP
+        elif name == "2NNN":
+            self.functions.add(opcode & 0x0FFF)
+            return (opcode & 0x0FFF, address + 2), CALL
+        elif name == "00EE":
+            return (), RETURN
+        elif name == "BNNN":
+            return (), INDIRECT
+        elif name in SKIPS:
+            return (address + 2, address + 4), SKIP
+
+        return (address + 2,), None
+
+    def explore(self):
+        """
+
+        Find every instruction reachable from the entry point
+
+        """
+        work = [self.entry]
+        while work:
+            address = work.pop()
+            if address in self.instructions:
+                continue
+
+            if not self.contains(address, 2):
+                self.external.add(address)
+                continue
+
+            opcode = self.opcode(address)
+            try:
+                entry = decode(opcode)
+            except KeyError:
+                entry = None
+
+            self.instructions[address] = (opcode, entry)
+            self.flow[address] = self.step(address, opcode, entry)
+            work.extend(self.flow[address][0])
+
+    def split(self):
+        """
+
+        Split the reachable instructions into basic blocks
+
+        @returns a dictionary mapping the start of each block to the Block
+
+        """
+        leaders = set([self.entry])
+        for successors, kind in self.flow.values():
+            if kind is not None:
+                leaders.update(successors)
+
+        blocks = {}
+        for start in sorted(leaders):
+            if start not in self.instructions:
+                continue
+
+            address = start
+            addresses = [address]
+            successors, kind = self.flow[address]
+            while kind is None:
+                if address + 2 in leaders or address + 2 not in self.instructions:
+                    kind = FALLTHROUGH
+                    break
+
+                address += 2
+                addresses.append(address)
+                successors, kind = self.flow[address]
+
+            blocks[start] = Block(start, address + 2, tuple(addresses), tuple(successors), kind)
+
+        return blocks
+
+    def follow_i(self, block, i, references=None):
+        """
+
+        Follow the possible values of I through a block
+
+        @param block the Block
+        @param i the set of values I may hold on entry, or None if unknown
+        @param references an optional list to add the (instruction, start,
+                          length) accesses through a known I to
+        @returns the set of values I may hold on exit, or None if unknown
+
+        """
+        for address in block.instructions:
+            opcode, entry = self.instructions[address]
+            if entry is None:
+                break
+            elif entry.name == "ANNN":
+                i = frozenset([opcode & 0x0FFF])
+            elif entry.name in ("FX1E", "FX29"):
+                i = None
+            elif i is not None and references is not None and entry.name in ACCESSES:
+                length = ACCESSES[entry.name](operands(entry, opcode))
+                if length > 0:
+                    references.extend((address, start, length) for start in sorted(i))
+
+        return i
+
+    def find_data(self):
+        """
+
+        Find the bytes of the program accessed through I. The values I may
+        hold at the start of a block are those left by every block leading
+        to it, and I is unknown when a call returns.
+
+        @returns a sorted list of merged (start, length) data regions
+
+        """
+        known = {self.entry: None}
+        work = [self.entry]
+        while work:
+            block = self.blocks[work.pop()]
+            leaving = self.follow_i(block, known[block.start])
+
+            for index, successor in enumerate(block.successors):
+                if successor not in self.blocks:
+                    continue
+
+                # A subroutine may change I before it returns
+                i = None if block.kind == CALL and index == 1 else leaving
+
+                if successor not in known:
+                    value = i
+                elif known[successor] is None or i is None:
+                    value = None
+                else:
+                    value = known[successor] | i
+                    if len(value) > MAX_I_VALUES:
+                        value = None
+
+                if successor not in known or known[successor] != value:
+                    known[successor] = value
+                    work.append(successor)
+
+        for start, block in self.blocks.items():
+            self.follow_i(block, known.get(start), self.references)
+
+        regions = []
+        for start, end in sorted((start, start + length) for _, start, length in self.references):
+            start = max(start, self.origin)
+            end = min(end, self.origin + len(self.program))
+            if start >= end:
+                continue
+
+            if regions and start <= regions[-1][1]:
+                regions[-1][1] = max(regions[-1][1], end)
+            else:
+                regions.append([start, end])
+
+        return [(start, end - start) for start, end in regions]
+
+    def name(self):
+        """
+
+        Label the entry point, subroutines, jump targets and data
+
+        @returns a dictionary mapping addresses to labels
+
+        """
+        labels = {}
+        for _, start, _ in self.references:
+            if self.contains(start):
+                labels[start] = "data_{0:03X}".format(start)
+
+        for block in self.blocks.values():
+            if block.kind == JUMP and block.successors[0] in self.instructions:
+                labels[block.successors[0]] = "L_{0:03X}".format(block.successors[0])
+
+        for address in self.functions:
+            if address in self.instructions:
+                labels[address] = "sub_{0:03X}".format(address)
+
+        labels[self.entry] = "start"
+        return labels
+
+    def is_data(self, address):
+        """
+
+        Check whether an address lies within a data region
+
+        @param address the address
+        @returns True if the address is data
+
+        """
+        return any(start <= address < start + length for start, length in self.data)
+
+    def to_dict(self):
+        """
+
+        Describe the graph with plain values
+
+        @returns a dictionary that can be written as JSON
+
+        """
+        return {
+            "origin": self.origin,
+            "entry": self.entry,
+            "blocks": [{"start": block.start, "end": block.end,
+                        "instructions": list(block.instructions),
+                        "successors": list(block.successors), "kind": block.kind}
+                       for _, block in sorted(self.blocks.items())],
+            "functions": sorted(address for address in self.functions if address in self.instructions),
+            "external": sorted(self.external),
+            "data": [list(region) for region in self.data],
+            "labels": dict(("{0:X}".format(address), label) for address, label in sorted(self.labels.items()))}
+
+    def to_json(self):
+        """
+
+        Write the graph as JSON
+
+        @returns the JSON text
+
+        """
+        return json.dumps(self.to_dict(), indent=1, sort_keys=True)
+
+    def symbols(self):
+        """
+
+        Write the subroutines as a symbols file for chip8.profiler
+
+        @returns the text of the file
+
+        """
+        return "".join("{0:03X} {1}\n".format(address, self.labels[address])
+                       for address in sorted(self.functions) if address in self.labels)
@@ -1,13 +1,14 @@
-import sys
-import pygame
-from pygame import HWSURFACE
-from time import sleep
-from cpu import CPU, HEIGHT, WIDTH
+from time import perf_counter, sleep
+from .cpu import CPU, CYCLES_PER_FRAME, HEIGHT, KEY_MAP, WIDTH
+from .threaded import EmulationThread, FrameBuffer, FRAME_RATE
 
 """
 
 Contains the main driver function for the CHIP-8 emulator
 
+pygame and the modules behind the optional features are only imported once
+they are needed, so a --headless run never loads SDL.
+
 @author Steven Briggs
 @version 2015.05.17
 
@@ -16,9 +17,6 @@ Contains the main driver function for the CHIP-8 emulator
 # Usage
 REQUIRED_ARGS = 2
 
-# Timing
-DELAY = 0.001
-
 # Screen display
 SCALE = 10
 DEPTH = 8
@@ -35,7 +33,24 @@ def usage(program):
 
     """
 
-    return "Usage: python {0} rom".format(program)
+    return ("Usage: python -m chip8 [--threaded | --headless [--frames=n]] [--shared[=name]] "
+            "[--capture=path] [--metrics=port|path] [--stats=seconds] rom")
+
+def open_window():
+    """
+
+    Initialise pygame and open a window to draw the emulator to
+
+    @returns the screen to be drawn to
+
+    """
+    import pygame
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH * SCALE, HEIGHT * SCALE), pygame.HWSURFACE, DEPTH)
+    pygame.display.set_caption("CHIP-8")
+
+    return screen
 
 def draw(screen, gfx):
     """
@@ -46,7 +61,8 @@ def draw(screen, gfx):
     @param gfx the graphics to draw to the screen
 
     """
-    
+    import pygame
+
     for y in range(HEIGHT):
         for x in range(WIDTH):
             if gfx[(y * WIDTH) + x]:
@@ -56,6 +72,16 @@ def draw(screen, gfx):
 
     pygame.display.flip()
 
+def beep(cpu):
+    """
+
+    Sound the beep when the sound timer expires
+
+    @param cpu the CPU whose sound timer expired
+
+    """
+    print("Beep!")
+
 def main(argv):
     """
 
@@ -65,36 +91,243 @@ def main(argv):
 
     """
 
+    options = [arg for arg in argv[1:] if arg.startswith("--")]
+    args = [arg for arg in argv if not arg.startswith("--")]
+
     # Check that there are enough arguments to run the emulator
-    if len(argv) < REQUIRED_ARGS:
+    if len(args) < REQUIRED_ARGS:
         exit(usage(argv[0]))
 
     # Prepare the emulator
     cpu = CPU()
-    cpu.load_rom(argv[1])
+    cpu.load_rom(args[1])
+    cpu.on_beep = beep
 
-    # Prepare the screen to be displayed
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH * SCALE, HEIGHT * SCALE), HWSURFACE, DEPTH)
-    pygame.display.set_caption("CHIP-8")
+    # Prepare the screen to be displayed, unless running headless
+    headless = "--headless" in options
+    screen = None if headless else open_window()
+
+    # Optionally export the machine state to other processes every frame,
+    # and record every presented frame to a capture file
+    shared = None
+    on_frame = None
+    capture = None
+    on_draw = None
+    metrics = None
+    server = None
+    frames = None
+    for option in options:
+        if option == "--shared" or option.startswith("--shared="):
+            from .shm import SharedState
+            shared = SharedState(option.partition("=")[2] or None)
+            on_frame = shared.publish
+            print("Sharing state as {0}".format(shared.name))
+        elif option.startswith("--capture="):
+            from .capture import FrameWriter
+            capture = FrameWriter(option.partition("=")[2])
+            on_draw = capture.capture
+        elif option.startswith("--metrics="):
+            from .metrics import Metrics, MetricsServer
+            metrics = metrics or Metrics()
+            server = MetricsServer(metrics, option.partition("=")[2])
+            print("Serving metrics on {0}".format(server.address))
+        elif option.startswith("--stats="):
+            from .metrics import Metrics
+            metrics = metrics or Metrics()
+            metrics.log_interval = float(option.partition("=")[2])
+        elif option.startswith("--frames="):
+            frames = int(option.partition("=")[2])
+
+    try:
+        if headless:
+            run_headless(cpu, frames, on_frame, on_draw, metrics)
+        elif "--threaded" in options:
+            run_threaded(cpu, screen, on_frame, on_draw, metrics)
+        else:
+            run(cpu, screen, on_frame, on_draw, metrics)
+    finally:
+        if server is not None:
+            server.close()
+        if shared is not None:
+            shared.close()
+        if capture is not None:
+            capture.close()
+
+def handle_events(cpu):
+    """
+
+    Apply every queued event, translating key presses and releases to the
+    keypad with a single lookup each
+
+    @param cpu the CPU to update
+    @returns a (running, pressed) pair telling whether the window is still
+             open and whether any keypad key was pressed
+
+    """
+    import pygame
+
+    running = True
+    pressed = False
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+        elif event.type == pygame.KEYDOWN or event.type == pygame.KEYUP:
+            key = KEY_MAP.get(event.key)
+            if key is not None:
+                cpu.keys[key] = event.type == pygame.KEYDOWN
+                pressed = pressed or cpu.keys[key]
+
+    return running, pressed
+
+def run(cpu, screen, on_frame=None, on_draw=None, metrics=None):
+    """
+
+    Run the emulator, polling events and drawing on the same thread as the
+    CPU. Events are polled and the screen is drawn once per frame.
+
+    @param cpu the CPU to run
+    @param screen the screen to be drawn to
+    @param on_frame an optional function called with the CPU after every frame
+    @param on_draw an optional function called with every presented frame
+    @param metrics an optional Metrics to record each frame in
+
+    """
 
     # Emulation loop
+    deadline = perf_counter()
+    pressed_at = None
     running = True
     while running:
-        cpu.execute_cycle()
+        start = perf_counter()
+        running, pressed = handle_events(cpu)
+        if pressed and pressed_at is None:
+            pressed_at = start
+
+        polled = perf_counter()
+        cpu.run(CYCLES_PER_FRAME)
+        ran = perf_counter()
+
+        if on_frame is not None:
+            on_frame(cpu)
 
         if cpu.shouldDraw:
             draw(screen, cpu.gfx)
             cpu.shouldDraw = False
 
-        # Consume any events that occured in the past cycle
-        for event in pygame.event.get():
-            cpu.update_keys(pygame.key.get_pressed())
-            
-            if event.type == pygame.QUIT:
-                running = False
+            if on_draw is not None:
+                on_draw(cpu.gfx)
+
+            if pressed_at is not None:
+                if metrics is not None:
+                    metrics.input_latency(perf_counter() - pressed_at)
+                pressed_at = None
+
+        # Sleep until the next frame is due, without trying to catch up if we
+        # have fallen more than a frame behind
+        deadline = max(deadline + 1.0 / FRAME_RATE, perf_counter() - 1.0 / FRAME_RATE)
+        delay = deadline - perf_counter()
+
+        if metrics is not None:
+            metrics.timing("events", polled - start)
+            metrics.timing("cpu", ran - polled)
+            metrics.timing("render", perf_counter() - ran)
+            metrics.frame(CYCLES_PER_FRAME, delay <= 0)
+
+        if delay > 0:
+            sleep(delay)
+
+def run_headless(cpu, frames=None, on_frame=None, on_draw=None, metrics=None):
+    """
+
+    Run the emulator as fast as possible without a display or any input
+
+    @param cpu the CPU to run
+    @param frames the number of frames to run, or None to run forever
+    @param on_frame an optional function called with the CPU after every frame
+    @param on_draw an optional function called with every frame drawn
+    @param metrics an optional Metrics to record each frame in
+
+    """
+    frame = 0
+    while frames is None or frame < frames:
+        start = perf_counter()
+        cpu.run(CYCLES_PER_FRAME)
+
+        if on_frame is not None:
+            on_frame(cpu)
+
+        if cpu.shouldDraw:
+            cpu.shouldDraw = False
+
+            if on_draw is not None:
+                on_draw(cpu.gfx)
+
+        if metrics is not None:
+            metrics.timing("cpu", perf_counter() - start)
+            metrics.frame(CYCLES_PER_FRAME)
+
+        frame += 1
+
+def run_threaded(cpu, screen, on_frame=None, on_draw=None, metrics=None):
+    """
+
+    Run the CPU on a worker thread while this thread polls events and draws
+    the latest completed frame
+
+    @param cpu the CPU to run
+    @param screen the screen to be drawn to
+    @param on_frame an optional function called with the CPU after every
+                    frame, on the worker thread
+    @param on_draw an optional function called with every presented frame
+    @param metrics an optional Metrics to record each frame in
+
+    """
+    import pygame
+
+    framebuffer = FrameBuffer(WIDTH * HEIGHT)
+    emulation = EmulationThread(cpu, framebuffer, on_frame=on_frame, metrics=metrics)
+    emulation.start()
+
+    # Presentation loop
+    clock = pygame.time.Clock()
+    presented = 0
+    pressed_at = None
+    running = True
+    while running and emulation.is_alive():
+        start = perf_counter()
+        running, pressed = handle_events(cpu)
+        if pressed and pressed_at is None:
+            pressed_at = start
+
+        if metrics is not None:
+            metrics.timing("events", perf_counter() - start)
+            start = perf_counter()
+
+        latest = framebuffer.acquire()
+        if latest is not None and latest[0] != presented:
+            # Frames published since the last one presented were never seen
+            if metrics is not None and latest[0] > presented + 1:
+                metrics.dropped(latest[0] - presented - 1)
+
+            presented, gfx = latest
+            draw(screen, gfx)
+
+            if on_draw is not None:
+                on_draw(gfx)
+
+            if pressed_at is not None:
+                if metrics is not None:
+                    metrics.input_latency(perf_counter() - pressed_at)
+                pressed_at = None
+        framebuffer.release()
+
+        if metrics is not None:
+            metrics.timing("render", perf_counter() - start)
+
+        clock.tick(FRAME_RATE)
 
-        sleep(DELAY)
+    emulation.stop()
+    emulation.join()
 
-if __name__ == "__main__":
-    sys.exit(main(sys.argv))
\ No newline at end of file
+    if emulation.error is not None:
+        raise emulation.error
@@ -0,0 +1,244 @@
+import numpy as np
+from .cpu import MEMORY
+
+"""
+
+Per-address code and data coverage for the CHIP-8 CPU
+
+A Coverage object attached to CPU.coverage records which memory addresses
+are executed as instructions, read as data (DXYN, FX65) and written as data
+(FX33, FX55). Coverage is kept as three packed bitmaps of one bit per
+address, which are exported as they are and can be merged across runs and
+processes with a bitwise OR.
+
+"""
+
+# File format: a magic number followed by the executed, read and written
+# bitmaps in that order
+MAGIC = b"C8COV1"
+BITMAP_SIZE = MEMORY // 8
+
+def unpack(bitmap):
+    """
+
+    Unpack a bitmap into a sequence of one byte per address flags
+
+    @param bitmap the bitmap, with address 0 in the lowest bit
+    @returns a bytearray holding 0 or 1 for every address
+
+    """
+    return bytearray(np.unpackbits(np.frombuffer(bytes(bitmap), dtype=np.uint8), bitorder="little").tobytes())
+
+def addresses(bitmap):
+    """
+
+    List the addresses set in a bitmap
+
+    @param bitmap the bitmap, with address 0 in the lowest bit
+    @returns a sorted list of addresses
+
+    """
+    return np.flatnonzero(np.frombuffer(unpack(bitmap), dtype=np.uint8)).tolist()
+
+def merge_bitmaps(a, b):
+    """
+
+    Merge two packed bitmaps of equal length
+
+    @param a the first bitmap
+    @param b the second bitmap
+    @returns the bitwise OR of both bitmaps
+
+    """
+    merged = int.from_bytes(a, "little") | int.from_bytes(b, "little")
+    return merged.to_bytes(len(a), "little")
+
+def is_coverage(data):
+    """
+
+    Check whether data is coverage exported by Coverage.to_bytes()
+
+    @param data the bytes to check
+    @returns True if data holds exported coverage
+
+    """
+    return data[:len(MAGIC)] == MAGIC and len(data) == len(MAGIC) + 3 * BITMAP_SIZE
+
+class Coverage(object):
+    """
+
+    A record of the memory addresses executed, read and written by a CPU
+
+    """
+
+    def __init__(self):
+        """
+
+        Create a new, empty Coverage object
+
+        """
+        # Bitmaps of one bit per address, with address 0 in the lowest bit
+        self.executed = bytearray(BITMAP_SIZE)
+        self.reads = bytearray(BITMAP_SIZE)
+        self.writes = bytearray(BITMAP_SIZE)
+
+    def execute(self, addr):
+        """
+
+        Mark the two bytes of the instruction at addr as executed
+
+        @param addr the address of the instruction
+
+        """
+        # The two bits only cross into the next byte at odd addresses
+        index = addr >> 3
+        bits = 0x3 << (addr & 0x7)
+        self.executed[index] |= bits & 0xFF
+        if bits > 0xFF and index + 1 < BITMAP_SIZE:
+            self.executed[index + 1] |= 0x1
+
+    def read(self, addr, length):
+        """
+
+        Mark a range of addresses as read as data
+
+        @param addr the first address read
+        @param length the number of bytes read
+
+        """
+        self._mark(self.reads, addr, length)
+
+    def write(self, addr, length):
+        """
+
+        Mark a range of addresses as written as data
+
+        @param addr the first address written
+        @param length the number of bytes written
+
+        """
+        self._mark(self.writes, addr, length)
+
+    def _mark(self, flags, addr, length):
+        """
+
+        Set the bits for a range of addresses, ignoring any part of the
+        range that falls outside of main memory
+
+        @param flags the bitmap to set bits in
+        @param addr the first address of the range
+        @param length the number of addresses in the range
+
+        """
+        for addr in range(addr, min(addr + length, MEMORY)):
+            flags[addr >> 3] |= 1 << (addr & 0x7)
+
+    def code(self):
+        """
+
+        List the addresses executed as instructions
+
+        @returns a list of addresses
+
+        """
+        return addresses(self.executed)
+
+    def data(self):
+        """
+
+        List the addresses accessed as data but never executed
+
+        @returns a list of addresses
+
+        """
+        accessed = int.from_bytes(merge_bitmaps(self.reads, self.writes), "little")
+        data = accessed & ~int.from_bytes(self.executed, "little")
+        return addresses(data.to_bytes(BITMAP_SIZE, "little"))
+
+    def merge(self, other):
+        """
+
+        Add the coverage recorded by another Coverage object to this one
+
+        @param other the Coverage object to merge in
+
+        """
+        for name in ("executed", "reads", "writes"):
+            bitmap = np.frombuffer(getattr(self, name), dtype=np.uint8)
+            np.bitwise_or(bitmap, np.frombuffer(getattr(other, name), dtype=np.uint8), out=bitmap)
+
+    def to_bytes(self):
+        """
+
+        Export the coverage bitmaps
+
+        @returns the exported coverage as bytes
+
+        """
+        return MAGIC + bytes(self.executed) + bytes(self.reads) + bytes(self.writes)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+
+        Import coverage exported by to_bytes()
+
+        @param data the exported coverage
+        @returns a new Coverage object
+
+        """
+        if not is_coverage(data):
+            raise ValueError("not a CHIP-8 coverage file")
+
+        coverage = cls()
+        start = len(MAGIC)
+        for name in ("executed", "reads", "writes"):
+            setattr(coverage, name, bytearray(data[start:start + BITMAP_SIZE]))
+            start += BITMAP_SIZE
+
+        return coverage
+
+    def save(self, path):
+        """
+
+        Write the coverage to a file
+
+        @param path the location of the file to write
+
+        """
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+
+        Read coverage from a file written by save()
+
+        @param path the location of the file to read
+        @returns a new Coverage object
+
+        """
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+def merge_files(paths):
+    """
+
+    Merge the coverage files written by many runs without unpacking them
+
+    @param paths the locations of the coverage files
+    @returns the merged coverage as bytes in the format of to_bytes()
+
+    """
+    merged = None
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if not is_coverage(data):
+            raise ValueError("{0} is not a CHIP-8 coverage file".format(path))
+
+        merged = data if merged is None else MAGIC + merge_bitmaps(merged[len(MAGIC):], data[len(MAGIC):])
+
+    return merged
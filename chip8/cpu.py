@@ -1,7 +1,6 @@
-import struct
-import pygame
-from pygame.locals import  *
 from random import randint
+from types import MappingProxyType
+from .isa import TABLES, dispatch_tables
 
 """
 
@@ -21,26 +20,14 @@ HEIGHT = 32
 WIDTH = 64
 KEYS = 16
 
-KEY_MAP = {
-    K_1 : 0x0,
-    K_2 : 0x1,
-    K_3 : 0x2,
-    K_4 : 0x3,
-    K_q : 0x4,
-    K_w : 0x5,
-    K_e : 0x6,
-    K_r : 0x7,
-    K_a : 0x8,
-    K_s : 0x9,
-    K_d : 0xA,
-    K_f : 0xB,
-    K_z : 0xC,
-    K_x : 0xD,
-    K_c : 0xE,
-    K_v : 0xF
-}
-
-FONTSET = [
+# Timing: the number of cycles executed per 60 Hz frame
+CYCLES_PER_FRAME = 10
+
+# Keys: the key codes of 1-4, Q-R, A-F and Z-V, which are the same as the
+# pygame key codes, mapped to the keypad
+KEY_MAP = dict((ord(key), val) for val, key in enumerate("1234qwerasdfzxcv"))
+
+FONTSET = (
     0xF0, 0x90, 0x90, 0x90, 0xF0, # 0
     0x20, 0x60, 0x20, 0x20, 0x70, # 1
     0xF0, 0x10, 0xF0, 0x80, 0xF0, # 2
@@ -57,7 +44,7 @@ FONTSET = [
     0xE0, 0x90, 0x90, 0x90, 0xE0, # D
     0xF0, 0x80, 0xF0, 0x80, 0xF0, # E
     0xF0, 0x80, 0xF0, 0x80, 0x80  # F
-]
+)
 
 class CPU(object):
     """
@@ -69,6 +56,22 @@ class CPU(object):
 
     """
 
+    # Instances hold only these attributes, so they need no __dict__
+    __slots__ = ("gfx", "shouldDraw", "keys", "key_wait", "memory", "v", "i", "pc", "stack", "sp", "delay",
+                 "sound", "on_beep", "coverage", "hasher", "cycles", "tracer", "memory_owners", "gfx_owners",
+                 "opcodes", "subroutine", "arthimetic", "skip_keys", "misc")
+
+    def __init_subclass__(cls, **kwargs):
+        """
+
+        Give a subclass its own shared opcode tables, so they call the
+        methods it overrides
+
+        """
+        super().__init_subclass__(**kwargs)
+        for name, entries in dispatch_tables(cls).items():
+            setattr(cls, name, entries)
+
     def __init__(self):
         """
 
@@ -76,15 +79,20 @@ class CPU(object):
 
         """
         
-        # Graphics
-        self.gfx = [0 for y in range(WIDTH * HEIGHT)]
+        # Graphics: One byte per pixel, held in a buffer so that it can be
+        # viewed without copying
+        self.gfx = bytearray(WIDTH * HEIGHT)
         self.shouldDraw = False
 
         # Keys
         self.keys = [False for x in range(KEYS)]
 
-        # Main memory
-        self.memory = [0 for x in range(MEMORY)]
+        # Key waits: While FX0A waits for a keypress, the key states it last
+        # saw, so that only a key going down counts as a press
+        self.key_wait = None
+
+        # Main memory: One byte per address
+        self.memory = bytearray(MEMORY)
 
         # Registers: 16 general purpose and an address index
         self.v = [0 for x in range(REGISTERS)]
@@ -102,61 +110,63 @@ class CPU(object):
         self.delay = 0
         self.sound = 0
 
-        # Opcode table: 'K' denotes an opcode with multiple matches
-        self.opcodes = {
-            0x0000 : self._0KKK,
-            0x1000 : self._1NNN,
-            0x2000 : self._2NNN,
-            0x3000 : self._3XNN,
-            0x4000 : self._4XNN,
-            0x5000 : self._5XY0,
-            0x6000 : self._6XNN,
-            0x7000 : self._7XNN,
-            0x8000 : self._8XYK,
-            0x9000 : self._9XY0,
-            0xA000 : self._ANNN,
-            0xB000 : self._BNNN,
-            0xC000 : self._CXNN,
-            0xD000 : self._DXYN,
-            0xE000 : self._EXKK,
-            0xF000 : self._FXKK}
-
-        # Subroutine table
-        self.subroutine = {
-            0x0000 : self._00E0, 
-            0x000E : self._00EE}
-
-        # Arthimetic table
-        self.arthimetic = {
-            0x0000 : self._8XY0,
-            0x0001 : self._8XY1,
-            0x0002 : self._8XY2,
-            0x0003 : self._8XY3,
-            0x0004 : self._8XY4, 
-            0x0005 : self._8XY5,
-            0x0006 : self._8XY6,
-            0x0007 : self._8XY7,
-            0x000E : self._8XYE}
-
-        # Skip keys table
-        self.skip_keys = {
-            0x000E : self._EX9E,
-            0x0001 : self._EXA1}
-
-        # Misc table
-        self.misc = {
-            0x0007 : self._FX07,
-            0x000A : self._FX0A,
-            0x0015 : self._FX15,
-            0x0018 : self._FX18,
-            0x001E : self._FX1E,
-            0x0029 : self._FX29,
-            0x0033 : self._FX33,
-            0x0055 : self._FX55,
-            0x0065 : self._FX65}
+        # Sound: An optional function called with the CPU whenever the sound
+        # timer expires, so that each frontend can play the beep its own way
+        self.on_beep = None
+
+        # Coverage: An optional record of the addresses executed as
+        # instructions and read or written as data
+        self.coverage = None
+
+        # State hashing: An optional StateHasher that is told which pages of
+        # memory and the framebuffer are written so only those are rehashed
+        self.hasher = None
 
+        # Tracing: The number of cycles executed, and an optional TraceWriter
+        # that records every instruction executed
+        self.cycles = 0
+        self.tracer = None
+
+        # Copy-on-write: The number of forked CPUs sharing the memory and
+        # framebuffer buffers. A shared buffer is copied before it is written
+        self.memory_owners = [1]
+        self.gfx_owners = [1]
+
+        self.build_tables()
         self.load_font()
 
+    def build_tables(self):
+        """
+
+        Point this CPU at the opcode tables shared by every CPU, dropping any
+        entries patched into its own copies
+
+        """
+        for table, name in TABLES:
+            setattr(self, table, getattr(self.__class__, name))
+
+    def patch(self, table, key, function):
+        """
+
+        Replace an entry of one of this CPU's opcode tables. The shared table
+        is copied for this CPU the first time it is patched.
+
+        @param table the name of the table, such as "opcodes"
+        @param key the key of the entry
+        @param function the replacement, which is called with the CPU
+                        followed by the same arguments as the entry
+        @returns the entry that was replaced
+
+        """
+        entries = getattr(self, table)
+        if isinstance(entries, MappingProxyType):
+            entries = dict(entries)
+            setattr(self, table, entries)
+
+        replaced = entries[key]
+        entries[key] = function
+        return replaced
+
     def __str__(self):
         """
 
@@ -166,24 +176,87 @@ class CPU(object):
 
         """
 
-        string = ""
-        for i in range(WIDTH * HEIGHT):
-            if self.gfx[i]:
-                string += "*"
-            else:
-                string += " "
-
-            if i % 64 == 0:    
-                string += "\n"
+        lines = []
+        for y in range(HEIGHT):
+            row = self.gfx[y * WIDTH:(y + 1) * WIDTH]
+            lines.append("".join("*" if pixel else " " for pixel in row))
 
-        string += "\nPC = {0}\n".format(hex(self.pc))
-        string += "Registers:\n"
-        string += "I = {0}\n".format(hex(self.i))
+        lines.append("")
+        lines.append("PC = {0}".format(hex(self.pc)))
+        lines.append("Registers:")
+        lines.append("I = {0}".format(hex(self.i)))
 
         for i in range(REGISTERS):
-            string += "V{0} = {1}\n".format(i, hex(self.v[i]))
+            lines.append("V{0} = {1}".format(i, hex(self.v[i])))
+
+        return "\n".join(lines) + "\n"
+
+    def fork(self):
+        """
+
+        Create a copy of this CPU that can run independently of it. Main
+        memory and the framebuffer are shared between the two until either
+        CPU first writes to them, at which point the writer makes its own copy.
+        A CPU that is discarded gives up its share, so the last remaining
+        owner writes in place.
+
+        @returns the new CPU
+
+        """
+        child = self.__class__.__new__(self.__class__)
+        for name in CPU.__slots__:
+            setattr(child, name, getattr(self, name))
+        if hasattr(self, "__dict__"):
+            child.__dict__.update(self.__dict__)
+        child.build_tables()
+
+        child.keys = list(self.keys)
+        if self.key_wait is not None:
+            child.key_wait = list(self.key_wait)
+        child.v = list(self.v)
+        child.stack = list(self.stack)
+        child.coverage = None
+        child.hasher = None
+        child.tracer = None
+
+        self.memory_owners[0] += 1
+        self.gfx_owners[0] += 1
+
+        return child
+
+    def __del__(self):
+        """
+
+        Give up this CPU's share of any memory and framebuffer it shares with
+        forks
+
+        """
+        for name in ("memory_owners", "gfx_owners"):
+            owners = getattr(self, name, None)
+            if owners is not None and owners[0] > 1:
+                owners[0] -= 1
+
+    def unshare_memory(self):
+        """
 
-        return string
+        Make a private copy of main memory if it is shared with a fork
+
+        """
+        if self.memory_owners[0] > 1:
+            self.memory_owners[0] -= 1
+            self.memory = bytearray(self.memory)
+            self.memory_owners = [1]
+
+    def unshare_gfx(self):
+        """
+
+        Make a private copy of the framebuffer if it is shared with a fork
+
+        """
+        if self.gfx_owners[0] > 1:
+            self.gfx_owners[0] -= 1
+            self.gfx = bytearray(self.gfx)
+            self.gfx_owners = [1]
 
     def load(self, path, offset=0):
         """
@@ -195,13 +268,26 @@ class CPU(object):
 
         """
 
-        # Read the file into main memory byte-by-byte
         with open(path, "rb") as f:
-            b = f.read(1)
-            while b:
-                self.memory[offset] = struct.unpack("B", b)[0]
-                offset += 1
-                b = f.read(1)
+            self.load_bytes(f.read(), offset)
+
+    def load_bytes(self, data, offset=0):
+        """
+
+        Copy a sequence of bytes into main memory
+
+        @param data the bytes to copy
+        @param offset the memory address to start writing at
+
+        """
+        if offset + len(data) > len(self.memory):
+            raise IndexError("data does not fit in main memory")
+
+        self.unshare_memory()
+        self.memory[offset:offset + len(data)] = bytearray(data)
+
+        if self.hasher is not None:
+            self.hasher.memory_written(offset, len(data))
 
     def load_rom(self, path):
         """
@@ -224,8 +310,11 @@ class CPU(object):
         """
 
         # Read the CHIP-8 fontset into memory from addresses 0x0 - 0x50
-        for i in range(len(FONTSET)):
-            self.memory[i] = FONTSET[i]
+        self.unshare_memory()
+        self.memory[:len(FONTSET)] = FONTSET
+
+        if self.hasher is not None:
+            self.hasher.memory_written(0, len(FONTSET))
 
     def execute_cycle(self):
         """
@@ -233,9 +322,32 @@ class CPU(object):
         Perform a single cycle of the CHIP-8 CPU
 
         """
-        self.execute_opcode(self.fetch_opcode())
+        if self.coverage is not None:
+            self.coverage.execute(self.pc)
+
+        opcode = self.fetch_opcode()
+        if self.tracer is not None:
+            pc = self.pc
+            v = self.v[:]
+            self.execute_opcode(opcode)
+            self.tracer.record(self.cycles, pc, opcode, self.i, v, self.v)
+        else:
+            self.execute_opcode(opcode)
+
+        self.cycles += 1
         self.update_timers()
 
+    def run(self, cycles):
+        """
+
+        Perform the specified number of cycles of the CHIP-8 CPU
+
+        @param cycles the number of cycles to perform
+
+        """
+        for _ in range(cycles):
+            self.execute_cycle()
+
     def fetch_opcode(self):
         """
         
@@ -265,7 +377,7 @@ class CPU(object):
         @param opcode the opcode to decode
 
         """
-        self.opcodes[self.decode_opcode(opcode)](opcode)
+        self.opcodes[self.decode_opcode(opcode)](self, opcode)
 
     def update_keys(self, key_states):
         """
@@ -289,8 +401,8 @@ class CPU(object):
             self.delay -= 1
 
         if self.sound > 0:
-            if self.sound == 1:
-                print("Beep!")
+            if self.sound == 1 and self.on_beep is not None:
+                self.on_beep(self)
             self.sound -= 1
 
     def get_nnn(self, opcode):
@@ -357,7 +469,7 @@ class CPU(object):
         @param opcode the opcode
 
         """
-        self.subroutine[self.get_n(opcode)]()
+        self.subroutine[self.get_n(opcode)](self)
 
     def _00E0(self):
         """
@@ -366,8 +478,11 @@ class CPU(object):
         Clear the screen
 
         """
-        for i in range(WIDTH * HEIGHT):
-            self.gfx[i] = 0x0
+        self.unshare_gfx()
+        self.gfx[:] = bytes(WIDTH * HEIGHT)
+
+        if self.hasher is not None:
+            self.hasher.gfx_written(0, WIDTH * HEIGHT)
 
         self.shouldDraw = True
         self.pc += 2
@@ -489,7 +604,7 @@ class CPU(object):
         @param opcode the opcode
 
         """
-        self.arthimetic[self.get_n(opcode)](self.get_x(opcode), self.get_y(opcode))
+        self.arthimetic[self.get_n(opcode)](self, self.get_x(opcode), self.get_y(opcode))
 
     def _8XY0(self, x, y):
         """
@@ -706,6 +821,14 @@ class CPU(object):
 
         self.v[0xF] = 0
 
+        if self.coverage is not None:
+            self.coverage.read(self.i, height)
+
+        self.unshare_gfx()
+
+        if self.hasher is not None and height > 0:
+            self.hasher.gfx_written(pos_x + (pos_y * WIDTH), ((height - 1) * WIDTH) + 8)
+
         for y in range(height):
             pixel = self.memory[self.i + y]
             for x in range(8):
@@ -727,7 +850,7 @@ class CPU(object):
         @param opcode the opcode
 
         """
-        self.skip_keys[self.get_n(opcode)](self.get_x(opcode))
+        self.skip_keys[self.get_n(opcode)](self, self.get_x(opcode))
 
     def _EX9E(self, x):
         """
@@ -767,7 +890,7 @@ class CPU(object):
         @param opcode the opcode
 
         """
-        self.misc[self.get_nn(opcode)](self.get_x(opcode))
+        self.misc[self.get_nn(opcode)](self, self.get_x(opcode))
 
     def _FX07(self, x):
         """
@@ -788,25 +911,25 @@ class CPU(object):
         FX0A
         Wait for a keypress and store the result in register VX
 
+        The pc is only advanced once a key is pressed, so this instruction
+        is executed again on every cycle until then. A key already held when
+        the wait begins must be released and pressed again, so holding a key
+        satisfies only one wait.
+
         @param x the index for VX
 
         """
-        is_key_pressed = False
+        if self.key_wait is None:
+            self.key_wait = list(self.keys)
 
-        while not is_key_pressed:
-            event = pygame.event.wait()
+        for key in range(KEYS):
+            if self.keys[key] and not self.key_wait[key]:
+                self.v[x] = key
+                self.pc += 2
+                self.key_wait = None
+                return
 
-            if event.type == pygame.KEYDOWN:
-                key_states = pygame.key.get_pressed()
-                for key, val in KEY_MAP.items():
-                    if key_states[key]:
-                        self.v[x] = val
-                        is_key_pressed = True
-
-            elif event.type == pygame.QUIT:
-                exit()
-
-        self.pc += 2
+            self.key_wait[key] = self.keys[key]
 
     def _FX15(self, x):
         """
@@ -869,6 +992,14 @@ class CPU(object):
         @param x the index for VX
 
         """
+        if self.coverage is not None:
+            self.coverage.write(self.i, 3)
+
+        if self.hasher is not None:
+            self.hasher.memory_written(self.i, 3)
+
+        self.unshare_memory()
+
         n = self.v[x]
         for j in range(2, -1, -1):
             self.memory[self.i + j] = n % 10
@@ -886,8 +1017,16 @@ class CPU(object):
         @param x the index for VX
 
         """
+        if self.coverage is not None:
+            self.coverage.write(self.i, x + 1)
+
+        if self.hasher is not None:
+            self.hasher.memory_written(self.i, x + 1)
+
+        self.unshare_memory()
+
         for j in range(x + 1):
-            self.memory[self.i + j] = self.v[j]
+            self.memory[self.i + j] = self.v[j] & 0xFF
 
         self.pc += 2
 
@@ -901,7 +1040,14 @@ class CPU(object):
         @param x the index for VX
 
         """
+        if self.coverage is not None:
+            self.coverage.read(self.i, x + 1)
+
         for j in range(x + 1):
             self.v[j] = self.memory[self.i + j]
 
-        self.pc += 2
\ No newline at end of file
+        self.pc += 2
+
+# Generate the opcode tables shared by every CPU from the instruction set
+for name, entries in dispatch_tables(CPU).items():
+    setattr(CPU, name, entries)
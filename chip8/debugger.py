@@ -0,0 +1,532 @@
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+from .cpu import CPU, HEIGHT, MEMORY, WIDTH
+
+"""
+
+A debugger for the CHIP-8 virtual machine
+
+Breakpoints stop the CPU before the instruction at an address executes,
+optionally only when a condition on the CPU holds. Watchpoints stop it
+after an instruction reads or writes a watched region of memory, or draws
+to a watched region of the framebuffer.
+
+Breakpoints and watchpoints cost nothing for the instructions they cannot
+stop: only the entries of the CPU's opcode tables for the instructions at
+breakpoint addresses, and for the instructions that access memory or the
+framebuffer while a watchpoint of the matching kind is set, are wrapped.
+The CPU runs with CPU.run() at full speed, and a wrapped entry that hits
+stops it by raising Stop. Only conditions and stepping over or out of
+calls check the CPU after every instruction.
+
+"""
+
+# Usage
+REQUIRED_ARGS = 2
+
+# The default number of cycles to run while stepping over or out of a call
+STEP_LIMIT = 1000000
+
+Hit = namedtuple("Hit", ["kind", "address", "cycle"])
+
+class Stop(Exception):
+    """
+
+    Raised by a wrapped table entry to stop the CPU before an instruction
+
+    """
+
+def stop(cpu, opcode):
+    """
+
+    Stop the CPU before it executes an instruction
+
+    @param cpu the CPU
+    @param opcode the instruction
+
+    """
+    raise Stop()
+
+# A top-level opcode table that stops the CPU before any instruction
+STOP_TABLE = MappingProxyType(dict((top << 12, stop) for top in range(16)))
+
+def draw_access(cpu, opcode):
+    """
+
+    Find the memory read and pixels flipped by a DXYN instruction
+
+    @param cpu the CPU about to execute the instruction
+    @param opcode the instruction
+    @returns a list of (kind, start, length) accesses
+
+    """
+    height = opcode & 0x000F
+    pos_x = cpu.v[(opcode & 0x0F00) >> 8]
+    pos_y = cpu.v[(opcode & 0x00F0) >> 4]
+
+    accesses = [("read", cpu.i, height)]
+    for y in range(height):
+        pixel = cpu.memory[cpu.i + y]
+        for x in range(8):
+            if pixel & (0x80 >> x) != 0:
+                accesses.append(("gfx", pos_x + x + ((pos_y + y) * WIDTH), 1))
+
+    return accesses
+
+# The table entries of the instructions that access memory or the
+# framebuffer, and functions describing what each access touches
+ACCESSES = [
+    ("opcodes", 0xD000, ("read", "gfx"), draw_access),
+    ("subroutine", 0x0000, ("gfx",), lambda cpu: [("gfx", 0, WIDTH * HEIGHT)]),
+    ("misc", 0x0033, ("write",), lambda cpu, x: [("write", cpu.i, 3)]),
+    ("misc", 0x0055, ("write",), lambda cpu, x: [("write", cpu.i, x + 1)]),
+    ("misc", 0x0065, ("read",), lambda cpu, x: [("read", cpu.i, x + 1)])]
+
+class Debugger(object):
+    """
+
+    Runs a CPU under breakpoints and watchpoints
+
+    """
+
+    def __init__(self, cpu):
+        """
+
+        Create a new Debugger object
+
+        @param cpu the CPU to debug
+
+        """
+        self.cpu = cpu
+
+        # Breakpoints: addresses mapped to an optional condition, and
+        # conditions checked before every instruction
+        self.breakpoints = {}
+        self.conditions = []
+
+        # Watchpoints: one flag per watched byte or pixel
+        self.watches = {
+            "read": bytearray(MEMORY),
+            "write": bytearray(MEMORY),
+            "gfx": bytearray(WIDTH * HEIGHT)}
+
+        # The original table entries that have been wrapped for watchpoints
+        # and breakpoints, and the opcode table set aside while the CPU is
+        # made to stop before its next instruction
+        self.patched = {}
+        self.breaking = {}
+        self.stopped = None
+
+        # The hit that stopped the CPU, and the cycle the current run began
+        # at, whose instruction always executes
+        self.hit = None
+        self.started = None
+
+    def add_breakpoint(self, address, condition=None):
+        """
+
+        Stop before the instruction at an address executes
+
+        @param address the address of the instruction
+        @param condition an optional function of the CPU, so that the
+                         breakpoint only stops when it returns True
+
+        """
+        self.breakpoints[address] = condition
+        self.update_patches()
+
+    def remove_breakpoint(self, address):
+        """
+
+        Remove the breakpoint at an address
+
+        @param address the address of the breakpoint
+
+        """
+        del self.breakpoints[address]
+        self.update_patches()
+
+    def add_condition(self, condition):
+        """
+
+        Stop before any instruction when a condition holds, such as
+        lambda cpu: cpu.v[3] == 0x10 or lambda cpu: cpu.delay == 0
+
+        @param condition a function of the CPU
+
+        """
+        self.conditions.append(condition)
+
+    def remove_condition(self, condition):
+        """
+
+        Remove a condition added by add_condition()
+
+        @param condition the condition
+
+        """
+        self.conditions.remove(condition)
+
+    def watch(self, kind, start, length=1, enabled=True):
+        """
+
+        Set or clear a watchpoint
+
+        @param kind "read" or "write" for memory, or "gfx" for the framebuffer
+        @param start the first watched address or pixel
+        @param length the number of watched addresses or pixels
+        @param enabled True to set the watchpoint, False to clear it
+
+        """
+        flags = self.watches[kind]
+        flags[start:start + length] = (b"\x01" if enabled else b"\x00") * len(flags[start:start + length])
+        self.update_patches()
+
+    def watch_memory(self, start, length=1, read=False, write=True):
+        """
+
+        Stop after an instruction reads or writes a region of memory
+
+        @param start the first watched address
+        @param length the number of watched addresses
+        @param read True to stop on reads
+        @param write True to stop on writes
+
+        """
+        if read:
+            self.watch("read", start, length)
+        if write:
+            self.watch("write", start, length)
+
+    def watch_gfx(self, x, y, width, height):
+        """
+
+        Stop after an instruction draws to a region of the framebuffer
+
+        @param x the left edge of the region
+        @param y the top edge of the region
+        @param width the width of the region
+        @param height the height of the region
+
+        """
+        for row in range(y, min(y + height, HEIGHT)):
+            self.watch("gfx", (row * WIDTH) + x, min(width, WIDTH - x))
+
+    def clear_watches(self):
+        """
+
+        Remove every watchpoint
+
+        """
+        for flags in self.watches.values():
+            flags[:] = bytes(len(flags))
+
+        self.update_patches()
+
+    def update_patches(self):
+        """
+
+        Wrap the table entries of the instructions that may hit a watchpoint,
+        and of the instructions at breakpoint addresses, and restore the rest.
+        Breakpoints wrap the instructions in memory when this is called, which
+        is again at the start of every run.
+
+        """
+        cpu = self.cpu
+
+        # Restore the entries in the reverse of the order they were wrapped
+        for key in sorted(self.breaking, reverse=True):
+            cpu.patch("opcodes", key, self.breaking.pop(key))
+        for table, key in reversed(list(self.patched)):
+            cpu.patch(table, key, self.patched.pop((table, key)))
+
+        active = set(kind for kind, flags in self.watches.items() if any(flags))
+        for table, key, kinds, access in ACCESSES:
+            if active.intersection(kinds):
+                execute = getattr(cpu, table)[key]
+                self.patched[(table, key)] = cpu.patch(table, key, self.wrap(execute, access))
+
+        for address in self.breakpoints:
+            if 0 <= address < MEMORY - 1:
+                key = (cpu.memory[address] & 0xF0) << 8
+                if key not in self.breaking:
+                    self.breaking[key] = cpu.patch("opcodes", key, self.guard(cpu.opcodes[key]))
+
+    def wrap(self, execute, access):
+        """
+
+        Wrap the implementation of an instruction so it checks watchpoints
+
+        @param execute the implementation of the instruction, which is called
+                       with the CPU and its operands
+        @param access a function describing what the instruction touches
+        @returns the wrapped implementation
+
+        """
+        def watched(*args):
+            accesses = access(*args)
+            execute(*args)
+
+            for kind, start, length in accesses:
+                flags = self.watches[kind]
+                if start < len(flags) and any(flags[start:start + length]):
+                    address = start + flags[start:start + length].index(1)
+                    if self.hit is None:
+                        self.hit = Hit(kind, address, self.cpu.cycles)
+                        self.stop_next()
+                    return
+
+        return watched
+
+    def guard(self, execute):
+        """
+
+        Wrap the implementation of a top-level instruction so it checks the
+        breakpoints before executing
+
+        @param execute the implementation of the instruction, which is called
+                       with the CPU and the opcode
+        @returns the wrapped implementation
+
+        """
+        def guarded(cpu, opcode):
+            if cpu.cycles != self.started and self.at_breakpoint():
+                raise Stop()
+
+            execute(cpu, opcode)
+
+        return guarded
+
+    def at_breakpoint(self):
+        """
+
+        Check whether the CPU is at a breakpoint whose condition holds,
+        recording the hit if it is
+
+        @returns True if the CPU should stop
+
+        """
+        cpu = self.cpu
+        if cpu.pc not in self.breakpoints:
+            return False
+
+        condition = self.breakpoints[cpu.pc]
+        if condition is not None and not condition(cpu):
+            return False
+
+        self.hit = Hit("breakpoint", cpu.pc, cpu.cycles)
+        return True
+
+    def stop_next(self):
+        """
+
+        Make the CPU stop before its next instruction
+
+        """
+        if self.stopped is None:
+            self.stopped = self.cpu.opcodes
+            self.cpu.opcodes = STOP_TABLE
+
+    def detach(self):
+        """
+
+        Remove every breakpoint and watchpoint, restoring the CPU's tables
+
+        """
+        self.breakpoints.clear()
+        del self.conditions[:]
+        self.clear_watches()
+
+    def run(self, cycles):
+        """
+
+        Run the CPU until a breakpoint or watchpoint is hit. The instruction
+        at the current address always executes, so a run can resume from
+        the breakpoint it stopped at.
+
+        @param cycles the maximum number of cycles to run
+        @returns the Hit that stopped the CPU, or None if every cycle ran
+
+        """
+        return self.run_until(None, cycles)
+
+    def run_until(self, done, cycles):
+        """
+
+        Run the CPU until a function of it holds or something is hit
+
+        @param done a function of the CPU checked after every cycle, or None
+        @param cycles the maximum number of cycles to run
+        @returns the Hit that stopped the CPU, or None
+
+        """
+        cpu = self.cpu
+        self.update_patches()
+        self.started = cpu.cycles
+
+        try:
+            if done is None and not self.conditions:
+                cpu.run(cycles)
+            else:
+                for _ in range(cycles):
+                    cpu.execute_cycle()
+                    if self.hit is not None or (done is not None and done(cpu)):
+                        break
+
+                    if any(condition(cpu) for condition in self.conditions):
+                        self.hit = Hit("condition", cpu.pc, cpu.cycles)
+                        break
+        except Stop:
+            pass
+        finally:
+            if self.stopped is not None:
+                cpu.opcodes = self.stopped
+                self.stopped = None
+
+        # A watchpoint hit by the final instruction, or a breakpoint at the
+        # next one, is still reported
+        if self.hit is None and cpu.cycles != self.started:
+            self.at_breakpoint()
+
+        hit, self.hit = self.hit, None
+        return hit
+
+    def step(self):
+        """
+
+        Execute a single instruction
+
+        @returns the watchpoint Hit by the instruction, or None
+
+        """
+        return self.run_until(None, 1)
+
+    def step_over(self, cycles=STEP_LIMIT):
+        """
+
+        Execute a single instruction, running a called subroutine to its
+        return as though it were one instruction
+
+        @param cycles the maximum number of cycles to run
+        @returns the Hit that stopped the CPU inside the call, or None
+
+        """
+        cpu = self.cpu
+        opcode = cpu.fetch_opcode()
+        if opcode & 0xF000 != 0x2000:
+            return self.step()
+
+        depth = cpu.sp
+        return self.run_until(lambda cpu: cpu.sp <= depth, cycles)
+
+    def step_out(self, cycles=STEP_LIMIT):
+        """
+
+        Run until the current subroutine returns
+
+        @param cycles the maximum number of cycles to run
+        @returns the Hit that stopped the CPU first, or None
+
+        """
+        depth = self.cpu.sp
+        if depth == 0:
+            raise ValueError("not inside a subroutine")
+
+        return self.run_until(lambda cpu: cpu.sp < depth, cycles)
+
+def describe(cpu):
+    """
+
+    Describe the registers of a CPU on two lines
+
+    @param cpu the CPU
+    @returns the description
+
+    """
+    registers = " ".join("V{0:X}={1:02X}".format(x, value) for x, value in enumerate(cpu.v))
+    return "{0}\nPC={1:03X} I={2:03X} SP={3:X} DT={4:02X} ST={5:02X} cycle={6} opcode={7:04X}".format(
+        registers, cpu.pc, cpu.i, cpu.sp, cpu.delay, cpu.sound, cpu.cycles, cpu.fetch_opcode())
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.debugger rom"
+
+# Commands of the interactive debugger. Numbers are hexadecimal.
+COMMANDS = """\
+b ADDR        set a breakpoint
+d ADDR        delete a breakpoint
+w ADDR [LEN]  watch writes to memory
+r ADDR [LEN]  watch reads from memory
+g X Y W H     watch draws to the framebuffer
+s             step
+n             step over
+o             step out
+c [CYCLES]    continue
+q             quit"""
+
+def main(argv):
+    """
+
+    Driver for the interactive debugger
+
+    @param argv the argument values
+
+    """
+    if len(argv) < REQUIRED_ARGS:
+        exit(usage(argv[0]))
+
+    cpu = CPU()
+    cpu.load_rom(argv[1])
+    debugger = Debugger(cpu)
+    print(COMMANDS)
+
+    while True:
+        print(describe(cpu))
+        try:
+            words = input("(chip8) ").split()
+        except EOFError:
+            break
+
+        if not words:
+            continue
+
+        command = words[0]
+        numbers = [int(word, 16) for word in words[1:]]
+        hit = None
+
+        if command == "q":
+            break
+        elif command == "b" and numbers:
+            debugger.add_breakpoint(numbers[0])
+        elif command == "d" and numbers:
+            if numbers[0] in debugger.breakpoints:
+                debugger.remove_breakpoint(numbers[0])
+        elif command in ("w", "r") and numbers:
+            length = numbers[1] if len(numbers) > 1 else 1
+            debugger.watch_memory(numbers[0], length, read=command == "r", write=command == "w")
+        elif command == "g" and len(numbers) == 4:
+            debugger.watch_gfx(*numbers)
+        elif command == "s":
+            hit = debugger.step()
+        elif command == "n":
+            hit = debugger.step_over()
+        elif command == "o":
+            hit = debugger.step_out() if cpu.sp > 0 else None
+        elif command == "c":
+            hit = debugger.run(numbers[0] if numbers else STEP_LIMIT)
+        else:
+            print(COMMANDS)
+
+        if hit is not None:
+            print("Stopped by {0} at {1:03X} in cycle {2}".format(*hit))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,152 @@
+import random
+import numpy as np
+from .cpu import CPU, CYCLES_PER_FRAME, HEIGHT, KEYS, PROGRAM_COUNTER_START, WIDTH
+
+"""
+
+A reinforcement-learning environment around the CHIP-8 CPU
+
+The environment follows the familiar reset/step interface. Observations are
+NumPy arrays viewing the CPU's own framebuffer, so no pixels are copied per
+step; callers that keep observations across steps must copy them. A fork of
+the CPU shares its framebuffer until one of them draws, when the CPU may
+move to a copy, so the view is remade whenever the buffer changes. Rewards
+are computed from named memory addresses, and actions map onto sets of
+pressed keypad keys.
+
+"""
+
+# The default actions: press nothing, or press exactly one of the 16 keys
+DEFAULT_ACTIONS = [()] + [(key,) for key in range(KEYS)]
+
+class Chip8Env(object):
+    """
+
+    A CHIP-8 game exposed as a reinforcement-learning environment
+
+    """
+
+    def __init__(self, rom, frameskip=1, actions=None, addresses=None, reward=None, done=None, max_frames=None):
+        """
+
+        Create a new Chip8Env object
+
+        @param rom the path to the ROM to play, or its bytes
+        @param frameskip the default number of frames each step runs for
+        @param actions a list of tuples of the keys pressed by each action
+        @param addresses a dictionary mapping names to memory addresses
+        @param reward a function taking the previous and current values of
+                      the named addresses and returning the reward
+        @param done a function taking the current values of the named
+                    addresses and returning True once the episode is over
+        @param max_frames the number of frames after which an episode ends
+
+        """
+        if isinstance(rom, (bytes, bytearray)):
+            self.rom = bytes(rom)
+        else:
+            with open(rom, "rb") as f:
+                self.rom = f.read()
+
+        self.frameskip = frameskip
+        self.actions = list(actions if actions is not None else DEFAULT_ACTIONS)
+        self.addresses = dict(addresses or {})
+        self.reward = reward
+        self.done = done
+        self.max_frames = max_frames
+
+        self.cpu = None
+        self.gfx = None
+        self.observation = None
+        self.values = {}
+        self.frame = 0
+
+    @property
+    def action_count(self):
+        """
+
+        The number of available actions
+
+        """
+        return len(self.actions)
+
+    def read_values(self):
+        """
+
+        Read the current value of every named address
+
+        @returns a dictionary mapping each name to its value
+
+        """
+        memory = self.cpu.memory
+        return {name: memory[addr] for name, addr in self.addresses.items()}
+
+    def observe(self):
+        """
+
+        View the CPU's framebuffer, remaking the view only if the CPU has
+        moved to a different buffer
+
+        @returns the observation
+
+        """
+        if self.cpu.gfx is not self.gfx:
+            self.gfx = self.cpu.gfx
+            self.observation = np.frombuffer(self.gfx, dtype=np.uint8).reshape(HEIGHT, WIDTH)
+
+        return self.observation
+
+    def reset(self, seed=None):
+        """
+
+        Start a new episode from power-on
+
+        @param seed an optional seed for the random number generator used
+                    by CXNN, making the episode reproducible
+        @returns the initial observation
+
+        """
+        if seed is not None:
+            random.seed(seed)
+
+        self.cpu = CPU()
+        self.cpu.load_bytes(self.rom, PROGRAM_COUNTER_START)
+        self.values = self.read_values()
+        self.frame = 0
+
+        return self.observe()
+
+    def step(self, action, frameskip=None):
+        """
+
+        Hold the keys of an action down and run the emulator
+
+        @param action the index of the action to take
+        @param frameskip the number of frames to run, or None for the default
+        @returns an (observation, reward, done, info) tuple
+
+        """
+        if self.cpu is None:
+            raise RuntimeError("reset() must be called before step()")
+
+        frames = frameskip if frameskip is not None else self.frameskip
+
+        keys = self.cpu.keys
+        for key in range(KEYS):
+            keys[key] = False
+        for key in self.actions[action]:
+            keys[key] = True
+
+        self.cpu.run(frames * CYCLES_PER_FRAME)
+        self.frame += frames
+
+        previous = self.values
+        self.values = self.read_values()
+
+        reward = self.reward(previous, self.values) if self.reward is not None else 0
+        done = self.done is not None and self.done(self.values)
+        if self.max_frames is not None and self.frame >= self.max_frames:
+            done = True
+
+        info = {"frame": self.frame, "values": self.values}
+        return self.observe(), reward, done, info
@@ -0,0 +1,318 @@
+import os
+import sys
+import random
+import traceback
+from .cpu import CPU, MEMORY, PROGRAM_COUNTER_START
+
+"""
+
+A random-ROM fuzzer for the CHIP-8 CPU
+
+ROMs are generated at random or mutated from a corpus, then run headless
+with a cycle budget. Any exception raised by the CPU is recorded as a crash
+and bucketed by the opcode being executed and the site that raised it, and
+crashing ROMs can be minimized to the smallest input reproducing the crash.
+
+"""
+
+# Usage
+REQUIRED_ARGS = 2
+
+# Fuzzing parameters
+MAX_ROM_SIZE = MEMORY - PROGRAM_COUNTER_START
+DEFAULT_ROM_SIZE = 64
+DEFAULT_CYCLES = 1000
+
+def opcode_class(opcode):
+    """
+
+    Name the instruction class of an opcode, such as 8XY4 or FX55
+
+    @param opcode the opcode, or None if it could not be fetched
+    @returns a string naming the instruction class
+
+    """
+    if opcode is None:
+        return "FETCH"
+
+    family = opcode >> 12
+    if family == 0x0:
+        if opcode & 0x0F00:
+            return "0NNN"
+        return "00{0:02X}".format(opcode & 0x00FF)
+    elif family == 0x8:
+        return "8XY{0:X}".format(opcode & 0x000F)
+    elif family in (0x5, 0x9):
+        return "{0:X}XY{1:X}".format(family, opcode & 0x000F)
+    elif family in (0xE, 0xF):
+        return "{0:X}X{1:02X}".format(family, opcode & 0x00FF)
+    elif family in (0x3, 0x4, 0x6, 0x7, 0xC):
+        return "{0:X}XNN".format(family)
+    elif family == 0xD:
+        return "DXYN"
+
+    return "{0:X}NNN".format(family)
+
+class Crash(object):
+    """
+
+    A record of an exception raised by the CPU while running a ROM
+
+    """
+
+    def __init__(self, rom, cycle, opcode, error, site):
+        """
+
+        Create a new Crash object
+
+        @param rom the bytes of the ROM that crashed
+        @param cycle the cycle during which the exception was raised
+        @param opcode the opcode being executed, or None
+        @param error the exception that was raised
+        @param site the function and line that raised the exception
+
+        """
+        self.rom = rom
+        self.cycle = cycle
+        self.opcode = opcode
+        self.error = error
+        self.site = site
+
+    @property
+    def bucket(self):
+        """
+
+        The key under which similar crashes are grouped
+
+        """
+        if self.opcode is None:
+            family = "FETCH"
+        else:
+            family = "{0:X}xxx".format(self.opcode >> 12)
+
+        return (family, type(self.error).__name__, self.site)
+
+    def __str__(self):
+        """
+
+        Construct a string describing the crash
+
+        @returns a string describing the crash
+
+        """
+        return "{0} {1} at {2} (cycle {3}, {4} byte ROM)".format(
+            opcode_class(self.opcode), type(self.error).__name__, self.site, self.cycle, len(self.rom))
+
+def run_rom(rom, cycles=DEFAULT_CYCLES):
+    """
+
+    Run a ROM headless until it crashes or the cycle budget is spent
+
+    @param rom the bytes of the ROM to run
+    @param cycles the cycle budget
+    @returns a Crash object, or None if the ROM ran without error
+
+    """
+    cpu = CPU()
+    cpu.load_bytes(rom, PROGRAM_COUNTER_START)
+
+    for cycle in range(cycles):
+        opcode = None
+        try:
+            opcode = cpu.fetch_opcode()
+            cpu.execute_cycle()
+        except Exception as e:
+            frame = traceback.extract_tb(e.__traceback__)[-1]
+            site = "{0}:{1}".format(frame.name, frame.lineno)
+            return Crash(rom, cycle, opcode, e, site)
+
+    return None
+
+def random_rom(rng, size=DEFAULT_ROM_SIZE):
+    """
+
+    Generate a ROM of uniformly random bytes
+
+    @param rng the random number generator to draw from
+    @param size the number of bytes in the ROM
+    @returns the bytes of the ROM
+
+    """
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+def mutate(rom, rng):
+    """
+
+    Apply a random mutation to a ROM
+
+    @param rom the bytes of the ROM to mutate
+    @param rng the random number generator to draw from
+    @returns the bytes of the mutated ROM
+
+    """
+    data = bytearray(rom)
+    choice = rng.randrange(4)
+
+    if choice == 0 and data:
+        # Flip a single bit
+        pos = rng.randrange(len(data))
+        data[pos] ^= 1 << rng.randrange(8)
+    elif choice == 1 and data:
+        # Overwrite a whole instruction
+        pos = rng.randrange(0, len(data), 2)
+        data[pos:pos + 2] = random_rom(rng, 2)
+    elif choice == 2 and len(data) < MAX_ROM_SIZE - 1:
+        # Insert a new instruction
+        pos = rng.randrange(0, len(data) + 1, 2)
+        data[pos:pos] = random_rom(rng, 2)
+    elif len(data) > 2:
+        # Duplicate a range of instructions elsewhere in the ROM
+        start = rng.randrange(0, len(data), 2)
+        end = rng.randrange(start, len(data) + 1)
+        pos = rng.randrange(0, len(data), 2)
+        data[pos:pos] = data[start:end]
+
+    return bytes(data[:MAX_ROM_SIZE])
+
+def minimize(crash, cycles=DEFAULT_CYCLES):
+    """
+
+    Shrink a crashing ROM while it still crashes into the same bucket
+
+    Whole instructions are removed first, in halving chunk sizes, and any
+    remaining instructions are then replaced with zeros where possible.
+
+    @param crash the crash to minimize
+    @param cycles the cycle budget used to reproduce the crash
+    @returns a Crash object for the smallest ROM found
+
+    """
+    def reproduce(rom):
+        result = run_rom(rom, cycles)
+        if result is not None and result.bucket == crash.bucket:
+            return result
+        return None
+
+    best = crash
+    chunk = len(best.rom) // 2
+    chunk += chunk % 2
+
+    while chunk >= 2:
+        pos = 0
+        while pos < len(best.rom):
+            result = reproduce(best.rom[:pos] + best.rom[pos + chunk:])
+            if result is not None:
+                best = result
+            else:
+                pos += chunk
+        chunk //= 2
+        chunk += chunk % 2 if chunk > 1 else 0
+
+    for pos in range(0, len(best.rom), 2):
+        if best.rom[pos:pos + 2] != b"\x00\x00":
+            result = reproduce(best.rom[:pos] + b"\x00\x00" + best.rom[pos + 2:])
+            if result is not None:
+                best = result
+
+    return best
+
+class Fuzzer(object):
+    """
+
+    Generates and mutates ROMs, runs them and buckets the resulting crashes
+
+    """
+
+    def __init__(self, seed=None, cycles=DEFAULT_CYCLES, size=DEFAULT_ROM_SIZE, corpus=None):
+        """
+
+        Create a new Fuzzer object
+
+        @param seed the seed for the random number generator
+        @param cycles the cycle budget for each ROM
+        @param size the size of freshly generated ROMs
+        @param corpus an optional list of ROMs to mutate
+
+        """
+        self.rng = random.Random(seed)
+        self.cycles = cycles
+        self.size = size
+        self.corpus = list(corpus or [])
+        self.crashes = {}
+        self.runs = 0
+
+    def next_rom(self):
+        """
+
+        Generate the next ROM to run
+
+        @returns the bytes of the ROM
+
+        """
+        if self.corpus and self.rng.random() < 0.5:
+            rom = self.rng.choice(self.corpus)
+            for _ in range(self.rng.randint(1, 4)):
+                rom = mutate(rom, self.rng)
+            return rom
+
+        return random_rom(self.rng, self.size)
+
+    def run(self, iterations):
+        """
+
+        Run a number of ROMs, recording the first crash of every bucket
+
+        @param iterations the number of ROMs to run
+        @returns a dictionary mapping each bucket to a (Crash, count) pair
+
+        """
+        for _ in range(iterations):
+            crash = run_rom(self.next_rom(), self.cycles)
+            self.runs += 1
+
+            if crash is not None:
+                first, count = self.crashes.get(crash.bucket, (crash, 0))
+                self.crashes[crash.bucket] = (first, count + 1)
+
+        return self.crashes
+
+def usage():
+    """
+
+    Create a message describing how to invoke the program
+
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.fuzz iterations [seed] [output]"
+
+def main(argv):
+    """
+
+    Driver for the fuzzer. Prints a summary of every crash bucket and
+    optionally writes a minimized ROM for each to an output directory.
+
+    @param argv the argument values
+
+    """
+    if len(argv) < REQUIRED_ARGS:
+        exit(usage())
+
+    iterations = int(argv[1])
+    seed = int(argv[2]) if len(argv) > 2 else None
+    output = argv[3] if len(argv) > 3 else None
+
+    fuzzer = Fuzzer(seed)
+    crashes = fuzzer.run(iterations)
+
+    print("{0} runs, {1} buckets".format(fuzzer.runs, len(crashes)))
+    for n, (crash, count) in enumerate(sorted(crashes.values(), key=lambda c: -c[1])):
+        crash = minimize(crash, fuzzer.cycles)
+        print("{0:6d}  {1}".format(count, crash))
+
+        if output is not None:
+            with open(os.path.join(output, "crash-{0:03d}.ch8".format(n)), "wb") as f:
+                f.write(crash.rom)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,200 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+"""
+
+The CHIP-8 instruction set, declared once
+
+Every instruction is listed with its pattern, such as "8XY4", and the
+template of its assembly text. The mask, opcode bits and operand fields
+are derived from the pattern, and the name of the method implementing it,
+such as "_8XY4", is its semantics hook.
+
+Both the CPU's dispatch tables and the disassembler's decoder are generated
+from this list at import. Like the tables they replace, they select an
+instruction by its most significant nibble and then, within the groups that
+share a nibble, by the bits in the group's key mask. The remaining bits of
+the mask are not checked, so 5XY1 decodes as 5XY0 everywhere.
+
+"""
+
+Instruction = namedtuple("Instruction", ["name", "pattern", "mask", "operands", "mnemonic",
+                                         "template", "hook"])
+
+# Operand fields: the mask and shift of each
+FIELDS = {
+    "nnn" : (0x0FFF, 0),
+    "nn" : (0x00FF, 0),
+    "n" : (0x000F, 0),
+    "x" : (0x0F00, 8),
+    "y" : (0x00F0, 4)}
+
+# The groups of instructions that share a most significant nibble: the
+# table holding each group, the bits of the opcode that select within it,
+# and the hook that dispatches to it. 'K' denotes an opcode with multiple
+# matches
+GROUPS = {
+    0x0000 : ("subroutine", 0x000F, "_0KKK"),
+    0x8000 : ("arthimetic", 0x000F, "_8XYK"),
+    0xE000 : ("skip_keys", 0x000F, "_EXKK"),
+    0xF000 : ("misc", 0x00FF, "_FXKK")}
+
+# The dispatch tables of a CPU, and the class attributes holding the tables
+# shared by every CPU of a class
+TABLES = (("opcodes", "OPCODES"), ("subroutine", "SUBROUTINE"), ("arthimetic", "ARTHIMETIC"),
+          ("skip_keys", "SKIP_KEYS"), ("misc", "MISC"))
+
+def instruction(name, template):
+    """
+
+    Declare an instruction
+
+    @param name the pattern of the instruction, with hexadecimal digits for
+                fixed nibbles and X, Y, N, NN or NNN for operand fields
+    @param template the assembly text, formatted with the operand fields
+    @returns the Instruction
+
+    """
+    pattern = 0
+    mask = 0
+    operands = []
+
+    for index, nibble in enumerate(name):
+        shift = 12 - (index * 4)
+        if nibble in "XY":
+            operands.append(nibble.lower())
+        elif nibble == "N":
+            if index == 0 or name[index - 1] != "N":
+                operands.append("n" * (len(name) - index))
+        else:
+            pattern |= int(nibble, 16) << shift
+            mask |= 0xF << shift
+
+    return Instruction(name, pattern, mask, tuple(operands), template.split(" ")[0], template,
+                       "_" + name)
+
+# The instruction set
+INSTRUCTIONS = (
+    instruction("00E0", "CLS"),
+    instruction("00EE", "RET"),
+    instruction("1NNN", "JP {nnn:X}"),
+    instruction("2NNN", "CALL {nnn:X}"),
+    instruction("3XNN", "SE V{x:X}, {nn:X}"),
+    instruction("4XNN", "SNE V{x:X}, {nn:X}"),
+    instruction("5XY0", "SE V{x:X}, V{y:X}"),
+    instruction("6XNN", "LD V{x:X}, {nn:X}"),
+    instruction("7XNN", "ADD V{x:X}, {nn:X}"),
+    instruction("8XY0", "LD V{x:X}, V{y:X}"),
+    instruction("8XY1", "OR V{x:X}, V{y:X}"),
+    instruction("8XY2", "AND V{x:X}, V{y:X}"),
+    instruction("8XY3", "XOR V{x:X}, V{y:X}"),
+    instruction("8XY4", "ADD V{x:X}, V{y:X}"),
+    instruction("8XY5", "SUB V{x:X}, V{y:X}"),
+    instruction("8XY6", "SHR V{x:X} {{, V{y:X}}}"),
+    instruction("8XY7", "SUBN V{x:X}, V{y:X}"),
+    instruction("8XYE", "SHL V{x:X}, {{, V{y:X}}}"),
+    instruction("9XY0", "SNE V{x:X}, V{y:X}"),
+    instruction("ANNN", "LD I, {nnn:X}"),
+    instruction("BNNN", "JP V0, {nnn:X}"),
+    instruction("CXNN", "RND V{x:X}, {nn:X}"),
+    instruction("DXYN", "DRW V{x:X}, V{y:X}, {n:X}"),
+    instruction("EX9E", "SKP V{x:X}"),
+    instruction("EXA1", "SKNP V{x:X}"),
+    instruction("FX07", "LD V{x:X}, DT"),
+    instruction("FX0A", "LD V{x:X}, K"),
+    instruction("FX15", "LD DT, V{x:X}"),
+    instruction("FX18", "LD ST, V{x:X}"),
+    instruction("FX1E", "ADD I, V{x:X}"),
+    instruction("FX29", "LD F, V{x:X}"),
+    instruction("FX33", "LD B, V{x:X}"),
+    instruction("FX55", "LD [I], V{x:X}"),
+    instruction("FX65", "LD V{x:X}, [I]"))
+
+def group_tables():
+    """
+
+    Sort the instructions into the dispatch tables
+
+    @returns a dictionary mapping the name of each table to a dictionary
+             mapping keys to Instructions
+
+    """
+    tables = dict((table, {}) for table, _ in TABLES)
+    for entry in INSTRUCTIONS:
+        top = entry.pattern & 0xF000
+        if top in GROUPS:
+            table, key_mask, _ = GROUPS[top]
+            tables[table][entry.pattern & key_mask] = entry
+        else:
+            tables["opcodes"][top] = entry
+
+    return tables
+
+# The instructions in each dispatch table
+DECODER = MappingProxyType(dict((table, MappingProxyType(entries))
+                                for table, entries in group_tables().items()))
+
+def dispatch_tables(cls):
+    """
+
+    Generate the dispatch tables of a class that implements each instruction
+    in the method named by its hook. Top-level hooks are called with the
+    opcode, and hooks in a group with the operand fields of the instruction.
+
+    @param cls the class
+    @returns a dictionary mapping the class attribute of each table to the
+             read-only table of unbound methods
+
+    """
+    tables = {}
+    for table, attribute in TABLES:
+        entries = dict((key, getattr(cls, entry.hook)) for key, entry in DECODER[table].items())
+        if table == "opcodes":
+            for top, (_, _, hook) in GROUPS.items():
+                entries[top] = getattr(cls, hook)
+
+        tables[attribute] = MappingProxyType(entries)
+
+    return tables
+
+def decode(opcode):
+    """
+
+    Find the instruction an opcode executes
+
+    @param opcode the opcode
+    @returns the Instruction
+    @raises KeyError if the opcode is not an instruction
+
+    """
+    top = opcode & 0xF000
+    if top in GROUPS:
+        table, key_mask, _ = GROUPS[top]
+        return DECODER[table][opcode & key_mask]
+
+    return DECODER["opcodes"][top]
+
+def operands(entry, opcode):
+    """
+
+    Extract the operand fields of an instruction from an opcode
+
+    @param entry the Instruction
+    @param opcode the opcode
+    @returns a dictionary mapping each field name to its value
+
+    """
+    return dict((field, (opcode & FIELDS[field][0]) >> FIELDS[field][1]) for field in entry.operands)
+
+def disassemble(opcode):
+    """
+
+    Write an opcode as assembly text
+
+    @param opcode the opcode
+    @returns the assembly text
+    @raises KeyError if the opcode is not an instruction
+
+    """
+    entry = decode(opcode)
+    return entry.template.format(**operands(entry, opcode))
@@ -0,0 +1,307 @@
+import os
+import socket
+import stat
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+
+"""
+
+Live health metrics for running CHIP-8 emulators
+
+A Metrics object counts the instructions and frames run, frames that ran
+late or were never presented, the time spent running the CPU, rendering
+and polling events, and the latency from a key press to the next presented
+frame. Runners record into it once per frame. The counters can be scraped
+in the Prometheus text format from a local HTTP server, on a TCP port or a
+Unix socket, and summarised in a periodic stats line.
+
+"""
+
+# Sections of a frame that are timed
+SECTIONS = ("cpu", "render", "events")
+
+# The shortest window over which rates are computed
+RATE_WINDOW = 1.0
+
+class Metrics(object):
+    """
+
+    Counters describing the health of a running emulator
+
+    """
+
+    def __init__(self, log_interval=None, stream=None):
+        """
+
+        Create a new Metrics object
+
+        @param log_interval the number of seconds between stats lines, or
+                            None for no stats lines
+        @param stream the stream to write stats lines to, standard error by
+                      default
+
+        """
+        self.log_interval = log_interval
+        self.stream = stream if stream is not None else sys.stderr
+        self.lock = threading.Lock()
+
+        self.instructions = 0
+        self.frames = 0
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.seconds = dict((section, 0.0) for section in SECTIONS)
+        self.latency_seconds = 0.0
+        self.latency_count = 0
+
+        # Rates over the most recent window
+        self.instructions_per_second = 0.0
+        self.frames_per_second = 0.0
+
+        now = time.monotonic()
+        self.started = now
+        self.window = (now, 0, 0)
+        self.logged = (now, 0, 0, dict(self.seconds), (0.0, 0))
+
+    def frame(self, instructions, late=False):
+        """
+
+        Count a frame that has been run
+
+        @param instructions the number of instructions run in the frame
+        @param late True if the frame finished after it was due
+
+        """
+        with self.lock:
+            self.instructions += instructions
+            self.frames += 1
+            if late:
+                self.late_frames += 1
+
+        now = time.monotonic()
+        start, instructions, frames = self.window
+        if now - start >= RATE_WINDOW:
+            self.instructions_per_second = (self.instructions - instructions) / (now - start)
+            self.frames_per_second = (self.frames - frames) / (now - start)
+            self.window = (now, self.instructions, self.frames)
+
+        if self.log_interval is not None and now - self.logged[0] >= self.log_interval:
+            self.stream.write(self.log_line(now) + "\n")
+            self.stream.flush()
+
+    def dropped(self, frames=1):
+        """
+
+        Count frames that were drawn but never presented
+
+        @param frames the number of frames dropped
+
+        """
+        with self.lock:
+            self.dropped_frames += frames
+
+    def input_latency(self, seconds):
+        """
+
+        Record the time from a key press being handled to the next frame
+        being presented
+
+        @param seconds the latency
+
+        """
+        with self.lock:
+            self.latency_seconds += seconds
+            self.latency_count += 1
+
+    def timing(self, section, seconds):
+        """
+
+        Add to the time spent in a section of the frame
+
+        @param section one of SECTIONS
+        @param seconds the time spent
+
+        """
+        with self.lock:
+            self.seconds[section] += seconds
+
+    def log_line(self, now=None):
+        """
+
+        Summarise the counters since the previous stats line
+
+        @param now the current monotonic time
+        @returns the stats line
+
+        """
+        now = time.monotonic() if now is None else now
+        then, instructions, frames, seconds, latency = self.logged
+        elapsed = max(now - then, 1e-9)
+
+        with self.lock:
+            spent = dict((section, self.seconds[section] - seconds[section]) for section in SECTIONS)
+            line = "chip8 stats: {0:.0f} instr/s {1:.1f} fps {2} late {3} dropped".format(
+                (self.instructions - instructions) / elapsed, (self.frames - frames) / elapsed,
+                self.late_frames, self.dropped_frames)
+            presses = self.latency_count - latency[1]
+            if presses > 0:
+                line += " input {0:.1f}ms".format(((self.latency_seconds - latency[0]) / presses) * 1e3)
+            self.logged = (now, self.instructions, self.frames, dict(self.seconds),
+                           (self.latency_seconds, self.latency_count))
+
+        line += "".join(" {0} {1:.1f}%".format(section, (spent[section] / elapsed) * 100) for section in SECTIONS)
+        return line
+
+    def prometheus(self):
+        """
+
+        Format the counters in the Prometheus text exposition format
+
+        @returns the text
+
+        """
+        with self.lock:
+            counters = [
+                ("chip8_instructions_total", "Instructions executed", self.instructions),
+                ("chip8_frames_total", "Frames run", self.frames),
+                ("chip8_late_frames_total", "Frames that finished after they were due", self.late_frames),
+                ("chip8_dropped_frames_total", "Frames drawn but never presented", self.dropped_frames)]
+            seconds = dict(self.seconds)
+            latency = (self.latency_seconds, self.latency_count)
+
+        gauges = [
+            ("chip8_instructions_per_second", "Instructions executed per second, recently",
+             self.instructions_per_second),
+            ("chip8_frames_per_second", "Frames run per second, recently", self.frames_per_second),
+            ("chip8_uptime_seconds", "Seconds since the metrics were created", time.monotonic() - self.started)]
+
+        lines = []
+        for name, description, value in counters:
+            lines.extend(["# HELP {0} {1}".format(name, description), "# TYPE {0} counter".format(name),
+                          "{0} {1}".format(name, value)])
+
+        lines.extend(["# HELP chip8_seconds_total Seconds spent in each section of the frame",
+                      "# TYPE chip8_seconds_total counter"])
+        for section in SECTIONS:
+            lines.append('chip8_seconds_total{{section="{0}"}} {1:.6f}'.format(section, seconds[section]))
+
+        lines.extend(["# HELP chip8_input_latency_seconds Time from a key press to the next presented frame",
+                      "# TYPE chip8_input_latency_seconds summary",
+                      "chip8_input_latency_seconds_sum {0:.6f}".format(latency[0]),
+                      "chip8_input_latency_seconds_count {0}".format(latency[1])])
+
+        for name, description, value in gauges:
+            lines.extend(["# HELP {0} {1}".format(name, description), "# TYPE {0} gauge".format(name),
+                          "{0} {1:.3f}".format(name, value)])
+
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+
+    Serves the metrics of the server at /metrics
+
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class UnixHTTPServer(HTTPServer):
+    """
+
+    An HTTP server listening on a Unix socket
+
+    """
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        """
+
+        Bind to the socket path, replacing a socket left behind by an earlier
+        server but never any other kind of file
+
+        @raises FileExistsError if something other than a socket is at the path
+
+        """
+        try:
+            mode = os.lstat(self.server_address).st_mode
+        except FileNotFoundError:
+            mode = None
+
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError("{0} exists and is not a socket".format(self.server_address))
+            os.remove(self.server_address)
+
+        HTTPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = HTTPServer.get_request(self)
+        return request, ("localhost", 0)
+
+class MetricsServer(object):
+    """
+
+    Serves metrics in the Prometheus text format from a background thread
+
+    """
+
+    def __init__(self, metrics, address):
+        """
+
+        Start serving metrics
+
+        @param metrics the Metrics to serve
+        @param address a port number on the loopback interface, a
+                       "host:port" pair, or the path of a Unix socket
+
+        """
+        address = str(address)
+        if address.isdigit():
+            self.server = ThreadingHTTPServer(("127.0.0.1", int(address)), MetricsHandler)
+        elif ":" in address and address.rpartition(":")[2].isdigit():
+            host, _, port = address.rpartition(":")
+            self.server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+        else:
+            self.server = UnixHTTPServer(address, MetricsHandler)
+
+        self.server.metrics = metrics
+        self.thread = threading.Thread(target=self.server.serve_forever, name="chip8-metrics")
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def address(self):
+        """
+
+        The address the server is listening on
+
+        """
+        return self.server.server_address
+
+    def close(self):
+        """
+
+        Stop serving, removing the Unix socket if there is one
+
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if self.server.address_family == socket.AF_UNIX and os.path.exists(self.server.server_address):
+            os.remove(self.server.server_address)
@@ -0,0 +1,222 @@
+import random
+import sys
+from collections import Counter
+from .cpu import CPU
+
+"""
+
+A sampling profiler for programs running on the CHIP-8 virtual machine
+
+Every N cycles, the guest call stack is reconstructed from the CPU's stack:
+each entry below the stack pointer is the address of a 2NNN instruction, so
+the subroutine it entered is decoded from memory. Samples are counted per
+stack and written in the collapsed format read by flamegraph tools, one
+line of semicolon-separated frames and a count per stack.
+
+The CPU runs with CPU.run() between samples, so the profiler adds no cost
+to the instructions it does not sample.
+
+"""
+
+# Usage
+REQUIRED_ARGS = 3
+
+# Sampling parameters
+DEFAULT_INTERVAL = 97
+
+# The frame at the bottom of every stack
+ROOT = "main"
+
+def load_symbols(path):
+    """
+
+    Load subroutine names from a file of lines of a hexadecimal address and
+    a name. Blank lines and lines starting with '#' are ignored.
+
+    @param path the path of the file
+    @returns a dictionary of addresses to names
+
+    """
+    symbols = {}
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if words and not words[0].startswith("#"):
+                symbols[int(words[0], 16)] = words[1]
+
+    return symbols
+
+class Profiler(object):
+    """
+
+    Samples the guest call stack of a CPU
+
+    """
+
+    def __init__(self, cpu, interval=DEFAULT_INTERVAL, symbols=None, addresses=True, jitter=0, seed=None):
+        """
+
+        Create a new Profiler object
+
+        @param cpu the CPU to profile
+        @param interval the number of cycles between samples
+        @param symbols an optional dictionary of subroutine addresses to names
+        @param addresses True to end each stack with the sampled address
+        @param jitter the most cycles each interval is randomly lengthened
+                      or shortened by, so that sampling does not fall into
+                      step with loops of the same length
+        @param seed the seed for the jitter
+
+        """
+        if interval - jitter < 1:
+            raise ValueError("the interval must be longer than the jitter")
+
+        self.cpu = cpu
+        self.interval = interval
+        self.symbols = symbols if symbols is not None else {}
+        self.addresses = addresses
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+        self.samples = Counter()
+        self.countdown = self.next_interval()
+
+    def next_interval(self):
+        """
+
+        Choose the number of cycles until the next sample
+
+        @returns the number of cycles
+
+        """
+        if self.jitter == 0:
+            return self.interval
+
+        return self.interval + self.random.randint(-self.jitter, self.jitter)
+
+    def stack(self):
+        """
+
+        Reconstruct the current guest call stack
+
+        @returns a tuple of the entered subroutines' addresses, outermost
+                 first, followed by the current address. A stack entry that
+                 no longer points to a 2NNN instruction is recorded as None.
+
+        """
+        cpu = self.cpu
+        frames = []
+        for call in cpu.stack[:cpu.sp]:
+            if call + 1 < len(cpu.memory) and cpu.memory[call] & 0xF0 == 0x20:
+                frames.append(((cpu.memory[call] & 0x0F) << 8) | cpu.memory[call + 1])
+            else:
+                frames.append(None)
+
+        frames.append(cpu.pc)
+        return tuple(frames)
+
+    def sample(self, cpu=None):
+        """
+
+        Record the current guest call stack. This can also be used as a
+        per-frame callback to sample a CPU that is run elsewhere.
+
+        @param cpu ignored, so that the profiler can be passed as on_frame
+
+        """
+        self.samples[self.stack()] += 1
+
+    def run(self, cycles):
+        """
+
+        Run the CPU, sampling it every interval
+
+        @param cycles the number of cycles to run
+
+        """
+        cpu = self.cpu
+        while cycles > 0:
+            step = min(cycles, self.countdown)
+            cpu.run(step)
+            cycles -= step
+            self.countdown -= step
+
+            if self.countdown == 0:
+                self.sample()
+                self.countdown = self.next_interval()
+
+    def label(self, address):
+        """
+
+        Name the subroutine at an address
+
+        @param address the address of the subroutine, or None if unknown
+        @returns the name
+
+        """
+        if address is None:
+            return "unknown"
+
+        return self.symbols.get(address, "sub_{0:03X}".format(address))
+
+    def collapsed(self):
+        """
+
+        Format the samples as collapsed stacks
+
+        @returns a list of lines, without newlines, sorted by stack
+
+        """
+        counts = Counter()
+        for frames, count in self.samples.items():
+            names = [ROOT] + [self.label(address) for address in frames[:-1]]
+            if self.addresses:
+                names.append("{0:03X}".format(frames[-1]))
+            counts[";".join(names)] += count
+
+        return ["{0} {1}".format(stack, count) for stack, count in sorted(counts.items())]
+
+    def write(self, stream):
+        """
+
+        Write the samples as collapsed stacks
+
+        @param stream the stream to write to
+
+        """
+        for line in self.collapsed():
+            stream.write(line + "\n")
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.profiler rom cycles [interval] [symbols] > profile.folded"
+
+def main(argv):
+    """
+
+    Driver for the profiler, which writes collapsed stacks to standard output
+
+    @param argv the argument values
+
+    """
+    if len(argv) < REQUIRED_ARGS:
+        exit(usage(argv[0]))
+
+    interval = int(argv[3]) if len(argv) > 3 else DEFAULT_INTERVAL
+    symbols = load_symbols(argv[4]) if len(argv) > 4 else None
+
+    cpu = CPU()
+    cpu.load_rom(argv[1])
+    profiler = Profiler(cpu, interval, symbols)
+    profiler.run(int(argv[2]))
+    profiler.write(sys.stdout)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
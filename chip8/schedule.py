@@ -0,0 +1,270 @@
+import bisect
+import random
+import sys
+import time
+from .cpu import CPU, CYCLES_PER_FRAME, KEYS
+from .statehash import StateHasher
+
+"""
+
+Cycle-precise scripted input for the CHIP-8 virtual machine
+
+An InputSchedule holds key presses and releases at exact cycle numbers, so a
+run with the same ROM, schedule and random seed always reaches the same
+state. An InputPlayer runs a CPU with CPU.run() up to each event and applies
+it between cycles, without any pygame involvement.
+
+Schedules can be built in code or read from a script with one event per
+line, where frames are converted to cycles at the start of the frame and
+keys are hexadecimal:
+
+    # Serve, then hold up for half a second
+    frame 120 down 5
+    frame 121 up 5
+    cycle 1500 down 1
+    frame 180 up 1
+
+"""
+
+# Usage
+REQUIRED_ARGS = 4
+
+# Script keywords
+UNITS = ("cycle", "frame")
+ACTIONS = {"down": True, "up": False}
+
+class InputSchedule(object):
+    """
+
+    Key events at exact cycle numbers
+
+    """
+
+    def __init__(self, cycles_per_frame=CYCLES_PER_FRAME):
+        """
+
+        Create a new, empty InputSchedule object
+
+        @param cycles_per_frame the number of cycles in a frame
+
+        """
+        self.cycles_per_frame = cycles_per_frame
+
+        # Events as sorted (cycle, order, key, pressed) tuples. The order
+        # keeps events at the same cycle in the order they were added.
+        self.events = []
+
+    def __len__(self):
+        """
+
+        Count the scheduled key events
+
+        @returns the number of events
+
+        """
+        return len(self.events)
+
+    def add(self, key, pressed, cycle=None, frame=None):
+        """
+
+        Schedule a key event at a cycle, or at the start of a frame
+
+        @param key the index of the key
+        @param pressed True for a press, False for a release
+        @param cycle the cycle the event happens before
+        @param frame the frame the event happens at the start of
+
+        """
+        if (cycle is None) == (frame is None):
+            raise ValueError("an event needs either a cycle or a frame")
+        if not 0 <= key < KEYS:
+            raise ValueError("there is no key {0:X}".format(key))
+
+        if cycle is None:
+            cycle = frame * self.cycles_per_frame
+
+        bisect.insort(self.events, (cycle, len(self.events), key, pressed))
+
+    def press(self, key, cycle=None, frame=None):
+        """
+
+        Schedule a key press
+
+        @param key the index of the key
+        @param cycle the cycle the key is pressed before
+        @param frame the frame the key is pressed at the start of
+
+        """
+        self.add(key, True, cycle, frame)
+
+    def release(self, key, cycle=None, frame=None):
+        """
+
+        Schedule a key release
+
+        @param key the index of the key
+        @param cycle the cycle the key is released before
+        @param frame the frame the key is released at the start of
+
+        """
+        self.add(key, False, cycle, frame)
+
+    def tap(self, key, frame, frames=1):
+        """
+
+        Schedule a key to be held down for a number of frames
+
+        @param key the index of the key
+        @param frame the frame the key is pressed at the start of
+        @param frames the number of frames the key is held for
+
+        """
+        self.press(key, frame=frame)
+        self.release(key, frame=frame + frames)
+
+    def parse(self, text):
+        """
+
+        Add the events of a script
+
+        @param text the script
+
+        """
+        for number, line in enumerate(text.splitlines(), 1):
+            words = line.split("#", 1)[0].split()
+            if not words:
+                continue
+
+            if len(words) != 4 or words[0] not in UNITS or words[2] not in ACTIONS:
+                raise ValueError("line {0}: expected '(cycle|frame) N (down|up) KEY'".format(number))
+
+            when = {words[0]: int(words[1])}
+            self.add(int(words[3], 16), ACTIONS[words[2]], **when)
+
+    @classmethod
+    def load(cls, path, cycles_per_frame=CYCLES_PER_FRAME):
+        """
+
+        Read a schedule from a script file
+
+        @param path the path of the script
+        @param cycles_per_frame the number of cycles in a frame
+        @returns the new InputSchedule
+
+        """
+        schedule = cls(cycles_per_frame)
+        with open(path) as f:
+            schedule.parse(f.read())
+
+        return schedule
+
+    def dumps(self):
+        """
+
+        Write the schedule as a script
+
+        @returns the script
+
+        """
+        return "".join("cycle {0} {1} {2:X}\n".format(cycle, "down" if pressed else "up", key)
+                       for cycle, _, key, pressed in self.events)
+
+class InputPlayer(object):
+    """
+
+    Runs a CPU, applying the events of an InputSchedule between cycles
+
+    """
+
+    def __init__(self, cpu, schedule):
+        """
+
+        Create a new InputPlayer object. Events scheduled before the CPU's
+        current cycle are skipped.
+
+        @param cpu the CPU to run
+        @param schedule the InputSchedule to apply
+
+        """
+        self.cpu = cpu
+        self.schedule = schedule
+        self.next = bisect.bisect_left(schedule.events, (cpu.cycles,))
+
+    def run(self, cycles):
+        """
+
+        Run the CPU, applying every event that falls within the run
+
+        @param cycles the number of cycles to run
+
+        """
+        cpu = self.cpu
+        events = self.schedule.events
+        end = cpu.cycles + cycles
+
+        while True:
+            # Apply every event due before the next cycle
+            while self.next < len(events) and events[self.next][0] <= cpu.cycles:
+                _, _, key, pressed = events[self.next]
+                cpu.keys[key] = pressed
+                self.next += 1
+
+            if cpu.cycles >= end:
+                break
+
+            stop = end
+            if self.next < len(events):
+                stop = min(stop, events[self.next][0])
+
+            cpu.run(stop - cpu.cycles)
+
+    def run_frames(self, frames):
+        """
+
+        Run the CPU for a number of frames
+
+        @param frames the number of frames to run
+
+        """
+        self.run(frames * self.schedule.cycles_per_frame)
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.schedule rom script frames [seed]"
+
+def main(argv):
+    """
+
+    Driver for scripted headless runs. Prints the speed of the run and a
+    hash of the final state, which is the same for every run of the same
+    ROM, script and seed.
+
+    @param argv the argument values
+
+    """
+    if len(argv) < REQUIRED_ARGS:
+        exit(usage(argv[0]))
+
+    random.seed(int(argv[4]) if len(argv) > 4 else 0)
+
+    cpu = CPU()
+    cpu.load_rom(argv[1])
+    schedule = InputSchedule.load(argv[2])
+    player = InputPlayer(cpu, schedule)
+
+    start = time.perf_counter()
+    player.run_frames(int(argv[3]))
+    elapsed = time.perf_counter() - start
+
+    print("{0} cycles in {1:.3f}s ({2:.0f} cycles/s)".format(cpu.cycles, elapsed, cpu.cycles / elapsed))
+    print("state {0:016X}".format(StateHasher(cpu).digest() & 0xFFFFFFFFFFFFFFFF))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
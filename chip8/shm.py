@@ -0,0 +1,196 @@
+import struct
+import time
+from multiprocessing import shared_memory
+from .cpu import HEIGHT, MEMORY, REGISTERS, STACK, WIDTH
+
+"""
+
+Shared-memory export of the CHIP-8 machine state
+
+The emulator publishes its framebuffer, registers and memory once per frame
+into a multiprocessing.shared_memory block, so that recorders, agents and
+dashboards in other processes can read them in place without pickling or
+sockets. Every publish is guarded by a seqlock: the sequence number is odd
+while a frame is being written, and readers retry if it was odd or changed
+while they were reading.
+
+"""
+
+# Block layout: header, framebuffer, registers, stack, memory
+MAGIC = b"C8SM"
+HEADER = struct.Struct("<4sIQB")
+REGS = struct.Struct("<{0}sHHBBB".format(REGISTERS))
+STACK_FORMAT = struct.Struct("<{0}H".format(STACK))
+
+HEADER_OFFSET = 0
+GFX_OFFSET = 32
+REGS_OFFSET = GFX_OFFSET + (WIDTH * HEIGHT)
+STACK_OFFSET = REGS_OFFSET + 32
+MEMORY_OFFSET = STACK_OFFSET + STACK_FORMAT.size
+SIZE = MEMORY_OFFSET + MEMORY
+
+# Header fields
+SEQ_OFFSET = 4
+SEQ = struct.Struct("<I")
+
+def to_bytes(values):
+    """
+
+    Pack a list of byte values, wrapping any that have overflowed
+
+    @param values the values to pack
+    @returns the packed bytes
+
+    """
+    try:
+        return bytes(values)
+    except ValueError:
+        return bytes(value & 0xFF for value in values)
+
+class SharedState(object):
+    """
+
+    The writing side of a shared-memory state export
+
+    """
+
+    def __init__(self, name=None):
+        """
+
+        Create a new shared-memory block for the machine state
+
+        @param name the name of the block, or None to generate one
+
+        """
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SIZE)
+        self.name = self.shm.name
+        self.frame = 0
+        self.seq = 0
+
+        HEADER.pack_into(self.shm.buf, HEADER_OFFSET, MAGIC, self.seq, self.frame, 0)
+
+    def publish(self, cpu):
+        """
+
+        Copy the state of a CPU into the block as a new frame
+
+        @param cpu the CPU to publish
+
+        """
+        buf = self.shm.buf
+
+        dirty = buf[GFX_OFFSET:REGS_OFFSET] != cpu.gfx
+
+        self.seq += 1
+        SEQ.pack_into(buf, SEQ_OFFSET, self.seq)
+
+        buf[GFX_OFFSET:REGS_OFFSET] = cpu.gfx
+        REGS.pack_into(buf, REGS_OFFSET, to_bytes(cpu.v), cpu.i & 0xFFFF, cpu.pc & 0xFFFF,
+                       cpu.sp & 0xFF, cpu.delay & 0xFF, cpu.sound & 0xFF)
+        STACK_FORMAT.pack_into(buf, STACK_OFFSET, *[addr & 0xFFFF for addr in cpu.stack])
+        buf[MEMORY_OFFSET:SIZE] = to_bytes(cpu.memory)
+
+        self.frame += 1
+        self.seq += 1
+        HEADER.pack_into(buf, HEADER_OFFSET, MAGIC, self.seq, self.frame, 1 if dirty else 0)
+
+    def close(self):
+        """
+
+        Detach from the block and destroy it
+
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+class SharedStateReader(object):
+    """
+
+    The reading side of a shared-memory state export
+
+    """
+
+    def __init__(self, name):
+        """
+
+        Attach to a block created by SharedState
+
+        @param name the name of the block
+
+        """
+        self.shm = shared_memory.SharedMemory(name=name)
+        if bytes(self.shm.buf[:len(MAGIC)]) != MAGIC:
+            self.shm.close()
+            raise ValueError("{0} is not a CHIP-8 shared state block".format(name))
+
+        # Views of the block itself. Reading these does not copy, but the
+        # contents may change underneath the reader at any time.
+        self.gfx = self.shm.buf[GFX_OFFSET:REGS_OFFSET]
+        self.memory = self.shm.buf[MEMORY_OFFSET:SIZE]
+
+    @property
+    def frame(self):
+        """
+
+        The number of the most recently published frame
+
+        """
+        return HEADER.unpack_from(self.shm.buf, HEADER_OFFSET)[2]
+
+    def snapshot(self):
+        """
+
+        Take a consistent copy of the most recently published frame
+
+        @returns a dictionary of the frame number, a flag telling whether the
+                 framebuffer changed in that frame, the framebuffer,
+                 registers, stack and memory
+
+        """
+        buf = self.shm.buf
+        while True:
+            _, before, frame, dirty = HEADER.unpack_from(buf, HEADER_OFFSET)
+            if before % 2 == 1:
+                continue
+
+            gfx = bytes(self.gfx)
+            v, i, pc, sp, delay, sound = REGS.unpack_from(buf, REGS_OFFSET)
+            stack = STACK_FORMAT.unpack_from(buf, STACK_OFFSET)
+            memory = bytes(self.memory)
+
+            if SEQ.unpack_from(buf, SEQ_OFFSET)[0] == before:
+                return {"frame": frame, "dirty": bool(dirty), "gfx": gfx, "v": list(v), "i": i,
+                        "pc": pc, "sp": sp, "delay": delay, "sound": sound, "stack": list(stack),
+                        "memory": memory}
+
+    def wait_frame(self, last, timeout=None, interval=0.001):
+        """
+
+        Wait for a frame newer than the given one to be published
+
+        @param last the number of the last frame seen
+        @param timeout the maximum number of seconds to wait, or None
+        @param interval the number of seconds between polls
+        @returns the new frame number, or None on timeout
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.frame
+            if frame > last:
+                return frame
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+
+            time.sleep(interval)
+
+    def close(self):
+        """
+
+        Detach from the block
+
+        """
+        self.gfx.release()
+        self.memory.release()
+        self.shm.close()
@@ -0,0 +1,100 @@
+from .cpu import MEMORY, WIDTH, HEIGHT
+
+"""
+
+Incremental hashing of the full CHIP-8 machine state
+
+Main memory and the framebuffer are split into pages, each with a cached
+hash. A StateHasher attached to CPU.hasher is told which pages the CPU
+writes, so computing the hash of the whole machine only rehashes those
+pages plus the handful of registers, rather than all 4 KB of memory and
+2048 pixels.
+
+"""
+
+# Number of memory addresses or pixels in each hashed page
+PAGE_SIZE = 256
+
+class StateHasher(object):
+    """
+
+    Maintains a running hash of the state of a CPU
+
+    """
+
+    def __init__(self, cpu):
+        """
+
+        Create a new StateHasher object and attach it to a CPU
+
+        @param cpu the CPU whose state is hashed
+
+        """
+        self.cpu = cpu
+        self.memory_hashes = [0] * (MEMORY // PAGE_SIZE)
+        self.gfx_hashes = [0] * ((WIDTH * HEIGHT) // PAGE_SIZE)
+        self.invalidate()
+
+        cpu.hasher = self
+
+    def invalidate(self):
+        """
+
+        Mark every page as written. This must be called after modifying the
+        CPU's memory or framebuffer directly rather than through its
+        instructions.
+
+        """
+        self.dirty_memory = set(range(len(self.memory_hashes)))
+        self.dirty_gfx = set(range(len(self.gfx_hashes)))
+
+    def memory_written(self, addr, length):
+        """
+
+        Mark the pages covering a range of memory as written
+
+        @param addr the first address written
+        @param length the number of bytes written
+
+        """
+        end = min(addr + length, MEMORY)
+        if addr < end:
+            self.dirty_memory.update(range(addr // PAGE_SIZE, ((end - 1) // PAGE_SIZE) + 1))
+
+    def gfx_written(self, pos, length):
+        """
+
+        Mark the pages covering a range of the framebuffer as written
+
+        @param pos the first pixel written
+        @param length the number of pixels written
+
+        """
+        end = min(pos + length, WIDTH * HEIGHT)
+        if pos < end:
+            self.dirty_gfx.update(range(pos // PAGE_SIZE, ((end - 1) // PAGE_SIZE) + 1))
+
+    def digest(self):
+        """
+
+        Compute the hash of the full machine state, rehashing only the pages
+        written since the previous call
+
+        @returns an integer hash of the machine state
+
+        """
+        cpu = self.cpu
+
+        for page in self.dirty_memory:
+            start = page * PAGE_SIZE
+            self.memory_hashes[page] = hash(tuple(cpu.memory[start:start + PAGE_SIZE]))
+
+        for page in self.dirty_gfx:
+            start = page * PAGE_SIZE
+            self.gfx_hashes[page] = hash(tuple(cpu.gfx[start:start + PAGE_SIZE]))
+
+        self.dirty_memory.clear()
+        self.dirty_gfx.clear()
+
+        return hash((tuple(self.memory_hashes), tuple(self.gfx_hashes), tuple(cpu.v), cpu.i,
+                     cpu.pc, tuple(cpu.stack), cpu.sp, cpu.delay, cpu.sound))
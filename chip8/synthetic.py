@@ -0,0 +1,491 @@
+import json
+import os
+import sys
+from collections import namedtuple
+from .cpu import FONTSET, HEIGHT, MEMORY, PROGRAM_COUNTER_START, REGISTERS, STACK, WIDTH
+
+"""
+
+Synthetic benchmark ROMs for the CHIP-8 virtual machine
+
+Each workload is a generated ROM that stresses one path of the interpreter
+for a fixed number of iterations and then halts in a jump to itself, along
+with the exact number of cycles it takes to halt and its expected final
+state. The expected state is computed by a small reference model of the
+instructions the generator emits, written independently of the CPU, so a
+workload can check any interpreter engine as well as time it.
+
+Every workload counts iterations in VD and VE and leaves V0 to VC and VF
+to the code being measured:
+
+    setup
+            LD VE, 0
+    outer:  LD VD, 0
+    inner:  body
+            ADD VD, 1
+            SE VD, inner count
+            JP inner
+            ADD VE, 1
+            SE VE, outer count
+            JP outer
+    halt:   JP halt
+
+"""
+
+# Usage
+REQUIRED_ARGS = 2
+
+# Memory layout of the generated ROMs
+SUBROUTINES = 0x600
+DATA = 0x900
+
+# Default iteration counts
+DEFAULT_INNER = 200
+DEFAULT_OUTER = 10
+
+Workload = namedtuple("Workload", ["name", "rom", "cycles", "expected"])
+
+class Reference(object):
+    """
+
+    A minimal model of the instructions emitted by the generators, used to
+    compute the expected final state of a workload. It follows the same
+    conventions as the CPU where CHIP-8 interpreters differ: 8XY6 and 8XYE
+    shift VX, and FX55 and FX65 leave I unchanged.
+
+    """
+
+    def __init__(self, rom):
+        """
+
+        Create a new Reference model with a ROM loaded
+
+        @param rom the ROM
+
+        """
+        self.memory = bytearray(MEMORY)
+        self.memory[:len(FONTSET)] = bytes(FONTSET)
+        self.memory[PROGRAM_COUNTER_START:PROGRAM_COUNTER_START + len(rom)] = rom
+        self.gfx = bytearray(WIDTH * HEIGHT)
+        self.v = [0] * REGISTERS
+        self.i = 0
+        self.pc = PROGRAM_COUNTER_START
+        self.stack = []
+        self.cycles = 0
+
+    def step(self):
+        """
+
+        Execute a single instruction
+
+        """
+        opcode = (self.memory[self.pc] << 8) | self.memory[self.pc + 1]
+        family = opcode >> 12
+        x = (opcode >> 8) & 0xF
+        y = (opcode >> 4) & 0xF
+        n = opcode & 0xF
+        nn = opcode & 0xFF
+        nnn = opcode & 0xFFF
+        v = self.v
+        pc = self.pc + 2
+
+        if opcode == 0x00EE:
+            pc = self.stack.pop() + 2
+        elif family == 0x1:
+            pc = nnn
+        elif family == 0x2:
+            if len(self.stack) == STACK:
+                raise OverflowError("call stack overflow")
+            self.stack.append(self.pc)
+            pc = nnn
+        elif family == 0x3:
+            pc += 2 if v[x] == nn else 0
+        elif family == 0x6:
+            v[x] = nn
+        elif family == 0x7:
+            v[x] = (v[x] + nn) & 0xFF
+        elif family == 0x8:
+            self.arithmetic(n, x, y)
+        elif family == 0xA:
+            self.i = nnn
+        elif family == 0xD:
+            self.draw(v[x], v[y], n)
+        elif opcode & 0xF0FF == 0xF01E:
+            self.i += v[x]
+        elif opcode & 0xF0FF == 0xF029:
+            self.i = v[x] * 5
+        elif opcode & 0xF0FF == 0xF033:
+            self.memory[self.i:self.i + 3] = bytes([v[x] // 100, (v[x] // 10) % 10, v[x] % 10])
+        elif opcode & 0xF0FF == 0xF055:
+            self.memory[self.i:self.i + x + 1] = bytes(v[:x + 1])
+        elif opcode & 0xF0FF == 0xF065:
+            v[:x + 1] = self.memory[self.i:self.i + x + 1]
+        else:
+            raise ValueError("the reference model does not implement {0:04X}".format(opcode))
+
+        self.pc = pc
+        self.cycles += 1
+
+    def arithmetic(self, n, x, y):
+        """
+
+        Execute an 8XYN instruction
+
+        @param n the lowest nibble of the instruction
+        @param x the index for VX
+        @param y the index for VY
+
+        """
+        v = self.v
+        if n == 0x0:
+            v[x] = v[y]
+        elif n == 0x1:
+            v[x] |= v[y]
+        elif n == 0x2:
+            v[x] &= v[y]
+        elif n == 0x3:
+            v[x] ^= v[y]
+        elif n == 0x4:
+            total = v[x] + v[y]
+            v[x] = total & 0xFF
+            v[0xF] = 1 if total > 0xFF else 0
+        elif n == 0x5:
+            flag = 1 if v[x] >= v[y] else 0
+            v[x] = (v[x] - v[y]) & 0xFF
+            v[0xF] = flag
+        elif n == 0x6:
+            flag = v[x] & 0x1
+            v[x] >>= 1
+            v[0xF] = flag
+        elif n == 0x7:
+            flag = 1 if v[y] >= v[x] else 0
+            v[x] = (v[y] - v[x]) & 0xFF
+            v[0xF] = flag
+        elif n == 0xE:
+            flag = v[x] >> 7
+            v[x] = (v[x] << 1) & 0xFF
+            v[0xF] = flag
+        else:
+            raise ValueError("the reference model does not implement 8XY{0:X}".format(n))
+
+    def draw(self, pos_x, pos_y, height):
+        """
+
+        Execute a DXYN instruction for a sprite that lies on the screen
+
+        @param pos_x the left edge of the sprite
+        @param pos_y the top edge of the sprite
+        @param height the number of rows in the sprite
+
+        """
+        if pos_x + 8 > WIDTH or pos_y + height > HEIGHT:
+            raise ValueError("the reference model only draws sprites that lie on the screen")
+
+        flag = 0
+        for row in range(height):
+            pixels = self.memory[self.i + row]
+            for col in range(8):
+                if pixels & (0x80 >> col):
+                    pos = pos_x + col + ((pos_y + row) * WIDTH)
+                    flag |= self.gfx[pos]
+                    self.gfx[pos] ^= 1
+
+        self.v[0xF] = flag
+
+def assemble(setup, body, inner, outer, subroutines=None, data=None):
+    """
+
+    Build a workload ROM from the code of its loop body
+
+    @param setup the opcodes run once before the loops
+    @param body a function of the address of the body returning its opcodes
+    @param inner the number of inner iterations, from 1 to 255
+    @param outer the number of outer iterations, from 1 to 255
+    @param subroutines an optional dictionary of addresses to opcodes
+    @param data an optional dictionary of addresses to bytes
+    @returns a (ROM, halt address) pair
+
+    """
+    if not (0 < inner < 256 and 0 < outer < 256):
+        raise ValueError("iteration counts must be from 1 to 255")
+
+    code = list(setup) + [0x6E00]
+    outer_loop = PROGRAM_COUNTER_START + (len(code) * 2)
+    code.append(0x6D00)
+    inner_loop = PROGRAM_COUNTER_START + (len(code) * 2)
+    code.extend(body(inner_loop))
+    code.extend([0x7D01, 0x3D00 | inner, 0x1000 | inner_loop, 0x7E01, 0x3E00 | outer, 0x1000 | outer_loop])
+    halt = PROGRAM_COUNTER_START + (len(code) * 2)
+    code.append(0x1000 | halt)
+
+    if halt >= SUBROUTINES:
+        raise ValueError("the loop body is too long")
+
+    image = bytearray()
+    for opcode in code:
+        image.extend(opcode.to_bytes(2, "big"))
+
+    blocks = [(address, b"".join(opcode.to_bytes(2, "big") for opcode in opcodes))
+              for address, opcodes in (subroutines or {}).items()]
+    blocks.extend((data or {}).items())
+    for address, block in blocks:
+        if address < halt + 2:
+            raise ValueError("subroutines and data must be placed after the loops")
+
+        start = address - PROGRAM_COUNTER_START
+        if len(image) < start + len(block):
+            image.extend(bytes(start + len(block) - len(image)))
+        image[start:start + len(block)] = block
+
+    return bytes(image), halt
+
+def expect(name, rom, halt, memory=(), gfx=False):
+    """
+
+    Run a ROM on the reference model until it halts
+
+    @param name the name of the workload
+    @param rom the ROM
+    @param halt the address of the final jump to itself
+    @param memory (address, length) pairs of the memory to record
+    @param gfx True to record the framebuffer
+    @returns the Workload
+
+    """
+    model = Reference(rom)
+    while model.pc != halt:
+        model.step()
+
+    expected = {"pc": halt, "sp": 0, "v": list(model.v), "i": model.i,
+                "memory": {address: bytes(model.memory[address:address + length]) for address, length in memory}}
+    if gfx:
+        expected["gfx"] = bytes(model.gfx)
+
+    return Workload(name, rom, model.cycles, expected)
+
+def alu(inner=DEFAULT_INNER, outer=DEFAULT_OUTER):
+    """
+
+    Build a workload of 8XYN arithmetic, with carries, borrows and shifts
+
+    @param inner the number of inner iterations
+    @param outer the number of outer iterations
+    @returns the Workload
+
+    """
+    setup = [0x6101, 0x6203, 0x6305, 0x6407, 0x6511, 0x6613, 0x677F]
+    body = [
+        0x8124,   # ADD V1, V2
+        0x8215,   # SUB V2, V1
+        0x8347,   # SUBN V3, V4
+        0x8431,   # OR V4, V3
+        0x8563,   # XOR V5, V6
+        0x8612,   # AND V6, V1
+        0x8556,   # SHR V5
+        0x8810,   # LD V8, V1
+        0x8872,   # AND V8, V7
+        0x888E,   # SHL V8
+        0x8184,   # ADD V1, V8
+        0x8AF0,   # LD VA, VF
+        0x89A4]   # ADD V9, VA
+
+    rom, halt = assemble(setup, lambda address: body, inner, outer)
+    return expect("alu", rom, halt)
+
+def sprites(inner=DEFAULT_INNER, outer=DEFAULT_OUTER):
+    """
+
+    Build a workload of overlapping font sprites drawn with DXYN, counting
+    the collisions
+
+    @param inner the number of inner iterations
+    @param outer the number of outer iterations
+    @returns the Workload
+
+    """
+    setup = [0x6537, 0x661B, 0x680F]
+    body = [
+        0xF329,   # LD F, V3
+        0xD125,   # DRW V1, V2, 5
+        0x8AF0,   # LD VA, VF
+        0x87A4,   # ADD V7, VA
+        0x7307,   # ADD V3, 7
+        0x8382,   # AND V3, V8
+        0x7107,   # ADD V1, 7
+        0x8152,   # AND V1, V5
+        0x7203,   # ADD V2, 3
+        0x8262]   # AND V2, V6
+
+    rom, halt = assemble(setup, lambda address: body, inner, outer)
+    return expect("sprites", rom, halt, gfx=True)
+
+def calls(inner=DEFAULT_INNER, outer=DEFAULT_OUTER, depth=STACK):
+    """
+
+    Build a workload of a chain of nested 2NNN calls and 00EE returns
+
+    @param inner the number of inner iterations
+    @param outer the number of outer iterations
+    @param depth the depth of the chain, up to the size of the stack
+    @returns the Workload
+
+    """
+    if not 0 < depth <= STACK:
+        raise ValueError("the call depth must be from 1 to {0}".format(STACK))
+
+    subroutines = {}
+    for level in range(depth):
+        address = SUBROUTINES + (level * 6)
+        if level < depth - 1:
+            subroutines[address] = [0x7201, 0x2000 | (address + 6), 0x00EE]
+        else:
+            subroutines[address] = [0x7201, 0x7101, 0x00EE]
+
+    rom, halt = assemble([], lambda address: [0x2000 | SUBROUTINES], inner, outer, subroutines)
+    return expect("calls", rom, halt)
+
+def memory(inner=DEFAULT_INNER, outer=DEFAULT_OUTER):
+    """
+
+    Build a workload of FX55, FX65 and FX33 memory traffic
+
+    @param inner the number of inner iterations
+    @param outer the number of outer iterations
+    @returns the Workload
+
+    """
+    body = [
+        0xA000 | DATA,            # LD I, DATA
+        0xF765,                   # LD V7, [I]
+        0x8014,                   # ADD V0, V1
+        0x8124,                   # ADD V1, V2
+        0x8234,                   # ADD V2, V3
+        0x8344,                   # ADD V3, V4
+        0xA000 | DATA,            # LD I, DATA
+        0xF755,                   # LD [I], V7
+        0xA000 | (DATA + 0x10),   # LD I, DATA + 16
+        0xF033,                   # LD B, V0
+        0xA000 | DATA,            # LD I, DATA
+        0xF01E,                   # ADD I, V0
+        0xF165]                   # LD V1, [I]
+
+    rom, halt = assemble([], lambda address: body, inner, outer, data={DATA: bytes(range(1, 17))})
+    return expect("memory", rom, halt, memory=[(DATA, 0x100)])
+
+def self_modifying(inner=DEFAULT_INNER, outer=DEFAULT_OUTER):
+    """
+
+    Build a workload that rewrites the operand of one of its own
+    instructions on every iteration
+
+    @param inner the number of inner iterations
+    @param outer the number of outer iterations
+    @returns the Workload
+
+    """
+    targets = []
+
+    def body(address):
+        target = address + 8
+        targets.append(target)
+        return [
+            0x6072,              # LD V0, 0x72
+            0x8130,              # LD V1, V3
+            0xA000 | target,     # LD I, target
+            0xF155,              # LD [I], V1
+            0x7200,              # target: ADD V2, V3 once rewritten
+            0x7301]              # ADD V3, 1
+
+    rom, halt = assemble([], body, inner, outer)
+    return expect("selfmod", rom, halt, memory=[(targets[0], 2)])
+
+# Workloads by name
+WORKLOADS = {
+    "alu": alu,
+    "sprites": sprites,
+    "calls": calls,
+    "memory": memory,
+    "selfmod": self_modifying}
+
+def check(cpu, expected):
+    """
+
+    Compare the state of a CPU with the expected final state of a workload
+
+    @param cpu the CPU that ran the workload
+    @param expected the expected state
+    @returns a list of the names of the fields that differ
+
+    """
+    differences = []
+    for field in ("pc", "sp", "i"):
+        if getattr(cpu, field) != expected[field]:
+            differences.append(field)
+
+    if list(cpu.v) != expected["v"]:
+        differences.append("v")
+
+    for address, values in sorted(expected["memory"].items()):
+        if bytes(cpu.memory[address:address + len(values)]) != values:
+            differences.append("memory[{0:03X}]".format(address))
+
+    if "gfx" in expected and bytes(cpu.gfx) != expected["gfx"]:
+        differences.append("gfx")
+
+    return differences
+
+def to_json(workload):
+    """
+
+    Describe a workload's cycle count and expected state as JSON
+
+    @param workload the Workload
+    @returns the JSON text
+
+    """
+    expected = dict(workload.expected)
+    expected["memory"] = {"{0:03X}".format(address): values.hex() for address, values in expected["memory"].items()}
+    if "gfx" in expected:
+        expected["gfx"] = expected["gfx"].hex()
+
+    return json.dumps({"name": workload.name, "cycles": workload.cycles, "expected": expected}, indent=2, sort_keys=True)
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.synthetic output [inner] [outer]"
+
+def main(argv):
+    """
+
+    Driver for the generator, which writes a ROM and a JSON description of
+    its expected final state for every workload
+
+    @param argv the argument values
+
+    """
+    if len(argv) < REQUIRED_ARGS:
+        exit(usage(argv[0]))
+
+    inner = int(argv[2]) if len(argv) > 2 else DEFAULT_INNER
+    outer = int(argv[3]) if len(argv) > 3 else DEFAULT_OUTER
+
+    for name, generate in sorted(WORKLOADS.items()):
+        workload = generate(inner, outer)
+        path = os.path.join(argv[1], name)
+
+        with open(path + ".ch8", "wb") as f:
+            f.write(workload.rom)
+        with open(path + ".json", "w") as f:
+            f.write(to_json(workload))
+
+        print("{0:<10} {1:>6} bytes {2:>10} cycles".format(name, len(workload.rom), workload.cycles))
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,253 @@
+import os
+import select
+import sys
+import termios
+import time
+import tty
+from .cpu import CPU, CYCLES_PER_FRAME, HEIGHT, KEY_MAP, WIDTH
+from .threaded import FRAME_RATE
+
+"""
+
+A terminal frontend for the CHIP-8 emulator, for machines with no display
+
+Two rows of pixels are packed into each character cell using half-block
+glyphs, and only the cells that changed since the previous frame are
+written, using ANSI escape sequences to move the cursor.
+
+"""
+
+# Usage
+REQUIRED_ARGS = 2
+
+# Glyphs indexed by (top pixel << 1) | bottom pixel
+GLYPHS = (" ", "▄", "▀", "█")
+
+# ANSI escape sequences
+CLEAR = "\x1b[2J"
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+MOVE = "\x1b[{0};{1}H"
+BELL = "\a"
+
+# Terminals report key presses but not releases, so a key is held down for
+# this many frames after each press
+KEY_HOLD_FRAMES = 5
+
+# Keypad keys indexed by the character typed
+TERMINAL_KEYS = {chr(key): val for key, val in KEY_MAP.items()}
+
+class TerminalRenderer(object):
+    """
+
+    Draws a framebuffer to an ANSI terminal, rewriting only changed cells
+
+    """
+
+    def __init__(self, stream=None):
+        """
+
+        Create a new TerminalRenderer object
+
+        @param stream the stream to write to, standard output by default
+
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.previous = None
+
+    def render(self, gfx):
+        """
+
+        Draw a frame, writing only the cells that differ from the last frame
+
+        @param gfx the framebuffer to draw
+        @returns the number of cells written
+
+        """
+        out = []
+        if self.previous is None:
+            out.append(CLEAR + HIDE_CURSOR)
+            previous = bytes(len(gfx))
+            changed = range(0, HEIGHT, 2)
+            full = True
+        else:
+            previous = self.previous
+            changed = [y for y in range(0, HEIGHT, 2)
+                       if gfx[y * WIDTH:(y + 2) * WIDTH] != previous[y * WIDTH:(y + 2) * WIDTH]]
+            full = False
+
+        count = 0
+        for y in changed:
+            top = y * WIDTH
+            bottom = top + WIDTH
+            cursor = None
+
+            for x in range(WIDTH):
+                cell = (gfx[top + x] << 1) | gfx[bottom + x]
+                if not full and cell == (previous[top + x] << 1) | previous[bottom + x]:
+                    continue
+
+                # Only move the cursor when the cell is not the next one along
+                if cursor != x:
+                    out.append(MOVE.format((y // 2) + 1, x + 1))
+                out.append(GLYPHS[cell])
+                cursor = x + 1
+                count += 1
+
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+
+        self.previous = bytes(gfx)
+        return count
+
+    def bell(self):
+        """
+
+        Ring the terminal bell, which does not disturb the display
+
+        """
+        self.stream.write(BELL)
+        self.stream.flush()
+
+    def close(self):
+        """
+
+        Move the cursor below the display and show it again
+
+        """
+        self.stream.write(MOVE.format((HEIGHT // 2) + 1, 1) + SHOW_CURSOR + "\n")
+        self.stream.flush()
+
+def read_keys(fd):
+    """
+
+    Read every character waiting on a file descriptor without blocking
+
+    @param fd the file descriptor to read
+    @returns the characters read
+
+    """
+    chars = ""
+    while select.select([fd], [], [], 0)[0]:
+        data = os.read(fd, 64)
+        if not data:
+            break
+        chars += data.decode("ascii", "ignore")
+
+    return chars
+
+def run(cpu, renderer, fd=None, frames=None, metrics=None):
+    """
+
+    Run the emulator, drawing to the terminal once per frame
+
+    @param cpu the CPU to run
+    @param renderer the TerminalRenderer to draw with
+    @param fd an optional file descriptor to read keys from
+    @param frames the number of frames to run, or None to run until ESC
+    @param metrics an optional Metrics to record each frame in
+
+    """
+    held = [0] * len(cpu.keys)
+    frame = 0
+
+    # Sound the beep as the terminal bell, which does not disturb the display
+    cpu.on_beep = lambda cpu: renderer.bell()
+
+    while frames is None or frame < frames:
+        start = time.perf_counter()
+
+        if fd is not None:
+            chars = read_keys(fd)
+            if "\x1b" in chars:
+                break
+
+            for char in chars.lower():
+                if char in TERMINAL_KEYS:
+                    held[TERMINAL_KEYS[char]] = KEY_HOLD_FRAMES
+
+        for key in range(len(held)):
+            cpu.keys[key] = held[key] > 0
+            held[key] = max(held[key] - 1, 0)
+
+        polled = time.perf_counter()
+        cpu.run(CYCLES_PER_FRAME)
+        ran = time.perf_counter()
+
+        if cpu.shouldDraw:
+            renderer.render(cpu.gfx)
+            cpu.shouldDraw = False
+
+        frame += 1
+        delay = (1.0 / FRAME_RATE) - (time.perf_counter() - start)
+
+        if metrics is not None:
+            metrics.timing("events", polled - start)
+            metrics.timing("cpu", ran - polled)
+            metrics.timing("render", time.perf_counter() - ran)
+            metrics.frame(CYCLES_PER_FRAME, delay <= 0)
+
+        if delay > 0:
+            time.sleep(delay)
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return "Usage: python -m chip8.terminal [--metrics=port|path] [--stats=seconds] rom"
+
+def main(argv):
+    """
+
+    Driver for the terminal frontend. Press ESC to quit.
+
+    @param argv the argument values
+
+    """
+    options = [arg for arg in argv[1:] if arg.startswith("--")]
+    args = [arg for arg in argv if not arg.startswith("--")]
+
+    if len(args) < REQUIRED_ARGS:
+        exit(usage(argv[0]))
+
+    cpu = CPU()
+    cpu.load_rom(args[1])
+    renderer = TerminalRenderer()
+
+    # Optionally serve live metrics and write a periodic stats line
+    metrics = None
+    server = None
+    for option in options:
+        if option.startswith("--metrics="):
+            from .metrics import Metrics, MetricsServer
+            metrics = metrics or Metrics()
+            server = MetricsServer(metrics, option.partition("=")[2])
+        elif option.startswith("--stats="):
+            from .metrics import Metrics
+            metrics = metrics or Metrics()
+            metrics.log_interval = float(option.partition("=")[2])
+
+    # Put the terminal into cbreak mode so keys arrive as they are typed
+    fd = sys.stdin.fileno() if sys.stdin.isatty() else None
+    attributes = None
+    if fd is not None:
+        attributes = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+
+    try:
+        run(cpu, renderer, fd, metrics=metrics)
+    finally:
+        renderer.close()
+        if attributes is not None:
+            termios.tcsetattr(fd, termios.TCSADRAIN, attributes)
+        if server is not None:
+            server.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
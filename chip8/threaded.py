@@ -0,0 +1,171 @@
+import threading
+from time import perf_counter, sleep
+from .cpu import CYCLES_PER_FRAME
+
+"""
+
+Threaded emulation for the CHIP-8 virtual machine
+
+The CPU runs on a worker thread at a steady frame rate and publishes each
+completed frame into a triple-buffered framebuffer. The main thread only
+polls input and presents the latest frame, so slow presentation never
+stalls emulation.
+
+"""
+
+# Timing
+FRAME_RATE = 60
+
+class FrameBuffer(object):
+    """
+
+    A triple-buffered framebuffer shared between a producer that publishes
+    frames and a consumer that presents them. The producer never waits for
+    the consumer, and the consumer always sees a complete frame.
+
+    """
+
+    def __init__(self, size, count=3):
+        """
+
+        Create a new FrameBuffer object
+
+        @param size the number of pixels in a frame
+        @param count the number of buffers, at least 3
+
+        """
+        if count < 3:
+            raise ValueError("a FrameBuffer needs at least 3 buffers")
+
+        self.buffers = [bytearray(size) for _ in range(count)]
+        self.lock = threading.Lock()
+        self.latest = None
+        self.presenting = None
+        self.frame = 0
+
+    def publish(self, gfx):
+        """
+
+        Copy a completed frame into a free buffer and make it the latest
+
+        @param gfx the pixels of the frame
+
+        """
+        with self.lock:
+            index = next(i for i in range(len(self.buffers)) if i not in (self.latest, self.presenting))
+
+        # Neither the latest nor the presented buffer is ever written, so the
+        # copy can happen outside of the lock
+        self.buffers[index][:] = gfx
+
+        with self.lock:
+            self.latest = index
+            self.frame += 1
+
+    def acquire(self):
+        """
+
+        Take the latest frame for presentation. It will not be overwritten
+        until release() is called.
+
+        @returns a (frame number, pixels) pair, or None if nothing has been
+                 published yet
+
+        """
+        with self.lock:
+            if self.latest is None:
+                return None
+
+            self.presenting = self.latest
+            return self.frame, self.buffers[self.presenting]
+
+    def release(self):
+        """
+
+        Finish presenting the frame taken by acquire()
+
+        """
+        with self.lock:
+            self.presenting = None
+
+class EmulationThread(threading.Thread):
+    """
+
+    A thread that runs a CPU at a fixed number of cycles per frame and
+    publishes every frame that was drawn to a FrameBuffer
+
+    """
+
+    def __init__(self, cpu, framebuffer, cycles_per_frame=CYCLES_PER_FRAME, frame_rate=FRAME_RATE, on_frame=None,
+                 metrics=None):
+        """
+
+        Create a new EmulationThread object
+
+        @param cpu the CPU to run
+        @param framebuffer the FrameBuffer to publish frames to
+        @param cycles_per_frame the number of cycles run each frame
+        @param frame_rate the number of frames run each second, or None to
+                          run as fast as possible
+        @param on_frame an optional function called with the CPU after
+                        every frame
+        @param metrics an optional Metrics to record each frame in
+
+        """
+        threading.Thread.__init__(self, name="chip8-emulation")
+        self.daemon = True
+
+        self.cpu = cpu
+        self.framebuffer = framebuffer
+        self.cycles_per_frame = cycles_per_frame
+        self.frame_rate = frame_rate
+        self.on_frame = on_frame
+        self.metrics = metrics
+        self.stopped = threading.Event()
+        self.error = None
+
+    def run(self):
+        """
+
+        Emulate frames until stop() is called
+
+        """
+        cpu = self.cpu
+        deadline = perf_counter()
+
+        try:
+            while not self.stopped.is_set():
+                start = perf_counter()
+                cpu.run(self.cycles_per_frame)
+
+                if cpu.shouldDraw:
+                    self.framebuffer.publish(cpu.gfx)
+                    cpu.shouldDraw = False
+
+                if self.on_frame is not None:
+                    self.on_frame(cpu)
+
+                # Sleep until the next frame is due, without trying to catch
+                # up if we have fallen more than a frame behind
+                late = False
+                if self.frame_rate is not None:
+                    deadline = max(deadline + 1.0 / self.frame_rate, perf_counter() - 1.0 / self.frame_rate)
+                    delay = deadline - perf_counter()
+                    late = delay <= 0
+
+                if self.metrics is not None:
+                    self.metrics.timing("cpu", perf_counter() - start)
+                    self.metrics.frame(self.cycles_per_frame, late)
+
+                if self.frame_rate is not None and not late:
+                    sleep(max(deadline - perf_counter(), 0))
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        """
+
+        Ask the thread to finish after the current frame
+
+        """
+        self.stopped.set()
@@ -0,0 +1,448 @@
+import glob
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+from .cpu import CPU, REGISTERS
+
+"""
+
+Compact binary execution traces for the CHIP-8 virtual machine
+
+While a TraceWriter is attached to CPU.tracer, a fixed-width record of the
+cycle, program counter, opcode, index register and changed register is
+written for every instruction into a preallocated memory-mapped file. A
+ring trace keeps the most recent records in a single file, and a segmented
+trace starts a new file whenever one fills up. A TraceReader searches a
+trace through the same mapping, a chunk at a time, so a trace never has to
+be loaded whole.
+
+File layout:
+
+    header    MAGIC, record size, capacity, first record, count, ring flag
+    records   capacity fixed-width records
+
+"""
+
+# Usage
+REQUIRED_ARGS = 4
+
+# File format
+MAGIC = b"C8TRC1"
+HEADER = struct.Struct("<6sHQQQB")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<QHHHBB")
+
+# The register recorded for instructions that did not change one
+NO_REGISTER = 0xFF
+
+# Trace parameters
+DEFAULT_CAPACITY = 1 << 20
+SYNC_INTERVAL = 4096
+CHUNK_RECORDS = 4096
+
+TraceRecord = namedtuple("TraceRecord", ["cycle", "pc", "opcode", "i", "register", "value"])
+
+def changed_register(before, after):
+    """
+
+    Find the register changed by an instruction. When an instruction changes
+    both VX and the VF flag, VX is reported.
+
+    @param before the registers before the instruction
+    @param after the registers after the instruction
+    @returns a (register, value) pair, with NO_REGISTER if none changed
+
+    """
+    if before == after:
+        return NO_REGISTER, 0
+
+    for x in range(REGISTERS - 1):
+        if before[x] != after[x]:
+            return x, after[x]
+
+    return REGISTERS - 1, after[REGISTERS - 1]
+
+def segment_path(path, segment):
+    """
+
+    Build the path of a file in a segmented trace
+
+    @param path the path of the trace
+    @param segment the number of the segment
+    @returns the path of the segment's file
+
+    """
+    return "{0}.{1:04d}".format(path, segment)
+
+class TraceWriter(object):
+    """
+
+    Writes an execution trace to a memory-mapped file
+
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, ring=True):
+        """
+
+        Create a new trace, preallocating its file
+
+        @param path the path of the trace
+        @param capacity the number of records held by each file
+        @param ring True to overwrite the oldest records when the file is
+                    full, or False to start a new segment file instead
+
+        """
+        self.path = path
+        self.capacity = capacity
+        self.ring = ring
+        self.count = 0
+        self.segment = 0
+        self.base = 0
+        self.file = None
+        self.mm = None
+
+        self.open(path if ring else segment_path(path, 0))
+
+    def open(self, path):
+        """
+
+        Preallocate and map a trace file
+
+        @param path the path of the file
+
+        """
+        self.file = open(path, "w+b")
+        self.file.truncate(HEADER_SIZE + self.capacity * RECORD.size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self.sync()
+
+    def sync(self):
+        """
+
+        Record the number of records written in the header. This is done
+        every SYNC_INTERVAL records rather than every record, so a trace
+        that was never closed may be missing its most recent records.
+
+        """
+        HEADER.pack_into(self.mm, 0, MAGIC, RECORD.size, self.capacity, self.base,
+                         self.count - self.base, 1 if self.ring else 0)
+
+    def record(self, cycle, pc, opcode, i, before, after):
+        """
+
+        Append the record of an executed instruction
+
+        @param cycle the cycle the instruction was executed in
+        @param pc the address of the instruction
+        @param opcode the instruction
+        @param i the index register after the instruction
+        @param before the registers before the instruction
+        @param after the registers after the instruction
+
+        """
+        slot = self.count - self.base
+        if slot >= self.capacity:
+            if self.ring:
+                slot %= self.capacity
+            else:
+                self.next_segment()
+                slot = 0
+
+        register, value = changed_register(before, after)
+        RECORD.pack_into(self.mm, HEADER_SIZE + slot * RECORD.size,
+                         cycle, pc & 0xFFFF, opcode, i & 0xFFFF, register, value & 0xFF)
+
+        self.count += 1
+        if self.count % SYNC_INTERVAL == 0:
+            self.sync()
+
+    def next_segment(self):
+        """
+
+        Close the current segment file and start the next one
+
+        """
+        self.sync()
+        self.mm.close()
+        self.file.close()
+
+        self.segment += 1
+        self.base = self.count
+        self.open(segment_path(self.path, self.segment))
+
+    def attach(self, cpu):
+        """
+
+        Start tracing every instruction a CPU executes
+
+        @param cpu the CPU to trace
+
+        """
+        cpu.tracer = self
+
+    def close(self):
+        """
+
+        Write the final record count and unmap the file
+
+        """
+        if self.mm is not None:
+            self.sync()
+            self.mm.flush()
+            self.mm.close()
+            self.file.close()
+            self.mm = None
+
+class TraceSegment(object):
+    """
+
+    A single mapped file of a trace
+
+    """
+
+    def __init__(self, path):
+        """
+
+        Map a trace file for reading
+
+        @param path the path of the file
+
+        """
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, size, self.capacity, self.base, count, ring = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or size != RECORD.size:
+            self.close()
+            raise ValueError("{0} is not a CHIP-8 trace".format(path))
+
+        # A ring that has wrapped holds only its most recent records, and the
+        # oldest of them is in the slot after the newest
+        self.length = min(count, self.capacity)
+        self.first = (count - self.length) % self.capacity if ring else 0
+
+    def ranges(self, start, stop):
+        """
+
+        Find the slots holding a run of records
+
+        @param start the position of the first record in this file
+        @param stop the position after the last record in this file
+        @returns a list of (first slot, last slot + 1) pairs, in order
+
+        """
+        first = self.first + start
+        last = self.first + stop
+        if last <= self.capacity:
+            return [(first, last)]
+        if first >= self.capacity:
+            return [(first - self.capacity, last - self.capacity)]
+
+        return [(first, self.capacity), (0, last - self.capacity)]
+
+    def close(self):
+        """
+
+        Unmap the file
+
+        """
+        self.mm.close()
+        self.file.close()
+
+class TraceReader(object):
+    """
+
+    Reads and searches an execution trace without loading it into memory
+
+    """
+
+    def __init__(self, path):
+        """
+
+        Open a trace written by TraceWriter
+
+        @param path the path the trace was written to
+
+        """
+        paths = [path] if os.path.exists(path) else sorted(glob.glob(glob.escape(path) + ".[0-9][0-9][0-9][0-9]"))
+        if not paths:
+            raise IOError("no trace found at {0}".format(path))
+
+        self.segments = [TraceSegment(segment) for segment in paths]
+
+    def __len__(self):
+        """
+
+        Count the records held in every file of the trace
+
+        @returns the number of records
+
+        """
+        return sum(segment.length for segment in self.segments)
+
+    def __getitem__(self, position):
+        """
+
+        Read a single record
+
+        @param position the position of the record, oldest first
+        @returns the TraceRecord
+
+        """
+        if position < 0:
+            position += len(self)
+
+        for segment in self.segments:
+            if 0 <= position < segment.length:
+                slot = segment.ranges(position, position + 1)[0][0]
+                return TraceRecord(*RECORD.unpack_from(segment.mm, HEADER_SIZE + slot * RECORD.size))
+            position -= segment.length
+
+        raise IndexError("trace position out of range")
+
+    def records(self, start=0, stop=None):
+        """
+
+        Read a run of records, a chunk at a time
+
+        @param start the position of the first record
+        @param stop the position after the last record, or None for the end
+        @returns a generator of (position, TraceRecord) pairs
+
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        offset = 0
+
+        for segment in self.segments:
+            first = max(start - offset, 0)
+            last = min(stop - offset, segment.length)
+            position = offset + first
+            offset += segment.length
+            if first >= last:
+                continue
+
+            # Each chunk is copied out of the map, so no view of it is held
+            # while suspended and the reader can be closed at any time
+            for low, high in segment.ranges(first, last):
+                for chunk in range(low, high, CHUNK_RECORDS):
+                    end = min(chunk + CHUNK_RECORDS, high)
+                    data = segment.mm[HEADER_SIZE + chunk * RECORD.size:HEADER_SIZE + end * RECORD.size]
+                    for fields in RECORD.iter_unpack(data):
+                        yield position, TraceRecord(*fields)
+                        position += 1
+
+    def search(self, pc=None, opcode=None, mask=0xFFFF, register=None, value=None, start=0, stop=None):
+        """
+
+        Find the records matching every given condition
+
+        @param pc the address of the instruction
+        @param opcode the instruction, compared under the mask
+        @param mask the bits of the opcode to compare, so 0xF000 with an
+                    opcode of 0xD000 finds every draw
+        @param register the register changed by the instruction
+        @param value the value the changed register was set to
+        @param start the position to search from
+        @param stop the position to search up to, or None for the end
+        @returns a generator of (position, TraceRecord) pairs
+
+        """
+        if opcode is not None:
+            opcode &= mask
+
+        for position, record in self.records(start, stop):
+            if pc is not None and record.pc != pc:
+                continue
+            if opcode is not None and record.opcode & mask != opcode:
+                continue
+            if register is not None and record.register != register:
+                continue
+            if value is not None and (record.register == NO_REGISTER or record.value != value):
+                continue
+
+            yield position, record
+
+    def close(self):
+        """
+
+        Unmap every file of the trace
+
+        """
+        for segment in self.segments:
+            segment.close()
+
+def format_record(position, record):
+    """
+
+    Describe a trace record on a single line
+
+    @param position the position of the record
+    @param record the TraceRecord
+    @returns the description
+
+    """
+    line = "{0:>10} cycle {1:>10} {2:03X}: {3:04X} I={4:03X}".format(
+        position, record.cycle, record.pc, record.opcode, record.i)
+    if record.register != NO_REGISTER:
+        line += " V{0:X}={1:02X}".format(record.register, record.value)
+
+    return line
+
+def usage(program):
+    """
+
+    Create a message describing how to invoke the program
+
+    @param program name of the program being run
+    @returns a string containing the usage message
+
+    """
+    return ("Usage: python -m chip8.trace record rom cycles trace\n"
+            "       python -m chip8.trace find trace [pc=ADDR] [opcode=OP[/MASK]] [register=X] [value=NN]")
+
+def main(argv):
+    """
+
+    Driver for recording and searching traces. Numbers are hexadecimal.
+
+    @param argv the argument values
+
+    """
+    if len(argv) < 3 or argv[1] not in ("record", "find"):
+        exit(usage(argv[0]))
+
+    if argv[1] == "record":
+        if len(argv) < REQUIRED_ARGS + 1:
+            exit(usage(argv[0]))
+
+        cpu = CPU()
+        cpu.load_rom(argv[2])
+        writer = TraceWriter(argv[4])
+        writer.attach(cpu)
+        try:
+            cpu.run(int(argv[3]))
+        finally:
+            writer.close()
+        return
+
+    conditions = {}
+    for arg in argv[3:]:
+        name, _, number = arg.partition("=")
+        if name == "opcode" and "/" in number:
+            number, _, mask = number.partition("/")
+            conditions["mask"] = int(mask, 16)
+        if name not in ("pc", "opcode", "register", "value"):
+            exit(usage(argv[0]))
+        conditions[name] = int(number, 16)
+
+    reader = TraceReader(argv[2])
+    try:
+        for position, record in reader.search(**conditions):
+            print(format_record(position, record))
+    finally:
+        reader.close()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,337 @@
+import random
+from .cpu import CPU, CYCLES_PER_FRAME
+from .statehash import StateHasher
+
+"""
+
+Lockstep differential verification between CHIP-8 execution engines
+
+A reference CPU and a candidate engine are run side by side on the same
+ROM and inputs. Their machine state is compared every stride cycles, and
+the first divergent cycle is reported along with a diff of the state.
+
+The state is captured only at checkpoints, at most CHECKPOINT_INTERVAL
+cycles apart. When the engines disagree, both are returned to the last
+checkpoint and replayed to the last comparison they agreed on, then
+stepped one cycle at a time. Comparing by hash uses a StateHasher on each
+engine, so only the pages written since the last comparison are rehashed.
+
+"""
+
+# Comparison modes
+COMPARE_STATE = "state"
+COMPARE_HASH = "hash"
+
+# Strides
+EVERY_INSTRUCTION = 1
+EVERY_FRAME = CYCLES_PER_FRAME
+
+# The most cycles run between checkpoints
+CHECKPOINT_INTERVAL = 4096
+
+# The machine state compared between engines
+SCALAR_FIELDS = ("pc", "i", "sp", "delay", "sound")
+ARRAY_FIELDS = ("v", "stack", "memory", "gfx")
+
+def snapshot(cpu):
+    """
+
+    Capture the full machine state of a CPU
+
+    @param cpu the CPU to capture
+    @returns a dictionary mapping each state field to its value
+
+    """
+    state = {}
+    for field in SCALAR_FIELDS:
+        state[field] = getattr(cpu, field)
+
+    for field in ARRAY_FIELDS:
+        state[field] = tuple(getattr(cpu, field))
+
+    # The keys held and the keys an FX0A is waiting on are not compared, but
+    # are needed to resume from the snapshot
+    state["keys"] = tuple(cpu.keys)
+    state["key_wait"] = None if cpu.key_wait is None else tuple(cpu.key_wait)
+
+    return state
+
+def restore(cpu, state):
+    """
+
+    Overwrite the machine state of a CPU with a captured snapshot
+
+    @param cpu the CPU to overwrite
+    @param state a snapshot taken by snapshot()
+
+    """
+    for field in SCALAR_FIELDS:
+        setattr(cpu, field, state[field])
+
+    # Memory and the framebuffer may be shared with forks of the CPU
+    cpu.unshare_memory()
+    cpu.unshare_gfx()
+    for field in ARRAY_FIELDS:
+        getattr(cpu, field)[:] = state[field]
+
+    cpu.keys[:] = state["keys"]
+    cpu.key_wait = None if state["key_wait"] is None else list(state["key_wait"])
+
+    if cpu.hasher is not None:
+        cpu.hasher.invalidate()
+
+def diff_states(expected, actual):
+    """
+
+    Compare two snapshots field by field
+
+    @param expected the snapshot of the reference engine
+    @param actual the snapshot of the candidate engine
+    @returns a list of (field, index, expected, actual) tuples where index
+             is None for scalar fields
+
+    """
+    diffs = []
+    for field in SCALAR_FIELDS:
+        if expected[field] != actual[field]:
+            diffs.append((field, None, expected[field], actual[field]))
+
+    for field in ARRAY_FIELDS:
+        for index, (a, b) in enumerate(zip(expected[field], actual[field])):
+            if a != b:
+                diffs.append((field, index, a, b))
+
+    return diffs
+
+class Divergence(object):
+    """
+
+    A record of the first cycle at which two engines disagree
+
+    """
+
+    def __init__(self, cycle, diffs):
+        """
+
+        Create a new Divergence object
+
+        @param cycle the number of cycles executed when the states differed
+        @param diffs the differences as returned by diff_states()
+
+        """
+        self.cycle = cycle
+        self.diffs = diffs
+
+    def __str__(self):
+        """
+
+        Construct a string describing the divergence
+
+        @returns a string listing every differing field
+
+        """
+        lines = ["Divergence after cycle {0}".format(self.cycle)]
+        for field, index, expected, actual in self.diffs:
+            if index is None:
+                name = field
+            else:
+                name = "{0}[{1}]".format(field, hex(index))
+
+            lines.append("  {0}: expected {1}, got {2}".format(name, hex(expected), hex(actual)))
+
+        return "\n".join(lines)
+
+class LockstepVerifier(object):
+    """
+
+    Runs a reference CPU and a candidate engine side by side, comparing their
+    state at a configurable stride. The candidate may be any object exposing
+    the same state attributes and copy-on-write methods as CPU along with a
+    run(cycles) method. Comparing by hash also requires it to report its
+    writes to memory and the framebuffer to its hasher, as CPU does.
+
+    """
+
+    def __init__(self, candidate, reference=None, stride=EVERY_INSTRUCTION, compare=COMPARE_STATE):
+        """
+
+        Create a new LockstepVerifier object
+
+        @param candidate the engine under test
+        @param reference the reference engine, a fresh CPU by default
+        @param stride the number of cycles between comparisons
+        @param compare either COMPARE_STATE or COMPARE_HASH
+
+        """
+        if stride < 1:
+            raise ValueError("stride must be at least 1")
+
+        if compare not in (COMPARE_STATE, COMPARE_HASH):
+            raise ValueError("unknown comparison mode: {0}".format(compare))
+
+        self.candidate = candidate
+        self.reference = reference if reference is not None else CPU()
+        self.stride = stride
+        self.compare = compare
+        self.cycle = 0
+
+        if compare == COMPARE_HASH:
+            for engine in (self.reference, self.candidate):
+                if engine.hasher is None:
+                    StateHasher(engine)
+
+    def load_rom(self, path):
+        """
+
+        Load the same ROM into both engines
+
+        @param path the path to the ROM to be read
+
+        """
+        self.reference.load_rom(path)
+        self.candidate.load_rom(path)
+
+    def run(self, cycles, inputs=None):
+        """
+
+        Run both engines until they diverge or the cycle budget is spent
+
+        @param cycles the number of cycles to run
+        @param inputs an optional dictionary mapping a cycle number to the
+                      16 key states applied before that cycle executes
+        @returns a Divergence object, or None if the engines agreed
+
+        """
+        inputs = inputs or {}
+        end = self.cycle + cycles
+        checkpoint = self._checkpoint()
+
+        while self.cycle < end:
+            if self.cycle - checkpoint[0] >= CHECKPOINT_INTERVAL:
+                checkpoint = self._checkpoint()
+
+            agreed = self.cycle
+            count = self._next_chunk(end, inputs)
+            self._step(count, inputs)
+            if not self._agrees():
+                # Replay from the checkpoint to the last agreement, then one
+                # cycle at a time to find the first divergent cycle
+                self._rewind(checkpoint)
+                self._replay(agreed, inputs)
+                return self._bisect(count, inputs)
+
+        return None
+
+    def _checkpoint(self):
+        """
+
+        Capture the state of both engines and the random number generator
+
+        @returns a (cycle, reference, candidate, random state) tuple
+
+        """
+        return (self.cycle, snapshot(self.reference), snapshot(self.candidate), random.getstate())
+
+    def _next_chunk(self, end, inputs):
+        """
+
+        Determine how many cycles can run before the next comparison
+
+        @param end the cycle at which the run finishes
+        @param inputs the scheduled key states
+        @returns the number of cycles in the next chunk
+
+        """
+        count = min(self.stride, end - self.cycle)
+
+        # Stop short of any scheduled input so that it is applied exactly
+        for cycle in inputs:
+            if self.cycle < cycle < self.cycle + count:
+                count = cycle - self.cycle
+
+        return count
+
+    def _step(self, count, inputs):
+        """
+
+        Run both engines for a number of cycles, giving them identical inputs
+        and an identical random number sequence
+
+        @param count the number of cycles to run
+        @param inputs the scheduled key states
+
+        """
+        keys = inputs.get(self.cycle)
+        if keys is not None:
+            self.reference.keys[:] = keys
+            self.candidate.keys[:] = keys
+
+        rng = random.getstate()
+        self.reference.run(count)
+        after = random.getstate()
+
+        random.setstate(rng)
+        self.candidate.run(count)
+        random.setstate(after)
+
+        self.cycle += count
+
+    def _agrees(self):
+        """
+
+        Compare the engines using the configured comparison mode
+
+        @returns True if the engines are in the same state
+
+        """
+        if self.compare == COMPARE_HASH:
+            return self.reference.hasher.digest() == self.candidate.hasher.digest()
+
+        return snapshot(self.reference) == snapshot(self.candidate)
+
+    def _rewind(self, checkpoint):
+        """
+
+        Return both engines to a previously captured checkpoint
+
+        @param checkpoint the checkpoint to return to
+
+        """
+        cycle, reference, candidate, rng = checkpoint
+        restore(self.reference, reference)
+        restore(self.candidate, candidate)
+        random.setstate(rng)
+        self.cycle = cycle
+
+    def _replay(self, end, inputs):
+        """
+
+        Run both engines to a cycle without comparing them
+
+        @param end the cycle to stop at
+        @param inputs the scheduled key states
+
+        """
+        while self.cycle < end:
+            self._step(self._next_chunk(end, inputs), inputs)
+
+    def _bisect(self, count, inputs):
+        """
+
+        Step both engines one cycle at a time until their states differ
+
+        @param count the maximum number of cycles to step
+        @param inputs the scheduled key states
+        @returns a Divergence object describing the first difference
+
+        """
+        for _ in range(count):
+            self._step(1, inputs)
+
+            expected = snapshot(self.reference)
+            actual = snapshot(self.candidate)
+            if expected != actual:
+                return Divergence(self.cycle, diff_states(expected, actual))
+
+        # The engines only disagree on state not captured by a snapshot
+        return Divergence(self.cycle, [])
@@ -11,14 +11,70 @@ http://devernay.free.fr/hacks/chip8/C8TECH10.HTM
 
 """
 
+import csv
+import json
 import os
 import sys
-import struct
+import numpy as np
+from collections import namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from chip8.cfg import SKIPS, ControlFlowGraph
+from chip8.isa import DECODER, GROUPS, INSTRUCTIONS, disassemble, operands
 
 # Constants
 REQUIRED_ARGS = 2
+LABELLED = ("1NNN", "2NNN", "ANNN")
+BRANCHES = ("1NNN", "2NNN")
 MAX_LENGTH = 4096 - 512
 PROGRAM_START = 512
+UNKNOWN = -1
+
+# A disassembled instruction, or a byte of data: its address, its bytes,
+# its mnemonic, its operand fields, the address it may branch to, its
+# assembly text and the label at its address
+Record = namedtuple("Record", ["address", "raw", "mnemonic", "operands", "target", "text", "label"])
+
+# The columns written by CSVWriter
+COLUMNS = ("rom", "address", "raw", "mnemonic", "operands", "target", "text", "label")
+
+def classification_tables():
+    """
+
+    Build the tables that classify opcodes without branching. An opcode is
+    classified by looking up its most significant nibble, shifted left by
+    eight, combined with the opcode bits that select within the nibble's
+    group.
+
+    @returns a (key masks, classes) pair of arrays, where the key masks are
+             indexed by nibble and the classes hold the index of each
+             instruction in INSTRUCTIONS, or UNKNOWN
+
+    """
+    key_masks = np.zeros(16, dtype=np.uint16)
+    classes = np.full(16 << 8, UNKNOWN, dtype=np.int16)
+    indices = dict((entry, index) for index, entry in enumerate(INSTRUCTIONS))
+
+    for top, entry in DECODER["opcodes"].items():
+        classes[top >> 4] = indices[entry]
+
+    for top, (table, key_mask, _) in GROUPS.items():
+        key_masks[top >> 12] = key_mask
+        for key, entry in DECODER[table].items():
+            classes[(top >> 4) | key] = indices[entry]
+
+    return key_masks, classes
+
+KEY_MASKS, CLASSES = classification_tables()
+
+# The text of each opcode seen so far, shared by every disassembly: the
+# opcode's bytes followed by its instruction
+TEXT = {}
+
+# The address that starts the line of each instruction
+ADDRESSES = np.array(["{0:X} ".format(address)
+                      for address in range(PROGRAM_START, PROGRAM_START + MAX_LENGTH, 2)], dtype=object)
 
 class C8Disassembler(object):
     """
@@ -30,6 +86,8 @@ class C8Disassembler(object):
 
     """
 
+    # Instances hold only these attributes, so they need no __dict__
+    __slots__ = ("program", "size")
 
     def __init__(self, rom):
         """
@@ -40,66 +98,8 @@ class C8Disassembler(object):
 
         """
 
-        self.program = [0 for x in range(MAX_LENGTH)]
-        self.size = os.stat(rom).st_size
-
-        # Opcode table: 'K' denotes an opcode with multiple matches
-        self.opcodes = {
-            0x0000 : self._0KKK,
-            0x1000 : self._1NNN,
-            0x2000 : self._2NNN,
-            0x3000 : self._3XNN,
-            0x4000 : self._4XNN,
-            0x5000 : self._5XY0,
-            0x6000 : self._6XNN,
-            0x7000 : self._7XNN,
-            0x8000 : self._8XYK,
-            0x9000 : self._9XY0,
-            0xA000 : self._ANNN,
-            0xB000 : self._BNNN,
-            0xC000 : self._CXNN,
-            0xD000 : self._DXYN,
-            0xE000 : self._EXKK,
-            0xF000 : self._FXKK
-        }
-
-        # Subroutine table
-        self.subroutine = {
-            0x0000 : self._00E0, 
-            0x000E : self._00EE
-        }
-
-        # Arthimetic table
-        self.arthimetic = {
-            0x0000 : self._8XY0,
-            0x0001 : self._8XY1,
-            0x0002 : self._8XY2,
-            0x0003 : self._8XY3,
-            0x0004 : self._8XY4, 
-            0x0005 : self._8XY5,
-            0x0006 : self._8XY6,
-            0x0007 : self._8XY7,
-            0x000E : self._8XYE
-        }
-
-        # Skip keys table
-        self.skip_keys = {
-            0x000E : self._EX9E,
-            0x0001 : self._EXA1
-        }
-
-        # Misc table
-        self.misc = {
-            0x0007 : self._FX07,
-            0x000A : self._FX0A,
-            0x0015 : self._FX15,
-            0x0018 : self._FX18,
-            0x001E : self._FX1E,
-            0x0029 : self._FX29,
-            0x0033 : self._FX33,
-            0x0055 : self._FX55,
-            0x0065 : self._FX65
-        }
+        self.program = bytearray(MAX_LENGTH)
+        self.size = 0
 
         self.load_rom(rom)
 
@@ -113,13 +113,14 @@ class C8Disassembler(object):
 
         """
 
-        # Read the file into main memory byte-by-byte
         with open(path, "rb") as f:
-            b = f.read(1)
-            while b:
-                self.program[offset] = struct.unpack("B", b)[0]
-                offset += 1
-                b = f.read(1)
+            data = f.read()
+
+        if offset + len(data) > MAX_LENGTH:
+            raise IndexError("the rom does not fit in memory")
+
+        self.program[offset:offset + len(data)] = data
+        self.size = max(self.size, offset + len(data))
 
     def fetch_opcode(self, i):
         """
@@ -141,222 +142,306 @@ class C8Disassembler(object):
         @returns the disassembled instruction in string format
 
         """
-        return self.opcodes[(opcode & 0xF000)](opcode)
+        return disassemble(opcode)
 
-    def disassemble(self):
+    def words(self):
         """
 
-        Transform a CHIP-8 ROM into a human-readable print out
+        Read the program as opcodes, two bytes at a time from its start
+
+        @returns an array holding an opcode for every even address
 
         """
-        for i in range(0, self.size, 2):
-            opcode = self.fetch_opcode(i)
+        end = self.size + (self.size % 2)
+        return np.frombuffer(self.program, dtype=">u2", count=end // 2).astype(np.uint16)
+
+    def disassemble(self):
+        """
 
-            hi = self.get_hi(opcode)
-            lo = self.get_lo(opcode)
+        Transform a CHIP-8 ROM into a human-readable print out
 
-            # Search for the opcode. Print any illegal instructions found
-            try:
-                trans = self.lookup_opcode(opcode)
-                print("{0:X} {1:02X} {2:02X} {3}".format(i + PROGRAM_START, hi, lo, trans))
-            except KeyError:
-                print("{0:X} {1:02X} {2:02X} UNKNOWN".format(i + PROGRAM_START, hi, lo, opcode))
+        """
+        sys.stdout.write("".join(line + "\n" for line in self.lines()))
 
-    # Helpful getter fuctions
-    def get_hi(self, opcode):
+    def lines(self):
         """
 
-        Get the high byte of the opcode
+        Disassemble the program into lines of its address, its bytes and its
+        instruction. Each distinct opcode is only formatted once.
 
-        @param opcode the opcode
-        @returns the high byte of the opcode
+        @returns a list of lines
 
         """
-        return (opcode & 0xFF00) >> 8
+        words = self.words()
+        opcodes, inverse = np.unique(words, return_inverse=True)
 
-    def get_lo(self, opcode):
+        missing = [opcode for opcode in opcodes.tolist() if opcode not in TEXT]
+        if missing:
+            for opcode, index in zip(missing, classify(np.array(missing, dtype=np.uint16)).tolist()):
+                trans = "UNKNOWN" if index == UNKNOWN else disassemble(opcode)
+                TEXT[opcode] = "{0:02X} {1:02X} {2}".format(self.get_hi(opcode), self.get_lo(opcode), trans)
+
+        texts = np.array([TEXT[opcode] for opcode in opcodes.tolist()], dtype=object)
+        return (ADDRESSES[:len(words)] + texts[inverse]).tolist()
+
+    def graph(self):
         """
 
-        Get the low byte of the opcode
+        Analyse the control flow of the program from its start
 
-        @param opcode the opcode
-        @returns the low byte of the opcode
+        @returns the ControlFlowGraph
 
         """
-        return (opcode & 0x00FF)
+        return ControlFlowGraph(self.program[:self.size], PROGRAM_START)
 
-    def get_nnn(self, opcode):
+    def record(self, address, opcode, entry, labels=None):
         """
 
-        Get the lowest 12 bits (nnn or addr) of an instruction
+        Describe an instruction
 
+        @param address the address of the instruction
         @param opcode the opcode
-        @returns lowest 12 bits of an instruction representing a memory address
+        @param entry the Instruction, or None if the opcode is not one
+        @param labels an optional dictionary of addresses to labels, which
+                      the instruction refers to its targets by
+        @returns the Record
 
         """
-        return opcode & 0x0FFF
+        raw = bytes((self.get_hi(opcode), self.get_lo(opcode)))
+        label = labels.get(address) if labels is not None else None
+        if entry is None:
+            return Record(address, raw, "UNKNOWN", {}, None, "UNKNOWN", label)
+
+        fields = operands(entry, opcode)
+        target = None
+        if entry.name in BRANCHES:
+            target = fields["nnn"]
+        elif entry.name in SKIPS:
+            target = address + 4
+
+        if labels is not None and entry.name in LABELLED and fields["nnn"] in labels:
+            text = entry.template.replace("{nnn:X}", labels[fields["nnn"]])
+        else:
+            text = entry.template.format(**fields)
+
+        return Record(address, raw, entry.mnemonic, fields, target, text, label)
+
+    def records(self):
+        """
+
+        Disassemble the program two bytes at a time from its start, one
+        record at a time
+
+        @returns a generator of Records
 
-    def get_nn(self, opcode):
         """
+        words = self.words()
+        for offset, (opcode, index) in enumerate(zip(words.tolist(), classify(words).tolist())):
+            entry = None if index == UNKNOWN else INSTRUCTIONS[index]
+            yield self.record(PROGRAM_START + (2 * offset), opcode, entry)
 
-        Get the lowest 8 bits (nn or byte) of an instruction
-        
-        @param opcode the opcode
-        @returns the lowest 8 bits of an instruction
-        
+    def recursive_records(self, graph=None):
         """
-        return opcode & 0x00FF
 
-    def get_n(self, opcode):
+        Disassemble only the instructions reachable from the start of the
+        program, one record at a time, describing every other byte as data.
+        Branch targets, subroutines and data are labelled, and instructions
+        refer to them by label.
+
+        @param graph the ControlFlowGraph of the program, analysed if not given
+        @returns a generator of Records
+
+        """
+        graph = self.graph() if graph is None else graph
+
+        address = PROGRAM_START
+        while address < PROGRAM_START + self.size:
+            if address in graph.instructions:
+                opcode, entry = graph.instructions[address]
+                yield self.record(address, opcode, entry, graph.labels)
+                address += 2
+            else:
+                byte = self.program[address - PROGRAM_START]
+                yield Record(address, bytes((byte,)), "DB", {"byte": byte}, None,
+                             "DB {0:02X}".format(byte), graph.labels.get(address))
+                address += 1
+
+    def recursive_lines(self, graph=None):
         """
 
-        Get the lowest 4 bits (n or nibble) of an instruction
+        Disassemble only the instructions reachable from the start of the
+        program into lines, with a line for each label
 
-        @param opcode the opcode
-        @returns lowest 4 bits of an instruction
+        @param graph the ControlFlowGraph of the program, analysed if not given
+        @returns a list of lines
 
         """
-        return opcode & 0x000F
+        return [line for record in self.recursive_records(graph) for line in format_record(record)]
 
-    def get_x(self, opcode):
+    # Helpful getter fuctions
+    def get_hi(self, opcode):
         """
 
-        Get the lower 4 bits of the high byte (x) of an instruction
-        
+        Get the high byte of the opcode
+
         @param opcode the opcode
-        @returns the lower 4 bits of the high byte of an instruction
+        @returns the high byte of the opcode
 
         """
-        return (opcode & 0x0F00) >> 8
+        return (opcode & 0xFF00) >> 8
 
-    def get_y(self, opcode):
+    def get_lo(self, opcode):
         """
 
-        Get the higher 4 bits of the low byte (y) of an instruction
-        
+        Get the low byte of the opcode
+
         @param opcode the opcode
-        @returns the higher 4 bits of the low byte of an instruction
-        
+        @returns the low byte of the opcode
+
         """
-        return (opcode & 0x00F0) >> 4
+        return (opcode & 0x00FF)
 
-    # Opcode functions for disassembly    
-    def _0KKK(self, opcode):
-        return self.subroutine[self.get_n(opcode)]()
+def classify(words):
+    """
 
-    def _00E0(self):
-        return "CLS"
+    Find the instruction of every opcode at once
 
-    def _00EE(self):
-        return "RET"
+    @param words an array of opcodes
+    @returns an array of the index of each opcode's instruction in
+             INSTRUCTIONS, or UNKNOWN
 
-    def _1NNN(self, opcode):
-        return "JP {0:X}".format(self.get_nnn(opcode))
+    """
+    words = np.asarray(words, dtype=np.uint16)
+    nibbles = words >> 12
+    return CLASSES[(nibbles << 8) | (words & KEY_MASKS[nibbles])]
 
-    def _2NNN(self, opcode):
-        return "CALL {0:X}".format(self.get_nnn(opcode))
-    
-    def _3XNN(self, opcode):
-        return "SE V{0:X}, {1:X}".format(self.get_x(opcode), self.get_nn(opcode))
+def format_record(record):
+    """
 
-    def _4XNN(self, opcode):
-        return "SNE V{0:X}, {1:X}".format(self.get_x(opcode), self.get_nn(opcode))
+    Write a record as lines of assembly
 
-    def _5XY0(self, opcode):
-        return "SE V{0:X}, V{1:X}".format(self.get_x(opcode), self.get_y(opcode))
+    @param record the Record
+    @returns a list of the label line, if there is a label, and the line of
+             the address, bytes and text of the record
 
-    def _6XNN(self, opcode):
-        return "LD V{0:X}, {1:X}".format(self.get_x(opcode), self.get_nn(opcode))
+    """
+    line = "{0:X} {1:<5} {2}".format(record.address, " ".join("{0:02X}".format(byte) for byte in record.raw),
+                                     record.text)
+    if record.label is None:
+        return [line]
 
-    def _7XNN(self, opcode):
-        return "ADD V{0:X}, {1:X}".format(self.get_x(opcode), self.get_nn(opcode))
+    return ["{0}:".format(record.label), line]
 
-    def _8XYK(self, opcode):
-        return self.arthimetic[self.get_n(opcode)](self.get_x(opcode), self.get_y(opcode))
+class TextWriter(object):
+    """
 
-    def _8XY0(self, x, y):
-        return "LD V{0:X}, V{1:X}".format(x, y)
+    Streams records as assembly text
 
-    def _8XY1(self, x, y):
-        return "OR V{0:X}, V{1:X}".format(x, y)
+    """
 
-    def _8XY2(self, x, y):
-        return "AND V{0:X}, V{1:X}".format(x, y)
+    def __init__(self, stream):
+        """
 
-    def _8XY3(self, x, y):
-        return "XOR V{0:X}, V{1:X}".format(x, y)
+        Create a new TextWriter object
 
-    def _8XY4(self, x, y):
-        return "ADD V{0:X}, V{1:X}".format(x, y)
+        @param stream the stream to write to
 
-    def _8XY5(self, x, y):
-        return "SUB V{0:X}, V{1:X}".format(x, y)
+        """
+        self.stream = stream
 
-    def _8XY6(self, x, y):
-        return "SHR V{0:X} {{, V{1:X}}}".format(x, y)
+    def header(self, rom):
+        """
 
-    def _8XY7(self, x, y):
-        return "SUBN V{0:X}, V{1:X}".format(x, y)
+        Write the heading of a ROM's listing
 
-    def _8XYE(self, x, y):
-        return "SHL V{0:X}, {{, V{1:X}}}".format(x, y)
+        @param rom the path of the ROM
 
-    def _9XY0(self, opcode):
-        return "SNE V{0:X}, V{1:X}".format(self.get_x(opcode), self.get_y(opcode))
+        """
+        self.stream.write("Input: {0}\n\n".format(rom))
 
-    def _ANNN(self, opcode):
-        return "LD I, {0:X}".format(self.get_nnn(opcode))
+    def write(self, rom, records):
+        """
 
-    def _BNNN(self, opcode):
-        return "JP V0, {0:X}".format(self.get_nnn(opcode))
+        Write the listing of a ROM
 
-    def _CXNN(self, opcode):
-        return "RND V{0:X}, {1:X}".format(self.get_x(opcode), self.get_nn(opcode))
+        @param rom the path of the ROM
+        @param records an iterable of the ROM's Records
 
-    def _DXYN(self, opcode):
-        x = self.get_x(opcode)
-        y = self.get_y(opcode)
-        n = self.get_n(opcode)
-        return "DRW V{0:X}, V{1:X}, {2:X}".format(x, y, n)
+        """
+        self.header(rom)
+        for record in records:
+            self.stream.write("".join(line + "\n" for line in format_record(record)))
 
-    def _EXKK(self, opcode):
-        return self.skip_keys[self.get_n(opcode)](self.get_x(opcode))
+class JSONLinesWriter(object):
+    """
 
-    def _EX9E(self, x):
-        return "SKP V{0:X}".format(x)
+    Streams records as JSON objects, one per line
 
-    def _EXA1(self, x):
-        return "SKNP V{0:X}".format(x)
+    """
+
+    def __init__(self, stream):
+        """
+
+        Create a new JSONLinesWriter object
+
+        @param stream the stream to write to
+
+        """
+        self.stream = stream
 
-    def _FXKK(self, opcode):
-        return self.misc[self.get_nn(opcode)](self.get_x(opcode))
+    def write(self, rom, records):
+        """
 
-    def _FX07(self, x):
-        return "LD V{0:X}, DT".format(x)
+        Write the records of a ROM
 
-    def _FX0A(self, x):
-        return "LD V{0:X}, K".format(x)
+        @param rom the path of the ROM
+        @param records an iterable of the ROM's Records
 
-    def _FX15(self, x):
-        return "LD DT, V{0:X}".format(x)
+        """
+        for record in records:
+            self.stream.write(json.dumps({"rom": rom, "address": record.address, "raw": record.raw.hex().upper(),
+                                          "mnemonic": record.mnemonic, "operands": record.operands,
+                                          "target": record.target, "text": record.text,
+                                          "label": record.label}) + "\n")
 
-    def _FX18(self, x):
-        return "LD ST, V{0:X}".format(x)
+class CSVWriter(object):
+    """
 
-    def _FX1E(self, x):
-        return "ADD I, V{0:X}".format(x)
+    Streams records as rows of comma-separated values, under a header row
 
-    def _FX29(self, x):
-        return "LD F, V{0:X}".format(x)
+    """
 
-    def _FX33(self, x):
-        return "LD B, V{0:X}".format(x)
+    def __init__(self, stream):
+        """
 
-    def _FX55(self, x):
-        return "LD [I], V{0:X}".format(x)
+        Create a new CSVWriter object and write the header row
 
-    def _FX65(self, x):
-        return "LD V{0:X}, [I]".format(x)
+        @param stream the stream to write to
+
+        """
+        self.writer = csv.writer(stream, lineterminator="\n")
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rom, records):
+        """
+
+        Write the records of a ROM
+
+        @param rom the path of the ROM
+        @param records an iterable of the ROM's Records
+
+        """
+        for record in records:
+            fields = " ".join("{0}={1}".format(name, value) for name, value in record.operands.items())
+            self.writer.writerow((rom, record.address, record.raw.hex().upper(), record.mnemonic, fields,
+                                  "" if record.target is None else record.target, record.text,
+                                  "" if record.label is None else record.label))
+
+# Output formats
+WRITERS = {
+    "text" : TextWriter,
+    "jsonl" : JSONLinesWriter,
+    "csv" : CSVWriter}
 
 def usage(name):
     """
@@ -367,7 +452,9 @@ def usage(name):
     @returns a string containing the usage message
 
     """
-    return "Usage: python {0} rom".format(name)
+    return ("Usage: python {0} [--recursive] [--format=text|jsonl|csv] [--output=path] "
+            "[--cfg=path] [--symbols=path] rom [rom ...]\n"
+            "--cfg and --symbols take a single rom").format(name)
 
 
 def main(argv):
@@ -375,23 +462,60 @@ def main(argv):
 
     Driver function for the disassembler. 
 
-    Requires a single argument that specifies the CHIP-8 ROM to be disassembled.
+    Requires at least one argument that specifies a CHIP-8 ROM to be
+    disassembled. --recursive follows the control flow from the start of
+    each ROM instead of sweeping it linearly. --format chooses between
+    assembly text, JSON Lines and CSV, which are streamed to standard
+    output or to the --output file. --cfg writes the control flow graph as
+    JSON and --symbols writes its subroutines for chip8.profiler.
 
     @param argv the arguments for invoking the program
 
     """
-    
+    options = [arg for arg in argv[1:] if arg.startswith("--")]
+    args = [arg for arg in argv if not arg.startswith("--")]
+    exports = [option for option in options if option.startswith(("--cfg=", "--symbols="))]
+    recursive = "--recursive" in options
+
+    output = None
+    format = "text"
+    for option in options:
+        if option.startswith("--format="):
+            format = option.partition("=")[2]
+        elif option.startswith("--output="):
+            output = option.partition("=")[2]
+
     # Check that there are enough arguments to run the emulator
-    if len(argv) < REQUIRED_ARGS:
+    if len(args) < REQUIRED_ARGS or (exports and len(args) > REQUIRED_ARGS) or format not in WRITERS:
         exit(usage(argv[0]))
 
-    rom = argv[1]
-
-    print("CHIP-8 Disassembler v.1.0")
-    print("Input: {0}\n".format(rom))
-
-    disassembler = C8Disassembler(rom)
-    disassembler.disassemble()
+    stream = sys.stdout if output is None else open(output, "w", newline="")
+    try:
+        writer = WRITERS[format](stream)
+        if format == "text":
+            stream.write("CHIP-8 Disassembler v.1.0\n")
+
+        for rom in args[1:]:
+            disassembler = C8Disassembler(rom)
+
+            graph = None
+            if recursive or exports:
+                graph = disassembler.graph()
+                for option in exports:
+                    with open(option.partition("=")[2], "w") as f:
+                        f.write(graph.to_json() if option.startswith("--cfg=") else graph.symbols())
+
+            if recursive:
+                writer.write(rom, disassembler.recursive_records(graph))
+            elif format == "text":
+                # The linear listing is formatted for the whole ROM at once
+                writer.header(rom)
+                stream.write("".join(line + "\n" for line in disassembler.lines()))
+            else:
+                writer.write(rom, disassembler.records())
+    finally:
+        if output is not None:
+            stream.close()
 
 if __name__ == "__main__":
-    sys.exit(main(sys.argv))
\ No newline at end of file
+    sys.exit(main(sys.argv))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.aio import Session
+
+
+"""
+
+Unit tests for the asyncio runtime
+
+"""
+
+MAZE = os.path.join(os.path.dirname(__file__), "..", "roms", "MAZE")
+
+# Wait for a key and store it in V0, then loop forever
+WAIT_KEY = b"\xF0\x0A\x12\x02"
+
+class TestSession(unittest.TestCase):
+    """
+
+    A class for testing asyncio sessions
+
+    """
+
+    def test_frames(self):
+        session = Session.from_rom(MAZE, frame_rate=None)
+        asyncio.run(session.run(5))
+        self.assertEqual(5, session.frame)
+
+    def test_input(self):
+        session = Session(frame_rate=None)
+        session.cpu.load_bytes(WAIT_KEY, 0x200)
+
+        async def play():
+            await session.run(3)
+            self.assertEqual(0x200, session.cpu.pc)
+
+            session.press(0x7)
+            await session.run(1)
+            self.assertEqual(0x7, session.cpu.v[0])
+
+            session.release(0x7)
+            await session.run(1)
+            self.assertFalse(session.cpu.keys[0x7])
+
+        asyncio.run(play())
+
+    def test_tap(self):
+        session = Session(frame_rate=None)
+        session.cpu.load_bytes(WAIT_KEY, 0x200)
+
+        async def play():
+            await session.run(1)
+
+            # A press and release queued in the same frame still press the key
+            session.press(0x7)
+            session.release(0x7)
+            session.press(0xA)
+            await session.run(1)
+            self.assertEqual(0x7, session.cpu.v[0])
+            self.assertTrue(session.cpu.keys[0xA])
+
+            await session.run(1)
+            self.assertFalse(session.cpu.keys[0x7])
+            self.assertEqual([], session.pending)
+
+        asyncio.run(play())
+
+    def test_subscribers(self):
+        session = Session.from_rom(MAZE, frame_rate=None)
+
+        async def watch():
+            queue = session.subscribe()
+            await session.run(20)
+
+            # Only the latest frame is kept for a slow subscriber
+            self.assertEqual(1, queue.qsize())
+            frame, gfx = queue.get_nowait()
+            self.assertEqual(bytes(session.cpu.gfx), gfx)
+
+            session.unsubscribe(queue)
+            self.assertEqual([], session.subscribers)
+
+        asyncio.run(watch())
+
+    def test_many_sessions(self):
+        sessions = [Session.from_rom(MAZE) for _ in range(200)]
+
+        async def run_all():
+            await asyncio.gather(*[session.run(3) for session in sessions])
+
+        asyncio.run(run_all())
+        self.assertEqual([3] * 200, [session.frame for session in sessions])
+
+    def test_stop(self):
+        session = Session.from_rom(MAZE, frame_rate=None)
+
+        async def stop_later():
+            task = asyncio.ensure_future(session.run())
+            await asyncio.sleep(0)
+            session.stop()
+            await task
+
+        asyncio.run(stop_later())
+        self.assertTrue(session.frame >= 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
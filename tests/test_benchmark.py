@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.benchmark import (MICROBENCHMARKS, ROM_DIRECTORY, benchmark_opcode, compare,
+                             microbenchmark_rom, report, run_benchmarks)
+from chip8.cpu import CPU
+
+
+"""
+
+Unit tests for the benchmark suite
+
+"""
+
+class TestBenchmark(unittest.TestCase):
+    """
+
+    A class for testing benchmark workloads and baseline comparison
+
+    """
+
+    def test_microbenchmark_rom(self):
+        self.assertEqual(bytes.fromhex("A000" + "D125" * 8 + "1202"), microbenchmark_rom("A000", "D125"))
+
+        # Every loop runs forever without crashing
+        for setup, body, subroutines in MICROBENCHMARKS.values():
+            cpu = CPU()
+            cpu.load_bytes(microbenchmark_rom(setup, body, subroutines), 0x200)
+            cpu.run(200)
+            self.assertTrue(0x200 <= cpu.pc < 0x200 + len(setup) // 2 + 2 * 10 + len(subroutines) // 2)
+
+    def test_benchmark_opcode(self):
+        self.assertTrue(benchmark_opcode("", "7A01", cycles=1000) > 0)
+
+    def test_run(self):
+        results = run_benchmarks([os.path.join(ROM_DIRECTORY, "MAZE")], frames=30, micro=False)
+        maze = results["roms"]["MAZE"]
+
+        self.assertEqual(300, maze["cycles"])
+        for metric in ("ips", "dxyn_us", "render_ms", "startup_ms", "peak_kb"):
+            self.assertTrue(maze[metric] > 0, metric)
+        self.assertIn("MAZE", report(results))
+
+    def test_compare(self):
+        baseline = {"roms": {"MAZE": {"ips": 1000.0, "dxyn_us": 10.0, "cycles": 300}},
+                    "opcodes": {"8XY4": {"ns": 500.0}}}
+        results = {"roms": {"MAZE": {"ips": 800.0, "dxyn_us": 5.0, "cycles": 300}},
+                   "opcodes": {"8XY4": {"ns": 520.0}, "8XY5": {"ns": 1.0}}}
+
+        changes = {metric: (change, regressed) for metric, _, _, change, regressed in compare(baseline, results)}
+        self.assertEqual(set(["roms.MAZE.ips", "roms.MAZE.dxyn_us", "opcodes.8XY4.ns"]), set(changes))
+        self.assertEqual((-20.0, True), changes["roms.MAZE.ips"])
+        self.assertEqual((50.0, False), changes["roms.MAZE.dxyn_us"])
+        self.assertAlmostEqual(-4.0, changes["opcodes.8XY4.ns"][0])
+        self.assertFalse(changes["opcodes.8XY4.ns"][1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.append("..")
+
+from chip8.capture import (FrameReader, FrameWriter, lzw_encode, pack_frame, unpack_frame,
+                           write_gif, write_png)
+
+
+"""
+
+Unit tests for streaming frame capture
+
+"""
+
+def random_frame(rng):
+    """
+
+    Build a framebuffer with a few random pixels set
+
+    """
+    return bytes(1 if rng.random() < 0.1 else 0 for _ in range(64 * 32))
+
+class TestCapture(unittest.TestCase):
+    """
+
+    A class for testing frame capture and export
+
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "capture.c8v")
+        rng = random.Random(0)
+        self.frames = [random_frame(rng) for _ in range(40)]
+
+    def test_pack(self):
+        frame = self.frames[0]
+        self.assertEqual(frame, unpack_frame(pack_frame(frame)))
+        self.assertEqual(1 << 2047, pack_frame(b"\x01" + bytes(2047)))
+
+    def test_round_trip(self):
+        writer = FrameWriter(self.path, chunk_frames=16)
+        for frame in self.frames:
+            writer.capture(frame)
+        writer.close()
+
+        reader = FrameReader(self.path)
+        self.assertEqual(40, len(reader))
+        self.assertEqual(self.frames[33], reader.frame(33))
+        self.assertEqual(self.frames[0], reader.frame(0))
+        self.assertEqual(self.frames[10:20], list(reader.frames_between(10, 20)))
+        with self.assertRaises(IndexError):
+            reader.frame(40)
+        reader.close()
+
+    def test_every(self):
+        writer = FrameWriter(self.path, every=3)
+        for frame in self.frames:
+            writer.capture(frame)
+        writer.close()
+
+        reader = FrameReader(self.path)
+        self.assertEqual(14, len(reader))
+        self.assertEqual(self.frames[39], reader.frame(13))
+        reader.close()
+
+    def test_unclosed(self):
+        # Only whole chunks survive a writer that never closes the file
+        writer = FrameWriter(self.path, chunk_frames=16)
+        for frame in self.frames:
+            writer.capture(frame)
+        writer.file.close()
+
+        reader = FrameReader(self.path)
+        self.assertEqual(32, len(reader))
+        self.assertEqual(self.frames[31], reader.frame(31))
+        reader.close()
+
+    def test_compression(self):
+        writer = FrameWriter(self.path)
+        for _ in range(1000):
+            writer.capture(self.frames[0])
+        writer.close()
+        self.assertTrue(os.path.getsize(self.path) < 4096)
+
+    def test_png(self):
+        path = os.path.join(self.directory, "frame.png")
+        write_png(path, self.frames[0], scale=2)
+        with open(path, "rb") as f:
+            self.assertEqual(b"\x89PNG\r\n\x1a\n", f.read(8))
+
+    def test_gif(self):
+        path = os.path.join(self.directory, "frames.gif")
+        write_gif(path, self.frames[:3])
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertTrue(data.startswith(b"GIF89a"))
+        self.assertTrue(data.endswith(b"\x3b"))
+
+    def test_lzw(self):
+        # Clear code, then 0 and 1 at 3 bits, then the end code
+        self.assertEqual(bytes([0x44, 0x0A]), lzw_encode(b"\x00\x01")[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
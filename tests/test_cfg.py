@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append("..")
+
+from chip8.cfg import CALL, FALLTHROUGH, JUMP, RETURN, SKIP, Block, ControlFlowGraph
+from chip8.profiler import load_symbols
+
+
+"""
+
+Unit tests for recursive-descent control flow analysis
+
+"""
+
+# 200: LD I, 218; CALL 210; SE V0, 1; JP 20D; CLS; JP 20A; (unreached byte)
+# 20D: JP 20D; (unreached byte)
+# 210: DRW V0, V0, 5; RET; (four unreached bytes)
+# 218: a five byte sprite
+PROGRAM = (b"\xA2\x18\x22\x10\x30\x01\x12\x0D\x00\xE0\x12\x0A\x00"
+           b"\x12\x0D\x00"
+           b"\xD0\x15\x00\xEE\x00\x00\x00\x00"
+           b"\xF0\x90\xF0\x90\xF0")
+
+class TestControlFlowGraph(unittest.TestCase):
+    """
+
+    A class for testing control flow graphs and their exports
+
+    """
+
+    def setUp(self):
+        self.graph = ControlFlowGraph(PROGRAM)
+
+    def test_instructions(self):
+        self.assertEqual([0x200, 0x202, 0x204, 0x206, 0x208, 0x20A, 0x20D, 0x210, 0x212],
+                         sorted(self.graph.instructions))
+        self.assertEqual(set(), self.graph.external)
+
+    def test_blocks(self):
+        self.assertEqual({
+            0x200: Block(0x200, 0x204, (0x200, 0x202), (0x210, 0x204), CALL),
+            0x204: Block(0x204, 0x206, (0x204,), (0x206, 0x208), SKIP),
+            0x206: Block(0x206, 0x208, (0x206,), (0x20D,), JUMP),
+            0x208: Block(0x208, 0x20A, (0x208,), (0x20A,), FALLTHROUGH),
+            0x20A: Block(0x20A, 0x20C, (0x20A,), (0x20A,), JUMP),
+            0x20D: Block(0x20D, 0x20F, (0x20D,), (0x20D,), JUMP),
+            0x210: Block(0x210, 0x214, (0x210, 0x212), (), RETURN)}, self.graph.blocks)
+
+    def test_data(self):
+        # I is set before the call and drawn through inside the subroutine
+        self.assertEqual([(0x218, 5)], self.graph.data)
+        self.assertEqual([(0x210, 0x218, 5)], self.graph.references)
+        self.assertTrue(self.graph.is_data(0x21C))
+        self.assertFalse(self.graph.is_data(0x214))
+
+    def test_labels(self):
+        self.assertEqual({0x200: "start", 0x20A: "L_20A", 0x20D: "L_20D", 0x210: "sub_210",
+                          0x218: "data_218"}, self.graph.labels)
+
+    def test_external(self):
+        graph = ControlFlowGraph(b"\x00\xE0\x13\x00")
+        self.assertEqual({0x300}, graph.external)
+        self.assertEqual((0x300,), graph.blocks[0x200].successors)
+
+    def test_json(self):
+        exported = json.loads(self.graph.to_json())
+        self.assertEqual(0x200, exported["entry"])
+        self.assertEqual([[0x218, 5]], exported["data"])
+        self.assertEqual([0x210], exported["functions"])
+        self.assertEqual("sub_210", exported["labels"]["210"])
+        self.assertEqual(len(self.graph.blocks), len(exported["blocks"]))
+
+    def test_symbols(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".sym", delete=False) as f:
+            f.write(self.graph.symbols())
+        self.addCleanup(os.remove, f.name)
+
+        self.assertEqual({0x210: "sub_210"}, load_symbols(f.name))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+sys.path.append("..")
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+from chip8.chip8 import handle_events
+from chip8.cpu import CPU
+
+
+"""
+
+Unit tests for the pygame driver and the startup of the command line
+
+"""
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MAZE = os.path.join(ROOT, "roms", "MAZE")
+
+# The most time a headless run may take to start, over a bare interpreter
+STARTUP_BUDGET = 0.15
+
+class TestEvents(unittest.TestCase):
+    """
+
+    A class for testing the translation of pygame events to keypad state
+
+    """
+
+    def setUp(self):
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+        pygame.event.clear()
+        self.cpu = CPU()
+
+    def tearDown(self):
+        pygame.display.quit()
+
+    def test_press_and_release(self):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_q))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_v))
+        self.assertEqual((True, True), handle_events(self.cpu))
+        self.assertTrue(self.cpu.keys[0x4])
+        self.assertTrue(self.cpu.keys[0xF])
+
+        pygame.event.post(pygame.event.Event(pygame.KEYUP, key=pygame.K_q))
+        self.assertEqual((True, False), handle_events(self.cpu))
+        self.assertFalse(self.cpu.keys[0x4])
+        self.assertTrue(self.cpu.keys[0xF])
+
+    def test_unmapped_key(self):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_p))
+        self.assertEqual((True, False), handle_events(self.cpu))
+        self.assertFalse(any(self.cpu.keys))
+
+    def test_quit(self):
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        self.assertEqual((False, False), handle_events(self.cpu))
+
+class TestStartup(unittest.TestCase):
+    """
+
+    A class for testing that the command line starts quickly without SDL
+
+    """
+
+    def best_time(self, args, repeats=3):
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.check_call([sys.executable] + args, cwd=ROOT,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        return best
+
+    def test_no_pygame(self):
+        code = ("import sys; from chip8.chip8 import main; "
+                "main(['chip8', '--headless', '--frames=60', {0!r}]); "
+                "sys.exit('pygame' in sys.modules)").format(MAZE)
+        self.assertEqual(0, subprocess.call([sys.executable, "-c", code], cwd=ROOT,
+                                            stdout=subprocess.DEVNULL))
+
+    def test_budget(self):
+        bare = self.best_time(["-c", "pass"])
+        headless = self.best_time(["-m", "chip8", "--headless", "--frames=1", MAZE])
+        self.assertLess(headless - bare, STARTUP_BUDGET)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU, MEMORY
+from chip8.coverage import Coverage, merge_files, unpack
+
+
+"""
+
+Unit tests for the CHIP-8 coverage bitmaps
+
+"""
+
+class TestCoverage(unittest.TestCase):
+    """
+
+    A class for testing per-address coverage
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.cpu.coverage = Coverage()
+
+    def test_execute(self):
+        # LD I, 0x300; LD [I], V2; JP 0x204
+        self.cpu.load_bytes(b"\xA3\x00\xF2\x55\x12\x04", 0x200)
+        self.cpu.run(4)
+
+        self.assertEqual(list(range(0x200, 0x206)), self.cpu.coverage.code())
+        self.assertEqual([0x300, 0x301, 0x302], self.cpu.coverage.data())
+
+    def test_data(self):
+        self.cpu._ANNN(0xA300)
+        self.cpu._FX65(1)
+        self.cpu._ANNN(0xA400)
+        self.cpu._FX33(0)
+        self.cpu._DXYN(0xD003)
+
+        self.assertEqual([0x300, 0x301], [a for a in range(0x300, 0x310) if unpack(self.cpu.coverage.reads)[a]])
+        self.assertEqual([0x400, 0x401, 0x402], self.cpu.coverage.data()[2:5])
+        self.assertEqual(3, sum(unpack(self.cpu.coverage.writes)))
+
+    def test_out_of_range(self):
+        self.cpu.coverage.write(0xFFE, 4)
+        self.assertEqual(2, sum(unpack(self.cpu.coverage.writes)))
+
+    def test_odd_address(self):
+        # An instruction at an odd address sets bits in two bytes
+        self.cpu.coverage.execute(0x207)
+        self.cpu.coverage.execute(0xFFF)
+        self.assertEqual([0x207, 0x208, 0xFFF], self.cpu.coverage.code())
+
+    def test_footprint(self):
+        coverage = self.cpu.coverage
+        self.assertEqual(3 * MEMORY // 8, len(coverage.executed) + len(coverage.reads) + len(coverage.writes))
+
+    def test_bitmap(self):
+        coverage = self.cpu.coverage
+        for addr in (0, 9, 63):
+            coverage.read(addr, 1)
+
+        flags = bytearray(64)
+        flags[0] = flags[9] = flags[63] = 1
+        self.assertEqual(b"\x01\x02\x00\x00\x00\x00\x00\x80", coverage.reads[:8])
+        self.assertEqual(flags, unpack(coverage.reads)[:64])
+
+    def test_merge(self):
+        other = Coverage()
+        self.cpu.coverage.execute(0x200)
+        other.execute(0x300)
+
+        executed = self.cpu.coverage.executed
+        self.cpu.coverage.merge(other)
+        self.assertIs(executed, self.cpu.coverage.executed)
+        self.assertEqual([0x200, 0x201, 0x300, 0x301], self.cpu.coverage.code())
+
+    def test_files(self):
+        other = Coverage()
+        self.cpu.coverage.execute(0x200)
+        other.read(0x400, 1)
+
+        directory = tempfile.mkdtemp()
+        paths = [os.path.join(directory, "a.cov"), os.path.join(directory, "b.cov")]
+        self.cpu.coverage.save(paths[0])
+        other.save(paths[1])
+
+        merged = Coverage.from_bytes(merge_files(paths))
+        self.assertEqual([0x200, 0x201], merged.code())
+        self.assertEqual([0x400], merged.data())
+        self.assertEqual([0x200, 0x201], Coverage.load(paths[0]).code())
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Coverage.from_bytes(b"nonsense")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+import gc
 import sys
+import tracemalloc
 import unittest
 
 sys.path.append("..")
@@ -285,7 +287,42 @@ class TestCPU(unittest.TestCase):
         self.assertEqual(0x202, self.cpu.pc)
 
     def test_FX0A(self):
-        pass
+        # Without a key pressed the instruction waits in place
+        self.cpu._FX0A(0)
+        self.assertEqual(0x200, self.cpu.pc)
+
+        # Pressing a key stores it in v[x] and moves on
+        self.cpu.keys[0xA] = True
+        self.cpu._FX0A(0)
+        self.assertEqual(0xA, self.cpu.v[0])
+        self.assertEqual(0x202, self.cpu.pc)
+
+    def test_FX0A_held(self):
+        # LD V0, K; ADD V1, 1; JP 200
+        self.cpu.load_bytes(bytes([0xF0, 0x0A, 0x71, 0x01, 0x12, 0x00]), 0x200)
+        self.cpu.run(10)
+
+        # Holding a key for many cycles is a single press
+        self.cpu.keys[0x5] = True
+        self.cpu.run(60)
+        self.assertEqual(1, self.cpu.v[1])
+        self.assertEqual(0x5, self.cpu.v[0])
+
+        # It counts again once released and pressed again
+        self.cpu.keys[0x5] = False
+        self.cpu.run(10)
+        self.cpu.keys[0x5] = True
+        self.cpu.run(10)
+        self.assertEqual(2, self.cpu.v[1])
+
+    def test_beep(self):
+        beeps = []
+        self.cpu.on_beep = beeps.append
+
+        # LD V0, 2; LD ST, V0 sounds for two cycles
+        self.cpu.load_bytes(bytes([0x60, 0x02, 0xF0, 0x18, 0x12, 0x04]), 0x200)
+        self.cpu.run(10)
+        self.assertEqual([self.cpu], beeps)
 
     def test_FX15(self):
         self.cpu._6XNN(0x6010)
@@ -352,6 +389,84 @@ class TestCPU(unittest.TestCase):
         self.assertEqual(3, self.cpu.i)
         self.assertEqual(0x202, self.cpu.pc)
 
+class TestFootprint(unittest.TestCase):
+    """
+
+    A class for testing the memory held by each CPU and its opcode tables
+
+    """
+
+    # The most bytes a new CPU and a fork of one may allocate
+    CPU_BUDGET = 8192
+    FORK_BUDGET = 1024
+
+    def allocated(self, create, count=1000):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            objects = [create() for _ in range(count)]
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        return size / len(objects)
+
+    def test_cpu(self):
+        self.assertLess(self.allocated(CPU), self.CPU_BUDGET)
+
+    def test_fork(self):
+        cpu = CPU()
+        self.assertLess(self.allocated(cpu.fork), self.FORK_BUDGET)
+
+    def test_no_cycles(self):
+        # Without reference cycles a CPU is freed as soon as it is dropped
+        gc.collect()
+        gc.disable()
+        tracemalloc.start()
+        try:
+            for _ in range(100):
+                CPU().fork()
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+            gc.enable()
+
+        self.assertLess(size, self.CPU_BUDGET)
+
+    def test_shared_tables(self):
+        cpu = CPU()
+        other = CPU()
+        self.assertIs(cpu.opcodes, other.opcodes)
+
+        with self.assertRaises(TypeError):
+            cpu.opcodes[0xD000] = None
+
+    def test_patch(self):
+        cpu = CPU()
+        other = CPU()
+        drawn = []
+
+        draw = cpu.patch("opcodes", 0xD000, lambda cpu, opcode: drawn.append(opcode))
+        self.assertIs(CPU.OPCODES[0xD000], draw)
+        self.assertIs(draw, other.opcodes[0xD000])
+
+        cpu.execute_opcode(0xD125)
+        self.assertEqual([0xD125], drawn)
+
+        # Forks and rebuilt tables do not keep the patch
+        self.assertIs(draw, cpu.fork().opcodes[0xD000])
+        cpu.build_tables()
+        self.assertIs(CPU.OPCODES, cpu.opcodes)
+
+    def test_subclass(self):
+        class Cleared(CPU):
+            def _00E0(self):
+                self.v[0] = 1
+
+        cpu = Cleared()
+        cpu.execute_opcode(0x00E0)
+        self.assertEqual(1, cpu.v[0])
+        self.assertIs(CPU._00E0, CPU.SUBROUTINE[0x0000])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
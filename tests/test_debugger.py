@@ -0,0 +1,152 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.debugger import Debugger
+
+
+"""
+
+Unit tests for the CHIP-8 debugger
+
+"""
+
+PROGRAM = bytes([
+    0x60, 0x05,   # 200: LD V0, 0x05
+    0x22, 0x0A,   # 202: CALL 0x20A
+    0x70, 0x01,   # 204: ADD V0, 0x01
+    0x12, 0x04,   # 206: JP 0x204
+    0x00, 0x00,
+    0xA3, 0x00,   # 20A: LD I, 0x300
+    0xF0, 0x55,   # 20C: LD [I], V0
+    0xD0, 0x11,   # 20E: DRW V0, V1, 1
+    0x00, 0xEE])  # 210: RET
+
+class RunCPU(CPU):
+    """
+
+    A CPU that records the number of cycles of each call to run()
+
+    """
+
+    def run(self, cycles):
+        self.runs.append(cycles)
+        CPU.run(self, cycles)
+
+class TestDebugger(unittest.TestCase):
+    """
+
+    A class for testing breakpoints, watchpoints and stepping
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.cpu.load_bytes(PROGRAM, 0x200)
+        self.debugger = Debugger(self.cpu)
+
+    def test_run(self):
+        self.assertIsNone(self.debugger.run(10))
+        self.assertEqual(10, self.cpu.cycles)
+
+    def test_breakpoint(self):
+        self.debugger.add_breakpoint(0x20E)
+
+        hit = self.debugger.run(100)
+        self.assertEqual(("breakpoint", 0x20E, 4), hit)
+        self.assertEqual(0x20E, self.cpu.pc)
+
+        # Resuming executes the instruction at the breakpoint
+        self.debugger.remove_breakpoint(0x20E)
+        self.debugger.add_breakpoint(0x206)
+        self.assertEqual(("breakpoint", 0x206, 7), self.debugger.run(100))
+
+    def test_breakpoint_fast_path(self):
+        cpu = RunCPU()
+        cpu.runs = []
+        cpu.load_bytes(PROGRAM, 0x200)
+        debugger = Debugger(cpu)
+
+        # Only the entry of the instruction at the breakpoint is wrapped, and
+        # the CPU runs uninterrupted until it is hit
+        debugger.add_breakpoint(0x20E)
+        self.assertEqual([0xD000], [key for key, entry in cpu.opcodes.items() if entry is not CPU.OPCODES[key]])
+        self.assertEqual(("breakpoint", 0x20E, 4), debugger.run(100))
+        self.assertEqual([100], cpu.runs)
+
+        debugger.remove_breakpoint(0x20E)
+        self.assertEqual(dict(CPU.OPCODES), dict(cpu.opcodes))
+
+    def test_breakpoint_after_run(self):
+        # A run that ends just before a breakpoint reports it
+        self.debugger.add_breakpoint(0x20E)
+        self.assertEqual(("breakpoint", 0x20E, 4), self.debugger.run(4))
+        self.assertIsNone(self.debugger.run(1))
+        self.assertEqual(0x210, self.cpu.pc)
+
+    def test_conditional_breakpoint(self):
+        self.debugger.add_breakpoint(0x206, lambda cpu: cpu.v[0] == 9)
+        hit = self.debugger.run(100)
+        self.assertEqual("breakpoint", hit.kind)
+        self.assertEqual(9, self.cpu.v[0])
+
+        self.debugger.remove_breakpoint(0x206)
+        self.debugger.add_condition(lambda cpu: cpu.v[0] == 12)
+        self.assertEqual(("condition", 0x206, hit.cycle + 6), self.debugger.run(100))
+
+    def test_memory_watch(self):
+        self.debugger.watch_memory(0x300)
+        self.assertEqual(("write", 0x300, 3), self.debugger.run(100))
+        self.assertEqual(0x20E, self.cpu.pc)
+
+    def test_read_watch(self):
+        self.debugger.watch_memory(0x300, read=True, write=False)
+        self.assertEqual(("read", 0x300, 4), self.debugger.run(100))
+
+    def test_gfx_watch(self):
+        # The sprite drawn at (5, 0) is 0b00000101, so it only sets pixels
+        # 10 and 12 of its row
+        self.debugger.watch_gfx(6, 0, 4, 2)
+        self.debugger.watch_gfx(12, 0, 1, 1)
+        self.assertEqual(("gfx", 12, 4), self.debugger.run(100))
+
+    def test_unpatched(self):
+        draw = self.cpu.opcodes[0xD000]
+        self.debugger.watch_gfx(0, 0, 64, 32)
+        self.assertNotEqual(draw, self.cpu.opcodes[0xD000])
+
+        self.debugger.detach()
+        self.assertEqual(draw, self.cpu.opcodes[0xD000])
+        self.assertEqual({}, self.debugger.patched)
+
+    def test_step(self):
+        self.debugger.step()
+        self.assertEqual(0x202, self.cpu.pc)
+
+        self.debugger.step()
+        self.assertEqual(0x20A, self.cpu.pc)
+        self.assertEqual(1, self.cpu.sp)
+
+    def test_step_over(self):
+        self.debugger.step()
+        self.assertIsNone(self.debugger.step_over())
+        self.assertEqual(0x204, self.cpu.pc)
+        self.assertEqual(0, self.cpu.sp)
+        self.assertEqual(6, self.cpu.cycles)
+
+        # Breakpoints inside the call still stop it
+        self.cpu.pc = 0x202
+        self.debugger.add_breakpoint(0x20E)
+        self.assertEqual("breakpoint", self.debugger.step_over().kind)
+
+    def test_step_out(self):
+        self.assertRaises(ValueError, self.debugger.step_out)
+
+        self.debugger.run(3)
+        self.assertIsNone(self.debugger.step_out())
+        self.assertEqual(0x204, self.cpu.pc)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append("..")
+
+from chip8 import isa
+from disassembler.disassembler import (C8Disassembler, CSVWriter, JSONLinesWriter, MAX_LENGTH,
+                                       PROGRAM_START, UNKNOWN, TextWriter, classify, format_record)
+
+
+"""
+
+Unit tests for the disassembler
+
+"""
+
+ROMS = os.path.join(os.path.dirname(__file__), "..", "roms")
+
+class TestDisassembler(unittest.TestCase):
+    """
+
+    A class for testing vectorized disassembly against decoding one opcode at
+    a time
+
+    """
+
+    def write_rom(self, data):
+        f = tempfile.NamedTemporaryFile(delete=False)
+        f.write(data)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_classify(self):
+        opcodes = np.arange(0x10000, dtype=np.uint32).astype(np.uint16)
+        classes = classify(opcodes).tolist()
+
+        for opcode, index in enumerate(classes):
+            try:
+                expected = isa.INSTRUCTIONS.index(isa.decode(opcode))
+            except KeyError:
+                expected = UNKNOWN
+            self.assertEqual(expected, index)
+
+    def test_lines(self):
+        for name in sorted(os.listdir(ROMS)):
+            disassembler = C8Disassembler(os.path.join(ROMS, name))
+
+            expected = []
+            for i in range(0, disassembler.size, 2):
+                opcode = disassembler.fetch_opcode(i)
+                try:
+                    trans = disassembler.lookup_opcode(opcode)
+                except KeyError:
+                    trans = "UNKNOWN"
+                expected.append("{0:X} {1:02X} {2:02X} {3}".format(
+                    i + PROGRAM_START, disassembler.get_hi(opcode), disassembler.get_lo(opcode), trans))
+
+            self.assertEqual(expected, disassembler.lines(), name)
+
+    def test_odd_size(self):
+        disassembler = C8Disassembler(self.write_rom(b"\x00\xE0\xA2"))
+        self.assertEqual(["200 00 E0 CLS", "202 A2 00 LD I, 200"], disassembler.lines())
+
+    def test_recursive_lines(self):
+        # LD I, 208; DRW V0, V1, 2; JP 204; two unreached bytes; a sprite; two
+        # more unreached bytes
+        disassembler = C8Disassembler(self.write_rom(b"\xA2\x08\xD0\x12\x12\x04\x00\x00\xF0\x90\x12\x00"))
+        self.assertEqual(["start:",
+                          "200 A2 08 LD I, data_208",
+                          "202 D0 12 DRW V0, V1, 2",
+                          "L_204:",
+                          "204 12 04 JP L_204",
+                          "206 00    DB 00",
+                          "207 00    DB 00",
+                          "data_208:",
+                          "208 F0    DB F0",
+                          "209 90    DB 90",
+                          "20A 12    DB 12",
+                          "20B 00    DB 00"], disassembler.recursive_lines())
+
+    def test_records(self):
+        for name in sorted(os.listdir(ROMS)):
+            disassembler = C8Disassembler(os.path.join(ROMS, name))
+            lines = [line for record in disassembler.records() for line in format_record(record)]
+            self.assertEqual(disassembler.lines(), lines, name)
+
+    def test_record_fields(self):
+        # JP 206; SE V1, 2; CALL 20A; an unknown opcode
+        disassembler = C8Disassembler(self.write_rom(b"\x12\x06\x31\x02\x22\x0A\xF0\xFF"))
+        records = disassembler.records()
+        self.assertNotIsInstance(records, list)
+
+        jump, skip, call, unknown = records
+        self.assertEqual((0x200, b"\x12\x06", "JP", {"nnn": 0x206}, 0x206, "JP 206", None), jump)
+        self.assertEqual(({"x": 1, "nn": 2}, 0x206), (skip.operands, skip.target))
+        self.assertEqual(("CALL", 0x20A), (call.mnemonic, call.target))
+        self.assertEqual(("UNKNOWN", {}, None), (unknown.mnemonic, unknown.operands, unknown.target))
+
+    def test_recursive_records(self):
+        # LD I, 206; DRW V0, V1, 2; JP 204; a sprite
+        disassembler = C8Disassembler(self.write_rom(b"\xA2\x06\xD0\x12\x12\x04\xF0\x90"))
+        ld, drw, jp, first, second = disassembler.recursive_records()
+        self.assertEqual(("start", "LD I, data_206"), (ld.label, ld.text))
+        self.assertEqual(("L_204", 0x204, "JP L_204"), (jp.label, jp.target, jp.text))
+        self.assertEqual((0x206, b"\xF0", "DB", "data_206"), (first.address, first.raw, first.mnemonic, first.label))
+        self.assertEqual((0x207, "DB 90", None), (second.address, second.text, second.label))
+
+    def test_writers(self):
+        rom = self.write_rom(b"\x00\xE0\xD0\x15")
+        disassembler = C8Disassembler(rom)
+
+        stream = io.StringIO()
+        TextWriter(stream).write(rom, disassembler.records())
+        self.assertEqual("Input: {0}\n\n200 00 E0 CLS\n202 D0 15 DRW V0, V1, 5\n".format(rom), stream.getvalue())
+
+        stream = io.StringIO()
+        JSONLinesWriter(stream).write(rom, disassembler.records())
+        rows = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual({"rom": rom, "address": 0x202, "raw": "D015", "mnemonic": "DRW",
+                          "operands": {"x": 0, "y": 1, "n": 5}, "target": None,
+                          "text": "DRW V0, V1, 5", "label": None}, rows[1])
+
+        stream = io.StringIO()
+        writer = CSVWriter(stream)
+        writer.write(rom, disassembler.records())
+        writer.write(rom, disassembler.records())
+        rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+        self.assertEqual(4, len(rows))
+        self.assertEqual(("514", "D015", "x=0 y=1 n=5", "", "DRW V0, V1, 5"),
+                         (rows[1]["address"], rows[1]["raw"], rows[1]["operands"], rows[1]["target"],
+                          rows[1]["text"]))
+
+    def test_too_large(self):
+        self.assertRaises(IndexError, C8Disassembler, self.write_rom(bytes(MAX_LENGTH + 1)))
+
+if __name__ == "__main__":
+    unittest.main()
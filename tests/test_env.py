@@ -0,0 +1,100 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CYCLES_PER_FRAME
+from chip8.env import Chip8Env, DEFAULT_ACTIONS
+
+
+"""
+
+Unit tests for the reinforcement-learning environment
+
+"""
+
+# Wait for a key, count presses at 0x300 and draw the key's digit
+COUNTER = bytes([
+    0xF0, 0x0A,  # 200: LD V0, K
+    0x71, 0x01,  # 202: ADD V1, 1
+    0xA3, 0x00,  # 204: LD I, 300
+    0xF1, 0x55,  # 206: LD [I], V1
+    0xF0, 0x29,  # 208: LD F, V0
+    0xD2, 0x25,  # 20A: DRW V2, V2, 5
+    0x12, 0x0C,  # 20C: JP 20C
+])
+
+class TestEnv(unittest.TestCase):
+    """
+
+    A class for testing the reinforcement-learning environment
+
+    """
+
+    def setUp(self):
+        self.env = Chip8Env(COUNTER, addresses={"presses": 0x301},
+                            reward=lambda prev, cur: cur["presses"] - prev["presses"],
+                            max_frames=3)
+
+    def test_actions(self):
+        self.assertEqual(17, self.env.action_count)
+        self.assertEqual((), DEFAULT_ACTIONS[0])
+        self.assertEqual((0xF,), DEFAULT_ACTIONS[16])
+
+    def test_reset(self):
+        observation = self.env.reset(seed=0)
+        self.assertEqual((32, 64), observation.shape)
+        self.assertEqual(0, observation.sum())
+
+    def test_step(self):
+        observation = self.env.reset(seed=0)
+
+        # No key pressed: the ROM waits
+        _, reward, done, info = self.env.step(0)
+        self.assertEqual(0, reward)
+        self.assertFalse(done)
+        self.assertEqual(1, info["frame"])
+
+        # Press key 1 to draw the "1" sprite
+        result, reward, done, info = self.env.step(2)
+        self.assertEqual(1, reward)
+        self.assertEqual(1, info["values"]["presses"])
+        self.assertEqual(0x1, self.env.cpu.v[0])
+
+        # The observation is a view of the CPU framebuffer, not a copy
+        self.assertIs(observation, result)
+        self.assertEqual(sum(self.env.cpu.gfx), observation.sum())
+        self.assertTrue(observation.sum() > 0)
+
+        _, _, done, _ = self.env.step(0)
+        self.assertTrue(done)
+
+    def test_fork(self):
+        self.env.reset(seed=0)
+        self.env.step(0)
+        branch = self.env.cpu.fork()
+
+        # The environment's CPU copies the framebuffer it shares with the
+        # branch when it draws, and the observation follows it
+        observation, _, _, _ = self.env.step(2)
+        self.assertEqual(sum(self.env.cpu.gfx), observation.sum())
+        self.assertTrue(observation.sum() > 0)
+        self.assertEqual(0, sum(branch.gfx))
+
+        # A branch that draws first leaves the observation on the CPU's buffer
+        self.env.reset(seed=0)
+        self.env.step(0)
+        branch = self.env.cpu.fork()
+        branch.keys[0x3] = True
+        branch.run(CYCLES_PER_FRAME)
+        observation, _, _, _ = self.env.step(2)
+        self.assertEqual(sum(self.env.cpu.gfx), observation.sum())
+        self.assertNotEqual(sum(branch.gfx), observation.sum())
+
+    def test_step_before_reset(self):
+        with self.assertRaises(RuntimeError):
+            self.env.step(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+
+
+"""
+
+Unit tests for copy-on-write forking of the CHIP-8 CPU
+
+"""
+
+MAZE = os.path.join(os.path.dirname(__file__), "..", "roms", "MAZE")
+
+class TestFork(unittest.TestCase):
+    """
+
+    A class for testing copy-on-write forking
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.cpu.load_rom(MAZE)
+
+    def test_shared(self):
+        child = self.cpu.fork()
+        self.assertIs(self.cpu.memory, child.memory)
+        self.assertIs(self.cpu.gfx, child.gfx)
+        self.assertIsNot(self.cpu.v, child.v)
+        self.assertIsNot(self.cpu.stack, child.stack)
+
+    def test_independent_registers(self):
+        child = self.cpu.fork()
+        child._6XNN(0x6042)
+        self.assertEqual(0x42, child.v[0])
+        self.assertEqual(0x00, self.cpu.v[0])
+        self.assertEqual(0x202, child.pc)
+        self.assertEqual(0x200, self.cpu.pc)
+
+    def test_memory_copy_on_write(self):
+        child = self.cpu.fork()
+        memory = self.cpu.memory
+
+        child._ANNN(0xA300)
+        child._6XNN(0x6007)
+        child._FX55(0)
+
+        self.assertEqual(0x07, child.memory[0x300])
+        self.assertEqual(0x00, self.cpu.memory[0x300])
+        self.assertIsNot(memory, child.memory)
+
+        # The parent is the last owner, so it writes in place
+        self.cpu._FX33(0)
+        self.assertIs(memory, self.cpu.memory)
+
+    def test_discarded_forks(self):
+        memory = self.cpu.memory
+        gfx = self.cpu.gfx
+
+        # Once every fork is discarded the parent is the only owner again
+        for _ in range(10):
+            child = self.cpu.fork()
+            child.fork()
+        del child
+
+        self.assertEqual([1], self.cpu.memory_owners)
+        self.assertEqual([1], self.cpu.gfx_owners)
+        self.cpu._FX33(0)
+        self.cpu._DXYN(0xD005)
+        self.assertIs(memory, self.cpu.memory)
+        self.assertIs(gfx, self.cpu.gfx)
+
+    def test_discarded_writer(self):
+        # A fork that made its own copy no longer counts as an owner
+        child = self.cpu.fork()
+        child._FX33(0)
+        grandchild = self.cpu.fork()
+        del child
+        self.assertEqual([2], self.cpu.memory_owners)
+
+        del grandchild
+        self.assertEqual([1], self.cpu.memory_owners)
+
+    def test_gfx_copy_on_write(self):
+        child = self.cpu.fork()
+        child._DXYN(0xD005)
+
+        self.assertTrue(sum(child.gfx) > 0)
+        self.assertEqual(0, sum(self.cpu.gfx))
+
+    def test_divergent_runs(self):
+        random.seed(1)
+        reference = CPU()
+        reference.load_rom(MAZE)
+        reference.run(500)
+
+        random.seed(1)
+        child = self.cpu.fork()
+        child.run(500)
+
+        # Running the fork leaves the parent at power-on
+        self.assertEqual(0x200, self.cpu.pc)
+        self.assertEqual(0, sum(self.cpu.gfx))
+        self.assertEqual(reference.gfx, child.gfx)
+        self.assertEqual(reference.memory, child.memory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.fuzz import Fuzzer, minimize, mutate, opcode_class, run_rom, MAX_ROM_SIZE
+
+
+"""
+
+Unit tests for the CHIP-8 CPU fuzzer
+
+"""
+
+class TestFuzz(unittest.TestCase):
+    """
+
+    A class for testing the random-ROM fuzzer
+
+    """
+
+    def test_opcode_class(self):
+        self.assertEqual("00E0", opcode_class(0x00E0))
+        self.assertEqual("8XY4", opcode_class(0x8124))
+        self.assertEqual("FX55", opcode_class(0xF355))
+        self.assertEqual("DXYN", opcode_class(0xD125))
+        self.assertEqual("1NNN", opcode_class(0x1234))
+        self.assertEqual("FETCH", opcode_class(None))
+
+    def test_no_crash(self):
+        # Jump to self forever
+        self.assertIsNone(run_rom(b"\x12\x00", 100))
+
+    def test_stack_overflow(self):
+        # Call self until the 16 level stack overflows
+        crash = run_rom(b"\x22\x00", 100)
+        self.assertEqual(16, crash.cycle)
+        self.assertEqual(("2xxx", "IndexError"), crash.bucket[:2])
+        self.assertTrue(crash.site.startswith("_2NNN"))
+
+    def test_unknown_opcode(self):
+        crash = run_rom(b"\xF0\xFF", 100)
+        self.assertEqual(0xF0FF, crash.opcode)
+        self.assertIsInstance(crash.error, KeyError)
+
+    def test_minimize(self):
+        # Pad a crashing instruction with harmless register loads
+        rom = b"\x60\x01" * 8 + b"\x81\x2C" + b"\x61\x02" * 8
+        crash = minimize(run_rom(rom))
+        self.assertEqual(b"\x81\x2C", crash.rom)
+
+    def test_mutate(self):
+        fuzzer = Fuzzer(seed=0)
+        rom = bytes(MAX_ROM_SIZE)
+        for _ in range(50):
+            rom = mutate(rom, fuzzer.rng)
+            self.assertTrue(len(rom) <= MAX_ROM_SIZE)
+
+    def test_fuzzer(self):
+        fuzzer = Fuzzer(seed=0, cycles=200, corpus=[b"\x22\x00"])
+        crashes = fuzzer.run(50)
+        self.assertEqual(50, fuzzer.runs)
+        self.assertLessEqual(sum(count for _, count in crashes.values()), 50)
+        self.assertTrue(len(crashes) > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
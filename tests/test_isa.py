@@ -0,0 +1,67 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8 import isa
+from chip8.cpu import CPU
+
+
+"""
+
+Unit tests for the instruction set specification
+
+"""
+
+class TestISA(unittest.TestCase):
+    """
+
+    A class for testing the instruction set and the tables generated from it
+
+    """
+
+    def test_instruction(self):
+        entry = isa.instruction("DXYN", "DRW V{x:X}, V{y:X}, {n:X}")
+        self.assertEqual(0xD000, entry.pattern)
+        self.assertEqual(0xF000, entry.mask)
+        self.assertEqual(("x", "y", "n"), entry.operands)
+        self.assertEqual("DRW", entry.mnemonic)
+        self.assertEqual("_DXYN", entry.hook)
+
+        entry = isa.instruction("FX1E", "ADD I, V{x:X}")
+        self.assertEqual((0xF01E, 0xF0FF, ("x",)), (entry.pattern, entry.mask, entry.operands))
+        self.assertEqual(("nnn",), isa.instruction("1NNN", "JP {nnn:X}").operands)
+
+    def test_decode(self):
+        for entry in isa.INSTRUCTIONS:
+            self.assertIs(entry, isa.decode(entry.pattern))
+            self.assertIs(entry, isa.decode(entry.pattern | (~entry.mask & 0xFFFF)))
+
+        self.assertRaises(KeyError, isa.decode, 0x00E1)
+        self.assertRaises(KeyError, isa.decode, 0xF0FF)
+
+    def test_disassemble(self):
+        self.assertEqual("CLS", isa.disassemble(0x00E0))
+        self.assertEqual("DRW V1, VA, F", isa.disassemble(0xD1AF))
+        self.assertEqual("LD I, 2EA", isa.disassemble(0xA2EA))
+        self.assertEqual("SHR V3 {, V4}", isa.disassemble(0x8346))
+        self.assertEqual("SHL V3, {, V4}", isa.disassemble(0x834E))
+        self.assertEqual("LD [I], V5", isa.disassemble(0xF555))
+
+    def test_cpu_tables(self):
+        # Every instruction dispatches to the CPU method named by its hook
+        for entry in isa.INSTRUCTIONS:
+            top = entry.pattern & 0xF000
+            if top in isa.GROUPS:
+                table, key_mask, hook = isa.GROUPS[top]
+                self.assertIs(getattr(CPU, hook), CPU.OPCODES[top])
+                self.assertIs(getattr(CPU, entry.hook),
+                              getattr(CPU, table.upper())[entry.pattern & key_mask])
+            else:
+                self.assertIs(getattr(CPU, entry.hook), CPU.OPCODES[top])
+
+        self.assertEqual(len(isa.INSTRUCTIONS), sum(len(getattr(CPU, name))
+                                                    for _, name in isa.TABLES) - len(isa.GROUPS))
+
+if __name__ == "__main__":
+    unittest.main()
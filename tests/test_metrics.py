@@ -0,0 +1,171 @@
+import asyncio
+import http.client
+import io
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append("..")
+
+from chip8.aio import Session
+from chip8.cpu import CPU
+from chip8.metrics import Metrics, MetricsServer
+from chip8.terminal import TerminalRenderer, run
+from chip8.threaded import EmulationThread, FrameBuffer
+
+
+"""
+
+Unit tests for live emulator metrics
+
+"""
+
+MAZE = os.path.join(os.path.dirname(__file__), "..", "roms", "MAZE")
+
+class UnixConnection(http.client.HTTPConnection):
+    """
+
+    An HTTP connection over a Unix socket
+
+    """
+
+    def __init__(self, path):
+        http.client.HTTPConnection.__init__(self, "localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+class TestMetrics(unittest.TestCase):
+    """
+
+    A class for testing metrics counters, exposition and runner integration
+
+    """
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.metrics = Metrics(stream=self.stream)
+
+    def test_counters(self):
+        self.metrics.frame(10)
+        self.metrics.frame(10, late=True)
+        self.metrics.dropped(2)
+        self.metrics.timing("cpu", 0.5)
+
+        text = self.metrics.prometheus()
+        self.assertIn("chip8_instructions_total 20\n", text)
+        self.assertIn("chip8_frames_total 2\n", text)
+        self.assertIn("chip8_late_frames_total 1\n", text)
+        self.assertIn("chip8_dropped_frames_total 2\n", text)
+        self.assertIn('chip8_seconds_total{section="cpu"} 0.500000\n', text)
+        self.assertIn("# TYPE chip8_frames_per_second gauge\n", text)
+
+    def test_log_line(self):
+        self.metrics.log_interval = 0
+        self.metrics.frame(10, late=True)
+
+        line = self.stream.getvalue()
+        self.assertTrue(line.startswith("chip8 stats: "))
+        self.assertIn("1 late 0 dropped", line)
+        self.assertIn(" cpu 0.0%", line)
+
+    def test_input_latency(self):
+        self.metrics.input_latency(0.010)
+        self.metrics.input_latency(0.020)
+        self.assertIn(" input 15.0ms", self.metrics.log_line())
+        self.assertNotIn(" input ", self.metrics.log_line())
+
+        text = self.metrics.prometheus()
+        self.assertIn("chip8_input_latency_seconds_sum 0.030000\n", text)
+        self.assertIn("chip8_input_latency_seconds_count 2\n", text)
+
+    def test_http(self):
+        server = MetricsServer(self.metrics, 0)
+        try:
+            self.metrics.frame(10)
+            connection = http.client.HTTPConnection(*server.address)
+            connection.request("GET", "/metrics")
+            response = connection.getresponse()
+
+            self.assertEqual(200, response.status)
+            self.assertIn(b"chip8_frames_total 1\n", response.read())
+
+            connection.request("GET", "/other")
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(404, response.status)
+            connection.close()
+        finally:
+            server.close()
+
+    def test_unix_socket(self):
+        path = os.path.join(tempfile.mkdtemp(), "metrics.sock")
+        server = MetricsServer(self.metrics, path)
+        try:
+            connection = UnixConnection(path)
+            connection.request("GET", "/metrics")
+            self.assertIn(b"chip8_instructions_total 0\n", connection.getresponse().read())
+            connection.close()
+        finally:
+            server.close()
+
+        self.assertFalse(os.path.exists(path))
+        os.rmdir(os.path.dirname(path))
+
+    def test_unix_socket_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+
+        # A regular file at the path is left alone
+        path = os.path.join(directory, "metrics.txt")
+        with open(path, "w") as f:
+            f.write("keep")
+        self.assertRaises(FileExistsError, MetricsServer, self.metrics, path)
+        with open(path) as f:
+            self.assertEqual("keep", f.read())
+        os.remove(path)
+
+        # A socket left behind by an earlier server is replaced
+        path = os.path.join(directory, "metrics.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        MetricsServer(self.metrics, path).close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_terminal(self):
+        cpu = CPU()
+        cpu.load_rom(MAZE)
+        run(cpu, TerminalRenderer(io.StringIO()), frames=3, metrics=self.metrics)
+
+        self.assertEqual(3, self.metrics.frames)
+        self.assertEqual(30, self.metrics.instructions)
+        self.assertTrue(self.metrics.seconds["render"] > 0)
+
+    def test_thread(self):
+        cpu = CPU()
+        cpu.load_rom(MAZE)
+        thread = EmulationThread(cpu, FrameBuffer(64 * 32), frame_rate=None, metrics=self.metrics)
+        thread.start()
+        time.sleep(0.05)
+        thread.stop()
+        thread.join()
+
+        self.assertTrue(self.metrics.frames > 0)
+        self.assertEqual(self.metrics.frames * 10, self.metrics.instructions)
+        self.assertEqual(0, self.metrics.late_frames)
+
+    def test_session(self):
+        session = Session(frame_rate=None, metrics=self.metrics)
+        session.cpu.load_rom(MAZE)
+        asyncio.run(session.run(frames=5))
+
+        self.assertEqual(5, self.metrics.frames)
+
+if __name__ == "__main__":
+    unittest.main()
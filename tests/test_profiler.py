@@ -0,0 +1,103 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.profiler import Profiler, load_symbols, main
+
+
+"""
+
+Unit tests for the sampling profiler
+
+"""
+
+PROGRAM = bytes([
+    0x22, 0x06,   # 200: CALL 0x206
+    0x12, 0x00,   # 202: JP 0x200
+    0x00, 0x00,
+    0x22, 0x0C,   # 206: CALL 0x20C
+    0x00, 0xEE,   # 208: RET
+    0x00, 0x00,
+    0x70, 0x01,   # 20C: ADD V0, 0x01
+    0x00, 0xEE])  # 20E: RET
+
+class TestProfiler(unittest.TestCase):
+    """
+
+    A class for testing guest call stack sampling
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.cpu.load_bytes(PROGRAM, 0x200)
+
+    def test_stack(self):
+        profiler = Profiler(self.cpu)
+        self.cpu.run(2)
+        self.assertEqual((0x206, 0x20C, 0x20C), profiler.stack())
+
+        self.cpu.memory[0x206] = 0
+        self.assertEqual((0x206, None, 0x20C), profiler.stack())
+
+    def test_run(self):
+        profiler = Profiler(self.cpu, interval=1)
+        profiler.run(6)
+
+        self.assertEqual(6, self.cpu.cycles)
+        self.assertEqual(6, sum(profiler.samples.values()))
+        self.assertEqual(sorted(["main;200 1", "main;202 1", "main;sub_206;206 1", "main;sub_206;208 1",
+                                 "main;sub_206;sub_20C;20C 1", "main;sub_206;sub_20C;20E 1"]),
+                         profiler.collapsed())
+
+    def test_interval(self):
+        profiler = Profiler(self.cpu, interval=4, addresses=False)
+        profiler.run(10)
+        profiler.run(10)
+
+        self.assertEqual(20, self.cpu.cycles)
+        self.assertEqual(5, sum(profiler.samples.values()))
+
+        jittered = Profiler(self.cpu, interval=4, jitter=2, seed=0)
+        jittered.run(400)
+        self.assertTrue(60 < sum(jittered.samples.values()) < 140)
+
+    def test_symbols(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "maze.sym")
+        with open(path, "w") as f:
+            f.write("# MAZE\n20C increment\n\n")
+
+        symbols = load_symbols(path)
+        os.remove(path)
+        os.rmdir(directory)
+
+        self.assertEqual({0x20C: "increment"}, symbols)
+
+        profiler = Profiler(self.cpu, interval=3, symbols=symbols, addresses=False)
+        profiler.run(3)
+        self.assertEqual(["main;sub_206;increment 1"], profiler.collapsed())
+
+    def test_main(self):
+        # LD V0, 2; LD ST, V0; JP 200, so the sound timer keeps expiring
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(bytes([0x60, 0x02, 0xF0, 0x18, 0x12, 0x00]))
+        self.addCleanup(os.remove, f.name)
+
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            main(["profiler", f.name, "600", "7"])
+
+        lines = stream.getvalue().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertRegex(line, r"^main;[0-9A-F]{3} [0-9]+$")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.schedule import InputPlayer, InputSchedule
+
+
+"""
+
+Unit tests for scripted input
+
+"""
+
+# LD V0, 0x00; LD V1, 0x03; SKP V1; JP 0x208; ADD V0, 0x01; JP 0x204
+PROGRAM = b"\x60\x00\x61\x03\xE1\x9E\x12\x08\x70\x01\x12\x04"
+
+class TestSchedule(unittest.TestCase):
+    """
+
+    A class for testing input schedules and their playback
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.cpu.load_bytes(PROGRAM, 0x200)
+        self.schedule = InputSchedule(cycles_per_frame=10)
+
+    def test_order(self):
+        self.schedule.release(3, cycle=50)
+        self.schedule.press(3, frame=2)
+        self.schedule.press(4, cycle=50)
+
+        self.assertEqual([(20, 3, True), (50, 3, False), (50, 4, True)],
+                         [(cycle, key, pressed) for cycle, _, key, pressed in self.schedule.events])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.schedule.press, 3)
+        self.assertRaises(ValueError, self.schedule.press, 3, 1, 1)
+        self.assertRaises(ValueError, self.schedule.press, 16, 1)
+        self.assertRaises(ValueError, self.schedule.parse, "frame 10 hold 3")
+
+    def test_parse(self):
+        self.schedule.parse("# comment\nframe 3 down A\n\ncycle 45 up a  # release\n")
+        self.assertEqual("cycle 30 down A\ncycle 45 up A\n", self.schedule.dumps())
+
+        copy = InputSchedule(cycles_per_frame=10)
+        copy.parse(self.schedule.dumps())
+        self.assertEqual(self.schedule.events, copy.events)
+
+    def test_player(self):
+        # Only the SKP V1 instructions executed while key 3 is held skip the
+        # jump, so V0 counts them
+        self.schedule.tap(3, frame=1, frames=2)
+        player = InputPlayer(self.cpu, self.schedule)
+
+        player.run(15)
+        self.assertTrue(self.cpu.keys[3])
+        self.assertEqual(15, self.cpu.cycles)
+
+        player.run_frames(5)
+        self.assertFalse(self.cpu.keys[3])
+        self.assertEqual(65, self.cpu.cycles)
+
+        # The same schedule applied cycle by cycle gives the same result
+        cpu = CPU()
+        cpu.load_bytes(PROGRAM, 0x200)
+        for cycle in range(65):
+            cpu.keys[3] = 10 <= cycle < 30
+            cpu.execute_cycle()
+
+        self.assertEqual(cpu.v, self.cpu.v)
+        self.assertEqual(cpu.pc, self.cpu.pc)
+        self.assertTrue(self.cpu.v[0] > 0)
+
+    def test_late_player(self):
+        self.schedule.press(1, cycle=5)
+        self.schedule.press(2, cycle=20)
+        self.cpu.run(10)
+
+        player = InputPlayer(self.cpu, self.schedule)
+        player.run(10)
+        self.assertEqual([False, False, True], self.cpu.keys[:3])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.shm import SharedState, SharedStateReader
+
+
+"""
+
+Unit tests for the shared-memory state export
+
+"""
+
+class TestSharedState(unittest.TestCase):
+    """
+
+    A class for testing the shared-memory state export
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.shared = SharedState()
+        self.reader = SharedStateReader(self.shared.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.shared.close()
+
+    def test_empty(self):
+        self.assertEqual(0, self.reader.frame)
+        self.assertEqual(0, self.reader.snapshot()["frame"])
+
+    def test_publish(self):
+        self.cpu._6XNN(0x6A42)
+        self.cpu._ANNN(0xA123)
+        self.cpu._2NNN(0x2400)
+        self.shared.publish(self.cpu)
+
+        snapshot = self.reader.snapshot()
+        self.assertEqual(1, snapshot["frame"])
+        self.assertEqual(0x42, snapshot["v"][0xA])
+        self.assertEqual(0x123, snapshot["i"])
+        self.assertEqual(0x400, snapshot["pc"])
+        self.assertEqual(1, snapshot["sp"])
+        self.assertEqual(0x204, snapshot["stack"][0])
+        self.assertEqual(bytes(self.cpu.memory), snapshot["memory"])
+        self.assertFalse(snapshot["dirty"])
+
+    def test_framebuffer(self):
+        gfx = self.reader.gfx
+
+        self.cpu._DXYN(0xD005)
+        self.shared.publish(self.cpu)
+
+        # The reader's view sees the new frame without being recreated
+        self.assertEqual(bytes(self.cpu.gfx), bytes(gfx))
+        self.assertTrue(self.reader.snapshot()["dirty"])
+
+        self.shared.publish(self.cpu)
+        self.assertFalse(self.reader.snapshot()["dirty"])
+
+    def test_overflowed_registers(self):
+        self.cpu.v[0] = 0x1FF
+        self.shared.publish(self.cpu)
+        self.assertEqual(0xFF, self.reader.snapshot()["v"][0])
+
+    def test_wait_frame(self):
+        self.assertIsNone(self.reader.wait_frame(0, timeout=0.01))
+        self.shared.publish(self.cpu)
+        self.assertEqual(1, self.reader.wait_frame(0, timeout=0.01))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.statehash import StateHasher
+
+
+"""
+
+Unit tests for incremental machine-state hashing
+
+"""
+
+MAZE = os.path.join(os.path.dirname(__file__), "..", "roms", "MAZE")
+
+def full_hash(cpu):
+    """
+
+    Hash the state of a CPU from scratch using a fresh StateHasher
+
+    """
+    hasher = cpu.hasher
+    digest = StateHasher(cpu).digest()
+    cpu.hasher = hasher
+    return digest
+
+class TestStateHash(unittest.TestCase):
+    """
+
+    A class for testing incremental state hashing
+
+    """
+
+    def setUp(self):
+        self.cpu = CPU()
+        self.hasher = StateHasher(self.cpu)
+
+    def test_attach(self):
+        self.assertIs(self.hasher, self.cpu.hasher)
+
+    def test_equal_states(self):
+        other = CPU()
+        StateHasher(other)
+        self.assertEqual(self.hasher.digest(), other.hasher.digest())
+
+        self.cpu._6XNN(0x6001)
+        self.assertNotEqual(self.hasher.digest(), other.hasher.digest())
+
+        other._6XNN(0x6001)
+        self.assertEqual(self.hasher.digest(), other.hasher.digest())
+
+    def test_memory_write(self):
+        before = self.hasher.digest()
+        self.cpu._ANNN(0xA300)
+        self.cpu._6XNN(0x6007)
+        self.cpu._FX55(0)
+        self.assertEqual({3}, self.hasher.dirty_memory)
+        self.assertNotEqual(before, self.hasher.digest())
+        self.assertEqual(full_hash(self.cpu), self.hasher.digest())
+
+    def test_incremental(self):
+        random.seed(0)
+        self.cpu.load_rom(MAZE)
+        for _ in range(50):
+            self.cpu.run(37)
+            self.assertEqual(full_hash(self.cpu), self.hasher.digest())
+
+    def test_invalidate(self):
+        self.hasher.digest()
+        self.cpu.memory[0x800] = 0xFF
+        self.hasher.invalidate()
+        self.assertEqual(full_hash(self.cpu), self.hasher.digest())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.synthetic import (WORKLOADS, Reference, alu, assemble, calls, check, self_modifying,
+                             to_json)
+
+
+"""
+
+Unit tests for the synthetic workload generator
+
+"""
+
+def run(workload, cycles=None):
+    """
+
+    Run a workload on a fresh CPU
+
+    """
+    cpu = CPU()
+    cpu.load_bytes(workload.rom, 0x200)
+    cpu.run(workload.cycles if cycles is None else cycles)
+    return cpu
+
+class TestSynthetic(unittest.TestCase):
+    """
+
+    A class for testing generated workloads and their expected states
+
+    """
+
+    def test_workloads(self):
+        for name, generate in WORKLOADS.items():
+            workload = generate(20, 3)
+            self.assertEqual(name, workload.name)
+
+            # The workload halts on exactly its last cycle, and stays halted
+            cpu = run(workload, workload.cycles - 1)
+            self.assertNotEqual(workload.expected["pc"], cpu.pc, name)
+            cpu.run(1)
+            self.assertEqual([], check(cpu, workload.expected), name)
+            cpu.run(50)
+            self.assertEqual([], check(cpu, workload.expected), name)
+
+    def test_iterations(self):
+        workload = calls(7, 3, depth=4)
+        self.assertEqual((3 * 7 * 4) % 256, workload.expected["v"][2])
+        self.assertEqual(3 * 7, workload.expected["v"][1])
+        self.assertEqual([7, 3], workload.expected["v"][13:15])
+
+    def test_self_modifying(self):
+        workload = self_modifying(10, 1)
+        self.assertEqual(sum(range(10)), workload.expected["v"][2])
+        self.assertEqual(bytes([0x72, 9]), list(workload.expected["memory"].values())[0])
+
+    def test_check(self):
+        workload = alu(10, 1)
+        cpu = run(workload)
+        cpu.v[3] ^= 1
+        cpu.memory[0x200] ^= 1
+        self.assertEqual(["v"], check(cpu, workload.expected))
+
+    def test_assemble(self):
+        rom, halt = assemble([0x6001], lambda address: [0x1000 | address], 1, 1, data={0x300: b"\xAB"})
+        self.assertEqual(bytes.fromhex("60016E006D001206"), rom[:8])
+        self.assertEqual(0x214, halt)
+        self.assertEqual(b"\xAB", rom[-1:])
+        self.assertEqual(0x101, len(rom))
+        self.assertRaises(ValueError, assemble, [], lambda address: [], 0, 1)
+        self.assertRaises(ValueError, assemble, [], lambda address: [], 1, 1, data={0x204: b"\xAB"})
+        self.assertRaises(ValueError, Reference(bytes.fromhex("E09E")).step)
+
+    def test_json(self):
+        described = json.loads(to_json(WORKLOADS["sprites"](2, 1)))
+        self.assertEqual("sprites", described["name"])
+        self.assertEqual(64 * 32 * 2, len(described["expected"]["gfx"]))
+
+if __name__ == "__main__":
+    unittest.main()
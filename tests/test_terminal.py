@@ -0,0 +1,80 @@
+import io
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.terminal import TerminalRenderer, run, BELL, CLEAR
+
+
+"""
+
+Unit tests for the terminal frontend
+
+"""
+
+class TestTerminalRenderer(unittest.TestCase):
+    """
+
+    A class for testing the diff-based terminal renderer
+
+    """
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.renderer = TerminalRenderer(self.stream)
+        self.gfx = bytearray(64 * 32)
+
+    def test_first_frame(self):
+        self.assertEqual(64 * 16, self.renderer.render(self.gfx))
+        self.assertTrue(self.stream.getvalue().startswith(CLEAR))
+
+    def test_unchanged_frame(self):
+        self.renderer.render(self.gfx)
+        self.stream.truncate(0)
+        self.stream.seek(0)
+
+        self.assertEqual(0, self.renderer.render(self.gfx))
+        self.assertEqual("", self.stream.getvalue())
+
+    def test_changed_cells(self):
+        self.renderer.render(self.gfx)
+        self.stream.truncate(0)
+        self.stream.seek(0)
+
+        # Pixels (3, 0) and (3, 1) share a cell, (4, 1) is its neighbour
+        self.gfx[3] = 1
+        self.gfx[64 + 3] = 1
+        self.gfx[64 + 4] = 1
+        self.assertEqual(2, self.renderer.render(self.gfx))
+        self.assertEqual("\x1b[1;4H█▄", self.stream.getvalue())
+
+    def test_run(self):
+        cpu = CPU()
+        cpu.load_bytes(b"\xD0\x05\x12\x02", 0x200)
+        run(cpu, self.renderer, frames=1)
+        self.assertIn("█", self.stream.getvalue())
+
+    def test_sound(self):
+        # LD V0, 2; LD ST, V0; DRW V0, V0, 5; JP 206
+        cpu = CPU()
+        cpu.load_bytes(b"\x60\x02\xF0\x18\xD0\x05\x12\x06", 0x200)
+        run(cpu, self.renderer, frames=2)
+
+        output = self.stream.getvalue()
+        self.assertNotIn("Beep!", output)
+        self.assertEqual(1, output.count(BELL))
+
+    def test_str(self):
+        cpu = CPU()
+        cpu._DXYN(0xD005)
+        lines = str(cpu).split("\n")
+        self.assertEqual("****" + " " * 60, lines[0])
+        self.assertEqual("*  *" + " " * 60, lines[1])
+        self.assertEqual("", lines[32])
+        self.assertEqual("PC = 0x202", lines[33])
+
+
+if __name__ == "__main__":
+    unittest.main()
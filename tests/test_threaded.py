@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.threaded import EmulationThread, FrameBuffer
+
+
+"""
+
+Unit tests for threaded emulation
+
+"""
+
+MAZE = os.path.join(os.path.dirname(__file__), "..", "roms", "MAZE")
+
+class TestFrameBuffer(unittest.TestCase):
+    """
+
+    A class for testing the triple-buffered framebuffer
+
+    """
+
+    def setUp(self):
+        self.framebuffer = FrameBuffer(4)
+
+    def test_empty(self):
+        self.assertIsNone(self.framebuffer.acquire())
+
+    def test_latest(self):
+        self.framebuffer.publish(b"\x01\x00\x00\x00")
+        self.framebuffer.publish(b"\x02\x00\x00\x00")
+        frame, gfx = self.framebuffer.acquire()
+        self.assertEqual(2, frame)
+        self.assertEqual(b"\x02\x00\x00\x00", bytes(gfx))
+
+    def test_presented_frame_is_stable(self):
+        self.framebuffer.publish(b"\x01\x00\x00\x00")
+        _, gfx = self.framebuffer.acquire()
+
+        # Publishing while a frame is presented never overwrites it
+        for n in range(2, 10):
+            self.framebuffer.publish(bytes([n, 0, 0, 0]))
+            self.assertEqual(b"\x01\x00\x00\x00", bytes(gfx))
+
+        self.framebuffer.release()
+        frame, gfx = self.framebuffer.acquire()
+        self.assertEqual(9, frame)
+        self.assertEqual(b"\x09\x00\x00\x00", bytes(gfx))
+
+    def test_too_few_buffers(self):
+        with self.assertRaises(ValueError):
+            FrameBuffer(4, count=2)
+
+class TestEmulationThread(unittest.TestCase):
+    """
+
+    A class for testing the emulation thread
+
+    """
+
+    def test_publishes_frames(self):
+        cpu = CPU()
+        cpu.load_rom(MAZE)
+        framebuffer = FrameBuffer(len(cpu.gfx))
+
+        emulation = EmulationThread(cpu, framebuffer, frame_rate=None)
+        emulation.start()
+        while framebuffer.frame < 10 and emulation.is_alive():
+            time.sleep(0.001)
+        emulation.stop()
+        emulation.join()
+
+        self.assertIsNone(emulation.error)
+        frame, gfx = framebuffer.acquire()
+        self.assertTrue(frame >= 10)
+        self.assertTrue(sum(gfx) > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
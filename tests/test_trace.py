@@ -0,0 +1,113 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append("..")
+
+from chip8.cpu import CPU
+from chip8.trace import NO_REGISTER, TraceReader, TraceWriter, changed_register
+
+
+"""
+
+Unit tests for binary execution traces
+
+"""
+
+# LD V1, 0x05; ADD V1, 0x01; JP 0x202
+PROGRAM = b"\x61\x05\x71\x01\x12\x02"
+
+class TestTrace(unittest.TestCase):
+    """
+
+    A class for testing trace recording and searching
+
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "trace.c8t")
+        self.cpu = CPU()
+        self.cpu.load_bytes(PROGRAM, 0x200)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def trace(self, cycles, **kwargs):
+        writer = TraceWriter(self.path, **kwargs)
+        writer.attach(self.cpu)
+        self.cpu.run(cycles)
+        writer.close()
+        return TraceReader(self.path)
+
+    def test_changed_register(self):
+        self.assertEqual((NO_REGISTER, 0), changed_register([0] * 16, [0] * 16))
+        self.assertEqual((3, 9), changed_register([0] * 16, [0, 0, 0, 9] + [0] * 11 + [1]))
+        self.assertEqual((15, 1), changed_register([0] * 16, [0] * 15 + [1]))
+
+    def test_records(self):
+        reader = self.trace(4)
+        records = [record for _, record in reader.records()]
+        reader.close()
+
+        self.assertEqual(4, len(records))
+        self.assertEqual((0, 0x200, 0x6105, 0, 1, 5), tuple(records[0]))
+        self.assertEqual((1, 0x202, 0x7101, 0, 1, 6), tuple(records[1]))
+        self.assertEqual(NO_REGISTER, records[2].register)
+        self.assertEqual(0x204, records[2].pc)
+        self.assertEqual(7, records[3].value)
+        self.assertEqual(4, self.cpu.cycles)
+
+    def test_ring(self):
+        reader = self.trace(101, capacity=16)
+
+        self.assertEqual(16, len(reader))
+        cycles = [record.cycle for _, record in reader.records()]
+        self.assertEqual(list(range(85, 101)), cycles)
+        self.assertEqual(100, reader[-1].cycle)
+        self.assertEqual(85, reader[0].cycle)
+        self.assertEqual([90, 91], [record.cycle for _, record in reader.records(5, 7)])
+        reader.close()
+
+    def test_segments(self):
+        reader = self.trace(40, capacity=16, ring=False)
+
+        self.assertEqual(3, len(reader.segments))
+        self.assertEqual(40, len(reader))
+        self.assertEqual(list(range(40)), [record.cycle for _, record in reader.records()])
+        self.assertEqual(20, reader[20].cycle)
+        reader.close()
+
+    def test_search(self):
+        reader = self.trace(31)
+
+        adds = list(reader.search(pc=0x202))
+        self.assertEqual(15, len(adds))
+        self.assertEqual([1, 3, 5], [position for position, _ in adds[:3]])
+
+        jumps = list(reader.search(opcode=0x1000, mask=0xF000))
+        self.assertEqual(15, len(jumps))
+
+        self.assertEqual([(9, 10)], [(position, record.value) for position, record in reader.search(register=1, value=10)])
+        self.assertEqual([], list(reader.search(register=2)))
+        self.assertEqual(8, len(list(reader.search(pc=0x204, start=15))))
+        reader.close()
+
+    def test_partial_search(self):
+        # A search abandoned part way through leaves the reader closable
+        reader = self.trace(31)
+        search = reader.search(opcode=0x1000, mask=0xF000)
+        next(search)
+        reader.close()
+
+    def test_fork(self):
+        self.cpu.tracer = TraceWriter(self.path)
+        child = self.cpu.fork()
+        self.cpu.tracer.close()
+
+        self.assertIsNone(child.tracer)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.append("..")
+
+from chip8 import verify
+from chip8.cpu import CPU
+from chip8.statehash import StateHasher
+from chip8.verify import LockstepVerifier, COMPARE_HASH, COMPARE_STATE, EVERY_FRAME, restore, snapshot
+
+
+"""
+
+Unit tests for the lockstep differential verifier
+
+"""
+
+MAZE = os.path.join(os.path.dirname(__file__), "..", "roms", "MAZE")
+
+class BrokenCPU(CPU):
+    """
+
+    A CPU whose 7XNN wraps registers at 6 bits, used as a faulty engine
+
+    """
+
+    def _7XNN(self, opcode):
+        x = self.get_x(opcode)
+        self.v[x] = (self.v[x] + self.get_nn(opcode)) % 64
+        self.pc += 2
+
+class TestVerify(unittest.TestCase):
+    """
+
+    A class for testing the lockstep differential verifier
+
+    """
+
+    def patch_interval(self, interval):
+        original = verify.CHECKPOINT_INTERVAL
+        verify.CHECKPOINT_INTERVAL = interval
+        self.addCleanup(setattr, verify, "CHECKPOINT_INTERVAL", original)
+
+    def test_identical_engines(self):
+        verifier = LockstepVerifier(CPU(), stride=EVERY_FRAME)
+        verifier.load_rom(MAZE)
+        self.assertIsNone(verifier.run(2000))
+        self.assertEqual(2000, verifier.cycle)
+
+    def test_first_divergent_cycle(self):
+        # Find the cycle at which 7XNN first exceeds 6 bits
+        random.seed(0)
+        cpu = CPU()
+        cpu.load_rom(MAZE)
+        for cycle in range(1, 2000):
+            opcode = cpu.fetch_opcode()
+            x = cpu.get_x(opcode)
+            overflow = opcode & 0xF000 == 0x7000 and cpu.v[x] + cpu.get_nn(opcode) > 63
+            cpu.execute_cycle()
+            if overflow:
+                break
+
+        # A coarse stride must still report the exact cycle
+        verifier = LockstepVerifier(BrokenCPU(), stride=64)
+        verifier.load_rom(MAZE)
+        random.seed(0)
+        divergence = verifier.run(2000)
+
+        self.assertEqual(cycle, divergence.cycle)
+        self.assertEqual("v", divergence.diffs[0][0])
+        self.assertIn("expected", str(divergence))
+
+    def test_hash_comparison(self):
+        verifier = LockstepVerifier(BrokenCPU(), stride=EVERY_FRAME, compare=COMPARE_HASH)
+        verifier.load_rom(MAZE)
+        self.assertIsNotNone(verifier.run(2000))
+
+    def test_checkpoints(self):
+        # Checkpoints far apart and close together find the same cycle, in
+        # both comparison modes
+        cycles = set()
+        for interval in (16, 4096):
+            for compare in (COMPARE_STATE, COMPARE_HASH):
+                self.patch_interval(interval)
+                verifier = LockstepVerifier(BrokenCPU(), stride=EVERY_FRAME, compare=compare)
+                verifier.load_rom(MAZE)
+                random.seed(0)
+                cycles.add(verifier.run(2000).cycle)
+
+        self.assertEqual(1, len(cycles))
+
+    def test_checkpoint_keys(self):
+        # LD V5, 0; SKP V5; ADD V0, 1; JP 202, so V0 only counts while key 0
+        # is up, and the broken engine diverges once it passes 63
+        rom = bytes([0x65, 0x00, 0xE5, 0x9E, 0x70, 0x01, 0x12, 0x02])
+        up = [False] * 16
+        inputs = {0: up, 150: [True] + up[1:], 5000: up}
+
+        cycles = []
+        for interval in (1, 100, 4096):
+            self.patch_interval(interval)
+            verifier = LockstepVerifier(BrokenCPU(), stride=64)
+            verifier.reference.load_bytes(rom, 0x200)
+            verifier.candidate.load_bytes(rom, 0x200)
+            cycles.append(verifier.run(6000, inputs).cycle)
+
+        self.assertEqual([5042] * 3, cycles)
+
+    def test_restore_fork(self):
+        cpu = CPU()
+        cpu.load_rom(MAZE)
+        state = snapshot(cpu)
+
+        child = cpu.fork()
+        hasher = StateHasher(child)
+        hasher.digest()
+
+        # Restoring the child must not write through memory it shares
+        state["memory"] = (0xFF,) * len(state["memory"])
+        restore(child, state)
+        self.assertEqual(0xFF, child.memory[0x200])
+        self.assertNotEqual(0xFF, cpu.memory[0x200])
+        digest = hasher.digest()
+        self.assertEqual(StateHasher(child).digest(), digest)
+
+    def test_invalid_stride(self):
+        with self.assertRaises(ValueError):
+            LockstepVerifier(CPU(), stride=0)
+
+
+if __name__ == "__main__":
+    unittest.main()